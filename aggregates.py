@@ -0,0 +1,345 @@
+"""
+Agregados en streaming sobre un corpus de certificados, con memoria constante.
+
+Cada acumulador se actualiza valor a valor y se puede combinar (merge) con otro del mismo tipo,
+de modo que cada worker resume su parte del corpus y el proceso padre solo junta los resumenes:
+
+    aggregation = Aggregation({
+        "letras_por_zona": Metric("Calificacion.EmisionesCO2.Global", Count, by=("IdentificacionEdificio.ZonaClimatica", "Calificacion.EmisionesCO2.Global")),
+        "epnr_por_decada": Metric("Consumo.EnergiaPrimariaNoRenovable.Global", Mean, by=(Decade("IdentificacionEdificio.AnoConstruccion"),)),
+        "superficie": Metric("DatosGeneralesyGeometria.SuperficieHabitable", Quantiles),
+    })
+    aggregate_many(paths, aggregation, workers=8).result()
+"""
+
+from abc import ABC, abstractmethod
+from math import ceil, sqrt
+from pathlib import Path
+import random
+from typing import Any, Callable, Iterable
+
+from .batch import BatchStats, _process_file, map_groups
+from .parser_cex import ParserCEX
+from .records import flatten
+
+
+class Accumulator(ABC):
+    """
+    Interfaz comun: update(valor), merge(otro) y result()
+    """
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.result()} >"
+
+    @abstractmethod
+    def update(self, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    def merge(self, other: "Accumulator") -> None:
+        pass
+
+    @abstractmethod
+    def result(self) -> Any:
+        pass
+
+
+class Count(Accumulator):
+    __slots__ = ("n",)
+
+    def __init__(self) -> None:
+        self.n = 0
+
+    def update(self, value: Any) -> None:
+        self.n += 1
+
+    def merge(self, other: "Count") -> None:
+        self.n += other.n
+
+    def result(self) -> int:
+        return self.n
+
+
+class Sum(Accumulator):
+    __slots__ = ("total",)
+
+    def __init__(self) -> None:
+        self.total = 0.0
+
+    def update(self, value: float) -> None:
+        self.total += value
+
+    def merge(self, other: "Sum") -> None:
+        self.total += other.total
+
+    def result(self) -> float:
+        return self.total
+
+
+class Mean(Accumulator):
+    """
+    Media y varianza con el algoritmo de Welford. merge usa la formula de Chan para combinar dos particiones
+    """
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "Mean") -> None:
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def variance(self) -> float | None:
+        return self.m2 / (self.n - 1) if self.n > 1 else None
+
+    def result(self) -> dict:
+        variance = self.variance
+        return {"n": self.n, "mean": self.mean if self.n else None, "std": sqrt(variance) if variance is not None else None}
+
+
+class Quantiles(Accumulator):
+    """
+    Sketch KLL de cuantiles: memoria O(k) independiente del numero de valores y error de rango ~1/k.
+    Los compactores se combinan nivel a nivel en merge
+    """
+
+    __slots__ = ("k", "compactors", "size", "n", "_random")
+
+    quantiles = (0.05, 0.25, 0.5, 0.75, 0.95)
+    _c = 2 / 3
+
+    def __init__(self, k: int = 200, seed: int | None = None) -> None:
+        self.k = k
+        self.compactors: list[list[float]] = [[]]
+        self.size = 0
+        self.n = 0
+        self._random = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(ceil(self._c**depth * self.k)) + 1
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self) -> None:
+        for level, compactor in enumerate(self.compactors):
+            if len(compactor) >= self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append([])
+                compactor.sort()
+                offset = self._random.random() < 0.5
+                self.compactors[level + 1].extend(compactor[offset::2])
+                compactor.clear()
+                self.size = sum(len(items) for items in self.compactors)
+                return
+
+    def update(self, value: float) -> None:
+        self.compactors[0].append(value)
+        self.size += 1
+        self.n += 1
+        if self.size >= self._max_size():
+            self._compress()
+
+    def merge(self, other: "Quantiles") -> None:
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        self.size = sum(len(items) for items in self.compactors)
+        while self.size >= self._max_size():
+            self._compress()
+
+    def quantile(self, q: float) -> float | None:
+        weighted = sorted((value, 2**level) for level, items in enumerate(self.compactors) for value in items)
+        if not weighted:
+            return None
+        target = q * sum(weight for _, weight in weighted)
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def result(self) -> dict:
+        return {q: self.quantile(q) for q in self.quantiles}
+
+
+class Decade(object):
+    """
+    Clave de agrupacion picklable: decada del año guardado en un campo ('1960' -> 1960, '1987' -> 1980)
+    """
+
+    __slots__ = ("field",)
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.field} >"
+
+    def __call__(self, record: dict) -> int | None:
+        value = record.get(self.field)
+        try:
+            return int(float(value)) // 10 * 10
+        except (TypeError, ValueError):
+            return None
+
+
+class Metric(object):
+    """
+    Un acumulador por cada combinacion de claves de agrupacion (o uno solo si by es None).
+    Las claves pueden ser nombres de campo o funciones picklables que reciben el registro aplanado. Si la funcion
+    tiene el atributo field (como Decade) solo se lee ese campo; si no, la metrica necesita el registro completo
+    """
+
+    def __init__(self, field: str, accumulator: Callable[[], Accumulator], by: tuple[str | Callable[[dict], Any], ...] | None = None) -> None:
+        self.field = field
+        self.accumulator = accumulator
+        self.by = by
+        self.groups: dict[tuple, Accumulator] = {}
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.field} >"
+
+    @property
+    def fields(self) -> list[str] | None:
+        """
+        Campos que usa la metrica, o None si alguna clave es una funcion sin field y hace falta el registro completo
+        """
+        fields = [self.field]
+        for key in self.by or ():
+            field = key if isinstance(key, str) else getattr(key, "field", None)
+            if not isinstance(field, str):
+                return None
+            fields.append(field)
+        return fields
+
+    def empty(self) -> "Metric":
+        return Metric(self.field, self.accumulator, self.by)
+
+    def _key(self, record: dict) -> tuple:
+        return tuple(record.get(key) if isinstance(key, str) else key(record) for key in self.by or ())
+
+    def update(self, record: dict) -> None:
+        value = record.get(self.field)
+        if value is None or value == "":
+            return
+        key = self._key(record)
+        if key not in self.groups:
+            self.groups[key] = self.accumulator()
+        self.groups[key].update(value)
+
+    def merge(self, other: "Metric") -> None:
+        for key, accumulator in other.groups.items():
+            if key in self.groups:
+                self.groups[key].merge(accumulator)
+            else:
+                self.groups[key] = accumulator
+
+    def result(self) -> Any:
+        if self.by is None:
+            accumulator = self.groups.get(())
+            return accumulator.result() if accumulator is not None else self.accumulator().result()
+        return {key if len(key) > 1 else key[0]: accumulator.result() for key, accumulator in self.groups.items()}
+
+
+class Aggregation(object):
+    """
+    Conjunto de metricas con nombre que se alimentan de certificados (ParserCEX) o registros aplanados
+    """
+
+    def __init__(self, metrics: dict[str, Metric]) -> None:
+        self.metrics = metrics
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {list(self.metrics)} >"
+
+    @property
+    def fields(self) -> list[str] | None:
+        """
+        Proyeccion minima para records.flatten: solo se leen las secciones que usan las metricas.
+        None (todas las secciones) si alguna metrica necesita el registro completo
+        """
+        fields = [metric.fields for metric in self.metrics.values()]
+        if any(item is None for item in fields):
+            return None
+        return list(dict.fromkeys(field for item in fields for field in item))
+
+    def empty(self) -> "Aggregation":
+        """
+        Copia sin datos con las mismas metricas, para los resumenes parciales
+        """
+        return Aggregation({name: metric.empty() for name, metric in self.metrics.items()})
+
+    def update(self, cex: ParserCEX | dict) -> None:
+        record = flatten(cex, self.fields) if isinstance(cex, ParserCEX) else cex
+        for metric in self.metrics.values():
+            metric.update(record)
+
+    def merge(self, other: "Aggregation") -> None:
+        for name, metric in self.metrics.items():
+            metric.merge(other.metrics[name])
+
+    def result(self) -> dict:
+        return {name: metric.result() for name, metric in self.metrics.items()}
+
+
+def _aggregate_chunk(paths: list[str], aggregation: Aggregation, timeout: float | None = None) -> tuple[Aggregation, list]:
+    """
+    Tarea de un worker: resume un bloque de ficheros en una Aggregation parcial (una copia vacia de aggregation)
+    """
+    partial = aggregation.empty()
+    fields = aggregation.fields
+    results = []
+    for path in paths:
+        result = _process_file(path, lambda cex: flatten(cex, fields), None, False, timeout)
+        if result.ok:
+            partial.update(result.value)
+        result.value = None
+        results.append(result)
+    return partial, results
+
+
+def aggregate_many(
+    paths: Iterable[Path | str],
+    aggregation: Aggregation,
+    workers: int | None = None,
+    chunk_size: int = 256,
+    stats: BatchStats | None = None,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> Aggregation:
+    """
+    Recorre el corpus en paralelo. Cada worker devuelve un resumen parcial por bloque y el padre los combina
+    sobre `aggregation`, que se devuelve actualizada. La memoria no depende del tamaño del corpus.
+
+    timeout y memory_limit aislan los ficheros defectuosos como en batch.parse_many (ver batch.map_groups):
+    los ficheros fallidos no cuentan en los agregados y se cuentan en stats
+    """
+    paths = [str(path) for path in paths]
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    template = aggregation.empty()
+    for partial, results in map_groups(_aggregate_chunk, chunks, (template, timeout), workers=workers, memory_limit=memory_limit):
+        aggregation.merge(partial)
+        if stats is not None:
+            for result in results:
+                stats.update(result)
+    return aggregation
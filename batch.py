@@ -0,0 +1,491 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import csv
+from io import BytesIO
+import os
+from pathlib import Path
+import signal
+import threading
+from time import perf_counter
+from typing import Any, Callable, Generator, Iterable
+
+from lxml import etree
+
+from .parser_cex import ParserCEX
+from .filters import read_filtered
+from .validation import CEXValidationError, load_schema, validate
+
+
+class BatchStats(object):
+    """
+    Acumula los tiempos de cada etapa (parse, validate, extract...) de un lote de ficheros
+    """
+
+    def __init__(self) -> None:
+        self.files: int = 0
+        self.failed: int = 0
+        self.skipped: int = 0
+        self.timings: dict[str, float] = {}
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} files={self.files} >"
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def update(self, result: "BatchResult") -> None:
+        self.files += 1
+        if not result.ok:
+            self.failed += 1
+        if not result.matched:
+            self.skipped += 1
+        for stage, seconds in result.timings.items():
+            self.add(stage, seconds)
+
+    def summary(self) -> str:
+        """
+        Una linea por etapa con el tiempo total y el tiempo medio por fichero
+        """
+        width = max((len(stage) for stage in self.timings), default=0)
+        lines = []
+        for stage, seconds in self.timings.items():
+            per_file = seconds / self.files if self.files else 0.0
+            lines.append(f"{stage:<{width}} {seconds:10.4f}s  {per_file * 1000:10.3f}ms/file")
+        return "\n".join(lines)
+
+
+class FileTimeoutError(TimeoutError):
+    """
+    Se lanza dentro del worker cuando un fichero supera el tiempo maximo permitido
+    """
+
+
+class BatchResult(object):
+    """
+    Resultado de un fichero del lote.
+
+    - errors: errores de validacion contra el XSD
+    - error_class / error: excepcion capturada al procesar el fichero (fichero en cuarentena)
+    - matched: False si el fichero se ha descartado por el filtro where (sin valor)
+    """
+
+    __slots__ = ("path", "value", "errors", "timings", "error_class", "error", "matched")
+
+    def __init__(
+        self,
+        path: str,
+        value: Any = None,
+        errors: list[str] | None = None,
+        timings: dict[str, float] | None = None,
+        error_class: str | None = None,
+        error: str | None = None,
+        matched: bool = True,
+    ) -> None:
+        self.path = path
+        self.value = value
+        self.errors = errors or []
+        self.timings = timings or {}
+        self.error_class = error_class
+        self.error = error
+        self.matched = matched
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.path} >"
+
+    @property
+    def ok(self) -> bool:
+        return self.error_class is None
+
+    @property
+    def valid(self) -> bool:
+        return self.ok and not self.errors
+
+
+def _raise_timeout(signum, frame):
+    raise FileTimeoutError("se ha superado el tiempo maximo por fichero")
+
+
+@contextmanager
+def _time_limit(seconds: float | None):
+    """
+    Limita el tiempo de reloj del bloque con SIGALRM. Solo es posible en el hilo principal
+    de un sistema POSIX; en otro caso el bloque se ejecuta sin limite
+    """
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _init_worker(memory_limit: int | None) -> None:
+    """
+    Inicializador de cada worker. Limita el espacio de direcciones del proceso para que un XML
+    enorme lance MemoryError dentro del worker en lugar de agotar la memoria de la maquina
+    """
+    if memory_limit is None:
+        return
+    import resource
+
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def _process_file(
+    path: str,
+    extract: Callable[[ParserCEX], Any] | None,
+    xsd: str | None,
+    fail_fast: bool,
+    timeout: float | None = None,
+    where: list | None = None,
+    reader: Callable[[str], bytes] | None = None,
+    source: bytes | None = None,
+    parser: etree.XMLParser | None = None,
+) -> BatchResult:
+    """
+    Trabajo que se ejecuta en cada worker: parsea, valida (opcional) y extrae los datos del fichero.
+    El esquema se compila una vez por proceso (y por hilo) gracias a load_schema.
+    Con where el fichero se parsea de forma incremental y se abandona en cuanto no cumple el filtro.
+    Con reader los bytes del fichero se leen con esa funcion; con source ya vienen leidos (modo hilos).
+    parser es un XMLParser de lxml ya construido que se reutiliza entre ficheros (ver pool.WarmPool)
+
+    Cualquier excepcion queda capturada en el BatchResult para que un fichero defectuoso no aborte el lote
+    """
+    timings: dict[str, float] = {}
+    try:
+        with _time_limit(timeout):
+            if source is None and reader is not None:
+                start = perf_counter()
+                source = reader(path)
+                timings["read"] = perf_counter() - start
+
+            start = perf_counter()
+            xml = path if source is None else BytesIO(source)
+            if where is not None:
+                cex = read_filtered(xml, where)
+            elif parser is not None:
+                cex = ParserCEX(etree.parse(xml, parser))
+            else:
+                cex = ParserCEX(xml)
+            timings["parse"] = perf_counter() - start
+            if cex is None:
+                return BatchResult(path, timings=timings, matched=False)
+
+            errors: list[str] = []
+            if xsd is not None:
+                start = perf_counter()
+                errors = validate(cex, load_schema(xsd))
+                timings["validate"] = perf_counter() - start
+
+            value = None
+            if extract is not None and not (fail_fast and errors):
+                start = perf_counter()
+                value = extract(cex)
+                timings["extract"] = perf_counter() - start
+            # El arbol se libera ya: si extract devuelve bloques del certificado en vez de datos, quedan cerrados (ver ParserCEX.close)
+            cex.close()
+    except Exception as error:
+        return BatchResult(path, timings=timings, error_class=type(error).__name__, error=str(error))
+
+    return BatchResult(path, value, errors, timings)
+
+
+def _broken_result(path: str) -> BatchResult:
+    return BatchResult(path, error_class=BrokenProcessPool.__name__, error="el worker ha terminado de forma inesperada")
+
+
+def _run_isolated(path: str, args: tuple, memory_limit: int | None) -> BatchResult:
+    """
+    Vuelve a procesar, en un worker propio, un fichero que estaba en vuelo cuando se rompio el pool.
+    Si vuelve a romper el worker, el culpable es este fichero
+    """
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(memory_limit,)) as executor:
+        try:
+            return executor.submit(_process_file, path, *args).result()
+        except BrokenProcessPool:
+            return _broken_result(path)
+
+
+class _Quarantine(object):
+    """
+    Informe CSV con los ficheros que no se han podido procesar o que no cumplen el XSD (CEXValidationError)
+    """
+
+    header = ("path", "error_class", "error")
+
+    def __init__(self, path: Path | str | None) -> None:
+        self._file = open(path, "w", newline="", encoding="utf-8") if path is not None else None
+        if self._file is not None:
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.header)
+
+    def add(self, result: BatchResult) -> None:
+        if self._file is None or result.valid:
+            return
+        if result.ok:
+            self._writer.writerow((result.path, CEXValidationError.__name__, "; ".join(result.errors)))
+        else:
+            self._writer.writerow((result.path, result.error_class, result.error))
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+EXECUTORS = ("process", "thread")
+
+
+def parse_many(
+    paths: Iterable[Path | str],
+    extract: Callable[[ParserCEX], Any] | None = None,
+    xsd: Path | str | None = None,
+    fail_fast: bool = False,
+    workers: int | None = None,
+    stats: BatchStats | None = None,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+    max_tasks_per_child: int | None = None,
+    quarantine: Path | str | None = None,
+    where: list | None = None,
+    executor: str = "process",
+    prefetch: int | None = None,
+    reader: Callable[[str], bytes] | None = None,
+) -> Generator[BatchResult, None, None]:
+    """
+    Parsea varios ficheros CEX en paralelo y devuelve un BatchResult por fichero, en el orden de entrada.
+
+    - extract: funcion (picklable) que recibe el ParserCEX ya construido y devuelve los datos que viajan al proceso padre
+    - xsd: ruta al esquema. Si se indica, cada worker valida el arbol ya parseado
+    - fail_fast: con el primer fichero invalido se cancelan los pendientes y se lanza CEXValidationError.
+        Si es False se recogen los errores de todos los ficheros en BatchResult.errors
+    - workers: numero de procesos. Con 0 se ejecuta todo en el proceso actual
+    - stats: BatchStats donde se acumulan los tiempos de cada etapa
+
+    Aislamiento de fallos:
+    - timeout: segundos de reloj maximos por fichero
+    - memory_limit: bytes de espacio de direcciones por worker (RLIMIT_AS). Solo en modo multiproceso
+    - max_tasks_per_child: recicla cada worker tras N ficheros para contener el crecimiento de memoria de lxml
+    - quarantine: ruta del CSV donde se escriben los ficheros fallidos con la clase de error, y los que no cumplen el XSD
+
+    where: condiciones de filters.Predicate ('Seccion.Campo', operador, valor). Los ficheros que no las cumplen
+    se abandonan durante el parseo y se devuelven con BatchResult.matched == False
+
+    executor: 'process' (por defecto) o 'thread'. Con hilos no hay coste de arranque ni de pickle y la lectura de
+    los ficheros (NFS, SMB...) se solapa con el parseo, que en lxml libera el GIL. workers es entonces el numero
+    de hilos de parseo, timeout, memory_limit y max_tasks_per_child no se aplican y extract no tiene que ser picklable
+    - prefetch: ficheros leidos por adelantado como maximo en modo hilos (por defecto 4 por hilo)
+    - reader: funcion que devuelve los bytes de una ruta (p. ej. para leer de un almacen remoto). En modo
+        proceso se llama dentro del worker y debe ser picklable
+
+    Los ficheros fallidos no interrumpen el lote: se devuelven con BatchResult.ok == False
+    """
+    paths = [str(path) for path in paths]
+    xsd = str(xsd) if xsd is not None else None
+    if executor not in EXECUTORS:
+        raise Exception(f"Executor '{executor}' no soportado. Se esperaba uno de {EXECUTORS}")
+    args = (extract, xsd, fail_fast, timeout, where, reader)
+    report = _Quarantine(quarantine)
+
+    def collect(result: BatchResult) -> BatchResult:
+        if stats is not None:
+            stats.update(result)
+        report.add(result)
+        if fail_fast and result.errors:
+            raise CEXValidationError(result.path, result.errors)
+        return result
+
+    try:
+        if workers == 0:
+            for path in paths:
+                yield collect(_process_file(path, *args))
+        elif executor == "thread":
+            for result in _run_threads(paths, args, workers, prefetch):
+                yield collect(result)
+        else:
+            for result in _run_pool(paths, args, workers, memory_limit, max_tasks_per_child):
+                yield collect(result)
+    finally:
+        report.close()
+
+
+def _run_pool(paths: list[str], args: tuple, workers: int | None, memory_limit: int | None, max_tasks_per_child: int | None) -> Generator[BatchResult, None, None]:
+    """
+    Reparte los ficheros en un ProcessPoolExecutor y devuelve los resultados en el orden de entrada.
+    Si un worker muere, los ficheros que estaban en vuelo se reprocesan de uno en uno en un worker aislado
+    """
+    return _run_tasks(_process_file, paths, args, workers, memory_limit, max_tasks_per_child, lambda path: [_run_isolated(path, args, memory_limit)])
+
+
+def _run_tasks(
+    task: Callable,
+    items: list,
+    args: tuple,
+    workers: int | None,
+    memory_limit: int | None,
+    max_tasks_per_child: int | None,
+    recover: Callable[[Any], list],
+    window: int | None = None,
+) -> Generator[Any, None, None]:
+    """
+    Ejecuta task(item, *args) en un ProcessPoolExecutor y devuelve los resultados en el orden de items.
+
+    Solo se mantienen en vuelo window tareas (por defecto, cuatro por worker). Si un worker muere (segfault,
+    OOM killer...) el pool entero queda roto: para cada tarea que estaba en vuelo se devuelven los resultados
+    de recover(item), que se llama en el proceso padre, y se crea un pool nuevo para el resto
+    """
+
+    def new_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(memory_limit,), max_tasks_per_child=max_tasks_per_child)
+
+    executor = new_executor()
+    window = window or (workers or os.cpu_count() or 1) * 4
+    inflight: dict[Future, int] = {}
+    done: dict[int, list] = {}
+    next_submit = 0
+    next_yield = 0
+    try:
+        while next_yield < len(items):
+            while next_submit < len(items) and next_submit < next_yield + window:
+                inflight[executor.submit(task, items[next_submit], *args)] = next_submit
+                next_submit += 1
+
+            finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            broken: list[int] = []
+            for future in finished:
+                index = inflight.pop(future)
+                try:
+                    done[index] = [future.result()]
+                except BrokenProcessPool:
+                    broken.append(index)
+
+            if broken:
+                for future, index in inflight.items():
+                    if future.done() and future.exception() is None:
+                        done[index] = [future.result()]
+                    else:
+                        broken.append(index)
+                inflight.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                for index in sorted(broken):
+                    done[index] = recover(items[index])
+                executor = new_executor()
+
+            while next_yield in done:
+                yield from done.pop(next_yield)
+                next_yield += 1
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_group_isolated(task: Callable, group: list[str], args: tuple, memory_limit: int | None) -> list:
+    """
+    Vuelve a ejecutar, fichero a fichero y cada uno en un worker propio, una tarea de grupo que estaba en vuelo
+    cuando se rompio el pool. Para el fichero que vuelve a romper el worker se usa la salida de la tarea sin
+    ficheros, ejecutada en el proceso padre, con su BatchResult de error
+    """
+    outputs = []
+    for path in group:
+        with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(memory_limit,)) as executor:
+            try:
+                outputs.append(executor.submit(task, [path], *args).result())
+                continue
+            except BrokenProcessPool:
+                pass
+        output = task([], *args)
+        output[1].append(_broken_result(path))
+        outputs.append(output)
+    return outputs
+
+
+def map_groups(
+    task: Callable[..., tuple],
+    groups: list[list[str]],
+    args: tuple = (),
+    workers: int | None = None,
+    memory_limit: int | None = None,
+    max_tasks_per_child: int | None = None,
+    window: int | None = None,
+) -> Generator[tuple, None, None]:
+    """
+    Ejecuta task(grupo, *args) para cada grupo de rutas con el mismo aislamiento que parse_many, y devuelve las
+    salidas en el orden de los grupos. Es la base de las tareas que resumen varios ficheros en el worker
+    (columnar.parse_columnar, aggregates.aggregate_many, chunked.ChunkedFrames).
+
+    task debe ser picklable y devolver una tupla cuyo segundo elemento es la lista de BatchResult de sus ficheros.
+    Para el limite de tiempo por fichero, task debe pasar timeout a _process_file. Con workers=0 se ejecuta
+    todo en el proceso actual. Si un worker muere, cada grupo que estaba en vuelo se reprocesa fichero a fichero
+    y da una salida por fichero en lugar de una por grupo: quien consume las salidas no debe suponer que hay
+    exactamente una por grupo
+    """
+    if workers == 0:
+        for group in groups:
+            yield task(group, *args)
+        return
+    yield from _run_tasks(task, groups, args, workers, memory_limit, max_tasks_per_child, lambda group: _run_group_isolated(task, group, args, memory_limit), window)
+
+
+def _timed_read(path: str, reader: Callable[[str], bytes]) -> tuple[bytes, float]:
+    start = perf_counter()
+    return reader(path), perf_counter() - start
+
+
+def _run_threads(paths: list[str], args: tuple, workers: int | None, prefetch: int | None) -> Generator[BatchResult, None, None]:
+    """
+    Lee y parsea los ficheros en hilos del proceso actual y devuelve los resultados en el orden de entrada.
+
+    Un pool de hilos lee los bytes de los ficheros y otro los parsea en cuanto estan leidos. Solo se leen por
+    adelantado prefetch ficheros desde el primero que falta por devolver, asi que la memoria queda acotada
+    aunque un fichero lento retenga la salida
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    prefetch = max(prefetch or workers * 4, 1)
+    *process_args, reader = args
+    reader = reader or _read_file
+
+    readers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cex-read")
+    parsers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cex-parse")
+    reads: dict[Future, int] = {}
+    parses: dict[Future, tuple[int, float]] = {}
+    done: dict[int, BatchResult] = {}
+    next_read = 0
+    next_yield = 0
+    try:
+        while next_yield < len(paths):
+            while next_read < len(paths) and next_read < next_yield + prefetch:
+                reads[readers.submit(_timed_read, paths[next_read], reader)] = next_read
+                next_read += 1
+
+            finished, _ = wait([*reads, *parses], return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in reads:
+                    index = reads.pop(future)
+                    try:
+                        source, seconds = future.result()
+                    except Exception as error:
+                        done[index] = BatchResult(paths[index], error_class=type(error).__name__, error=str(error))
+                        continue
+                    parses[parsers.submit(_process_file, paths[index], *process_args, None, source)] = (index, seconds)
+                else:
+                    index, seconds = parses.pop(future)
+                    result = future.result()
+                    result.timings = {"read": seconds, **result.timings}
+                    done[index] = result
+
+            while next_yield in done:
+                yield done.pop(next_yield)
+                next_yield += 1
+    finally:
+        readers.shutdown(wait=True, cancel_futures=True)
+        parsers.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,64 @@
+"""
+Throughput y memoria de pico de cada backend XML sobre copias del fixture.
+
+- lxml / etree: ParserCEX con ese backend + records.flatten (registro completo)
+- lxml (proyeccion): ParserCEX + records.flatten de FIELDS
+- expat (proyeccion): expat_records.ExpatExtractor de FIELDS, sin arbol
+
+Cada modo se ejecuta en un proceso nuevo. La memoria es el incremento de ru_maxrss manteniendo vivos los
+arboles (o registros) de todos los ficheros, que es lo que ocupa un lote antes de escribirse.
+
+    python benchmarks/bench_backends.py [ficheros]
+"""
+
+import importlib
+from multiprocessing import get_context
+from pathlib import Path
+import resource
+import sys
+from time import perf_counter
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+FIXTURE = ROOT / "test" / "test_cee.xml"
+FIELDS = "IdentificacionEdificio.ZonaClimatica,IdentificacionEdificio.AnoConstruccion,Calificacion.EmisionesCO2.Global,Consumo.EnergiaPrimariaNoRenovable.Global"
+
+
+def run(mode: str, files: int) -> tuple[float, float]:
+    parser_cex = importlib.import_module(f"{ROOT.name}.parser_cex")
+    records = importlib.import_module(f"{ROOT.name}.records")
+    expat_records = importlib.import_module(f"{ROOT.name}.expat_records")
+
+    if mode == "expat (proyeccion)":
+        extract = expat_records.ExpatExtractor(FIELDS)
+        work = lambda: (None, extract(FIXTURE))  # noqa: E731
+    else:
+        backend = mode.split()[0]
+        fields = FIELDS if "proyeccion" in mode else None
+
+        def work():
+            cex = parser_cex.ParserCEX(FIXTURE, backend=backend)
+            return cex, records.flatten(cex, fields)
+
+    work()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = perf_counter()
+    kept = [work() for _ in range(files)]
+    elapsed = perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    del kept
+    return elapsed, peak / 1024
+
+
+def main(files: int = 2000) -> None:
+    context = get_context("spawn")
+    print(f"{files} ficheros de {FIXTURE.stat().st_size / 1024:.0f} KB")
+    for mode in ("lxml", "etree", "lxml (proyeccion)", "expat (proyeccion)"):
+        with context.Pool(1) as pool:
+            elapsed, peak = pool.apply(run, (mode, files))
+        print(f"{mode:<20} {files / elapsed:10.0f} ficheros/s  {peak:10.1f} MB de pico")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Memoria de pico al construir las tablas de un corpus: todo de una vez frente a ChunkedFrames con presupuesto.
+
+El corpus son copias del fixture. Cada modo se ejecuta en un proceso nuevo (spawn) y se mide el incremento
+de ru_maxrss; el consumidor solo cuenta filas y el parseo va en el mismo proceso (workers=0).
+
+    python benchmarks/bench_chunked.py [ficheros] [presupuesto_mb]
+"""
+
+import importlib
+from multiprocessing import get_context
+from pathlib import Path
+import resource
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+
+def run(mode: str, paths: list[str], budget: int) -> tuple[float, float, int, int]:
+    import pandas  # noqa: F401  (no se cuenta en el pico)
+
+    chunked = importlib.import_module(f"{ROOT.name}.chunked")
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = perf_counter()
+    rows = 0
+    chunks = 0
+    if mode == "todo":
+        # Un unico bloque: el corpus completo en memoria
+        budget = 1 << 50
+    for frames in chunked.iter_frames(paths, budget, workers=0, group_size=64):
+        rows += sum(len(frame) for frame in frames.values())
+        chunks += 1
+        del frames
+    elapsed = perf_counter() - start
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024, rows, chunks
+
+
+def main(files: int = 8000, budget_mb: int = 8) -> None:
+    folder = Path(tempfile.mkdtemp())
+    try:
+        source = ROOT / "test" / "test_cee.xml"
+        paths = []
+        for i in range(files):
+            path = folder / f"{i:06d}.xml"
+            shutil.copy(source, path)
+            paths.append(str(path))
+
+        context = get_context("spawn")
+        for mode in ("todo", "bloques"):
+            with context.Pool(1) as pool:
+                elapsed, peak, rows, chunks = pool.apply(run, (mode, paths, budget_mb << 20))
+            print(f"{mode:<8} {elapsed:7.2f}s  {peak:8.1f} MB de pico  {rows} filas en {chunks} bloques")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,65 @@
+"""
+Tiempo de envelope_metrics sobre un corpus sintetico ya cargado en arrays (sin parsear XML).
+
+Cada edificio replica la envolvente del fixture, con un numero de elementos variable por tabla.
+
+    python benchmarks/bench_envelope.py [edificios]
+"""
+
+import importlib
+from pathlib import Path
+import sys
+from time import perf_counter
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+envelope = importlib.import_module(f"{ROOT.name}.envelope")
+parser_cex = importlib.import_module(f"{ROOT.name}.parser_cex")
+
+FIXTURE = envelope.EnvelopeArrays.from_certificates([parser_cex.ParserCEX(ROOT / "test" / "test_cee.xml")])
+
+
+def synthetic_table(table, buildings: int, rng: np.random.Generator):
+    """
+    Repite los elementos del fixture con entre 0 y el doble de elementos por edificio
+    """
+    template = len(table.medida)
+    counts = rng.integers(0, 2 * template + 1, buildings)
+    offsets = np.zeros(buildings + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    index = np.arange(offsets[-1]) % template
+    return envelope.RaggedTable(
+        offsets,
+        table.medida[index] * rng.uniform(0.5, 1.5, len(index)),
+        table.transmitancia[index],
+        table.orientacion[index],
+        table.exterior[index],
+    )
+
+
+def main(buildings: int = 100_000) -> None:
+    rng = np.random.default_rng(0)
+    arrays = envelope.EnvelopeArrays(
+        list(range(buildings)),
+        synthetic_table(FIXTURE.opacos, buildings, rng),
+        synthetic_table(FIXTURE.huecos, buildings, rng),
+        synthetic_table(FIXTURE.puentes, buildings, rng),
+        FIXTURE.superficie.repeat(buildings),
+        FIXTURE.volumen.repeat(buildings),
+    )
+    elements = sum(len(table.medida) for table in (arrays.opacos, arrays.huecos, arrays.puentes))
+    print(f"{buildings} edificios, {elements} elementos")
+
+    start = perf_counter()
+    envelope.envelope_metrics(arrays)
+    print(f"envelope_metrics (primera llamada, calcula ids):  {perf_counter() - start:8.3f}s")
+    start = perf_counter()
+    envelope.envelope_metrics(arrays)
+    print(f"envelope_metrics:                                 {perf_counter() - start:8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""
+Tiempo de arranque en frio: importar el nucleo y parsear un certificado en un proceso nuevo.
+
+    python benchmarks/bench_import.py [repeticiones]
+
+El objetivo es que 'import + parse' quede por debajo de COLD_START_BUDGET
+"""
+
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+
+
+ROOT = Path(__file__).parent.parent
+XML = ROOT / "test" / "test_cee.xml"
+
+# Presupuesto de arranque en frio (import + parseo de un certificado) en segundos
+COLD_START_BUDGET = 0.5
+
+SNIPPETS = {
+    "import parser_cex": "import parser_cex",
+    "import + parse": f"import parser_cex; parser_cex.ParserCEX({str(XML)!r}).IdentificacionEdificio.ZonaClimatica",
+    "import + parse + df": f"import parser_cex; parser_cex.ParserCEX({str(XML)!r}).DatosEnvolventeTermica.CerramientosOpacos.df",
+}
+
+TIMER = """
+from time import perf_counter
+start = perf_counter()
+{snippet}
+elapsed = perf_counter() - start
+import sys
+print(elapsed, "pandas" in sys.modules)
+"""
+
+
+def cold_start(snippet: str) -> tuple[float, bool]:
+    output = subprocess.run([sys.executable, "-c", TIMER.format(snippet=snippet)], cwd=ROOT, capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), output[1] == "True"
+
+
+def main(repeat: int = 10) -> None:
+    for name, snippet in SNIPPETS.items():
+        runs = [cold_start(snippet) for _ in range(repeat)]
+        times = [elapsed for elapsed, _ in runs]
+        print(f"{name:<22} mediana {statistics.median(times) * 1000:8.1f}ms  min {min(times) * 1000:8.1f}ms  pandas cargado: {runs[0][1]}")
+        if name == "import + parse" and statistics.median(times) > COLD_START_BUDGET:
+            print(f"  por encima del presupuesto de {COLD_START_BUDGET * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,72 @@
+"""
+Anonimizacion de un certificado grande: etree.parse + cambios + write frente a redact.redact (iterparse + xmlfile).
+
+El fichero de prueba es el fixture con Plano e Imagen de megas MB cada uno y elementos de la envolvente
+repetidos. Cada modo se ejecuta en un proceso nuevo y se mide el incremento de ru_maxrss.
+
+    python benchmarks/bench_redact.py [megas] [repeticiones_envolvente]
+"""
+
+import importlib
+from multiprocessing import get_context
+from pathlib import Path
+import resource
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+FIXTURE = ROOT / "test" / "test_cee.xml"
+
+
+def make_input(folder: Path, megas: int, repeats: int) -> Path:
+    text = FIXTURE.read_text(encoding="utf-8")
+    blob = "QUJD" * (megas * 1024 * 256)
+    text = text.replace("plano codificado en Base64", blob).replace("imagen codificada en Base64", blob)
+    start, end = text.index("<CerramientosOpacos>") + len("<CerramientosOpacos>"), text.index("</CerramientosOpacos>")
+    text = text[:start] + text[start:end] * repeats + text[end:]
+    path = folder / "grande.xml"
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def run(mode: str, source: str, output: str) -> tuple[float, float]:
+    from lxml import etree
+
+    redact = importlib.import_module(f"{ROOT.name}.redact")
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = perf_counter()
+    if mode == "redact":
+        redact.redact(source, output)
+    else:
+        redactor = redact.Redactor()
+        tree = etree.parse(source, etree.XMLParser(huge_tree=True))
+        root = tree.getroot()
+        for pattern, action in redactor.rules.items():
+            for element in root.findall(pattern.replace(".", "/")):
+                if action == "drop":
+                    element.getparent().remove(element)
+                else:
+                    element.text = redactor.apply(action, element.text or "")
+        tree.write(output, encoding="utf-8", xml_declaration=True)
+    elapsed = perf_counter() - start
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+
+
+def main(megas: int = 20, repeats: int = 2000) -> None:
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory() as folder:
+        # El fichero se genera en otro proceso: ru_maxrss se hereda a traves de exec y el principal debe seguir pequeño
+        with context.Pool(1) as pool:
+            source = pool.apply(make_input, (Path(folder), megas, repeats))
+        print(f"Fichero de {source.stat().st_size / 1e6:.1f} MB")
+        for mode in ("parse + write", "redact"):
+            with context.Pool(1) as pool:
+                elapsed, peak = pool.apply(run, (mode, str(source), str(Path(folder) / "salida.xml")))
+            print(f"{mode:<15} {elapsed:8.2f}s  {peak:10.1f} MB de pico")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
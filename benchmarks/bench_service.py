@@ -0,0 +1,102 @@
+"""
+Prueba de carga del servicio de parseo: latencias p50/p99 de los clientes interactivos, solos y con clientes
+bulk enviando lotes de rutas a la vez.
+
+El servidor (service.make_server con un WarmPool) se arranca en este proceso; los clientes son hilos con
+conexiones HTTP persistentes. Los interactivos envian el XML del fixture en el cuerpo y los bulk lotes de
+rutas a copias del fixture.
+
+    python benchmarks/bench_service.py [segundos] [clientes_interactivos] [clientes_bulk] [workers]
+"""
+
+import http.client
+import importlib
+import json
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import threading
+from time import perf_counter
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+service = importlib.import_module(f"{ROOT.name}.service")
+
+FIXTURE = ROOT / "test" / "test_cee.xml"
+BULK_BATCH = 64
+
+
+def client(port: int, lane: str, body: bytes, content_type: str, stop: threading.Event, latencies: list[float]) -> None:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    while not stop.is_set():
+        start = perf_counter()
+        connection.request("POST", f"/parse?lane={lane}", body=body, headers={"Content-Type": content_type})
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise Exception(f"Respuesta {response.status}")
+        latencies.append(perf_counter() - start)
+    connection.close()
+
+
+def phase(port: int, seconds: float, interactive: int, bulk: int, paths: list[str]) -> dict[str, list[float]]:
+    stop = threading.Event()
+    latencies: dict[str, list[float]] = {"interactive": [], "bulk": []}
+    xml = FIXTURE.read_bytes()
+    batch = json.dumps({"paths": paths[:BULK_BATCH]}).encode("utf-8")
+    threads = [threading.Thread(target=client, args=(port, "interactive", xml, "application/xml", stop, latencies["interactive"])) for _ in range(interactive)]
+    threads += [threading.Thread(target=client, args=(port, "bulk", batch, "application/json", stop, latencies["bulk"])) for _ in range(bulk)]
+    for thread in threads:
+        thread.start()
+    threading.Timer(seconds, stop.set).start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def report(title: str, seconds: float, latencies: dict[str, list[float]]) -> None:
+    print(title)
+    for lane, values in latencies.items():
+        if not values:
+            continue
+        values = np.array(values) * 1000
+        files = len(values) * (BULK_BATCH if lane == "bulk" else 1)
+        print(
+            f"  {lane:<12} {len(values):6d} peticiones  {files / seconds:8.1f} ficheros/s"
+            f"  p50 {np.percentile(values, 50):8.1f} ms  p99 {np.percentile(values, 99):8.1f} ms"
+        )
+
+
+def main(seconds: float = 10, interactive: int = 8, bulk: int = 2, workers: int | None = None) -> None:
+    folder = Path(tempfile.mkdtemp())
+    try:
+        paths = []
+        for i in range(BULK_BATCH):
+            path = folder / f"{i:04d}.xml"
+            shutil.copy(FIXTURE, path)
+            paths.append(str(path))
+
+        with service.ParseService(workers=workers) as parse_service:
+            server = service.make_server(parse_service, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            port = server.server_address[1]
+            try:
+                # Calentamiento: arranca los workers antes de medir
+                phase(port, 1, 1, 0, paths)
+                report(f"{interactive} clientes interactivos", seconds, phase(port, seconds, interactive, 0, paths))
+                report(f"{interactive} interactivos + {bulk} bulk (lotes de {BULK_BATCH})", seconds, phase(port, seconds, interactive, bulk, paths))
+                print("metricas del servidor:", json.dumps(parse_service.metrics()["lanes"]))
+            finally:
+                server.shutdown()
+                server.server_close()
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(float(args[0]),) if args else (), *(int(arg) for arg in args[1:]))
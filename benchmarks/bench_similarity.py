@@ -0,0 +1,57 @@
+"""
+Tiempo de consulta de SimilarityIndex sobre un corpus sintetico (sin parsear XML).
+
+Las caracteristicas se generan alrededor de las del fixture y los edificios se reparten entre las zonas
+climaticas y tipos de edificio indicados.
+
+    python benchmarks/bench_similarity.py [certificados] [consultas]
+"""
+
+import importlib
+from pathlib import Path
+import sys
+from time import perf_counter
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+similarity = importlib.import_module(f"{ROOT.name}.similarity")
+parser_cex = importlib.import_module(f"{ROOT.name}.parser_cex")
+
+ZONAS = ("A3", "A4", "B3", "B4", "C1", "C2", "C3", "C4", "D1", "D2", "D3", "E1")
+TIPOS = ("BloqueDeViviendaCompleto", "ViviendaIndividualEnBloque", "ViviendaUnifamiliar", "EdificioCompleto", "LocalTerciario")
+
+
+def main(certificates: int = 1_000_000, queries: int = 200) -> None:
+    rng = np.random.default_rng(0)
+    base = np.array(similarity.similarity_dict(parser_cex.ParserCEX(ROOT / "test" / "test_cee.xml"))["features"])
+    features = base * rng.uniform(0.5, 1.5, (certificates, len(base)))
+    partitions = list(zip(rng.choice(ZONAS, certificates), rng.choice(TIPOS, certificates)))
+    values = [{"partition": partition, "features": row} for partition, row in zip(partitions, features)]
+
+    start = perf_counter()
+    index = similarity.SimilarityIndex.from_certificates(values)
+    print(f"{certificates} certificados, {len(index.partitions)} particiones: indice en {perf_counter() - start:.2f}s")
+    # Las particiones y las normas se calculan en la primera consulta: se preparan aqui para medir solo las consultas
+    index.groups
+    index.norms
+
+    start = perf_counter()
+    for value in values[:queries]:
+        index.query(value, k=20)
+    print(f"query (particion exacta):       {1000 * (perf_counter() - start) / queries:8.2f} ms/consulta")
+
+    start = perf_counter()
+    index.query_many(values[:queries], k=20)
+    print(f"query_many (particion exacta):  {1000 * (perf_counter() - start) / queries:8.2f} ms/consulta")
+
+    start = perf_counter()
+    for value in values[:10]:
+        index.query(value, k=20, exact=False)
+    print(f"query (todo el indice):         {1000 * (perf_counter() - start) / 10:8.2f} ms/consulta")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
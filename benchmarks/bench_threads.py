@@ -0,0 +1,62 @@
+"""
+Ingesta con hilos, procesos y en serie sobre un almacen con latencia simulada (NFS, SMB...).
+
+Cada lectura espera latency segundos antes de devolver los bytes del fixture, como una apertura + lectura
+en un disco de red. Se usa parse_many con extract=records.flatten en los tres modos. En un CPython sin GIL
+(3.13t) el parseo y la extraccion en hilos tambien escalan con los nucleos; se indica en la cabecera.
+
+    python benchmarks/bench_threads.py [ficheros] [workers] [latencia_ms]
+"""
+
+import importlib
+from pathlib import Path
+import sys
+from time import perf_counter, sleep
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+batch = importlib.import_module(f"{ROOT.name}.batch")
+records = importlib.import_module(f"{ROOT.name}.records")
+
+FIXTURE = ROOT / "test" / "test_cee.xml"
+
+
+class SlowStore(object):
+    """
+    reader de parse_many con latencia fija por fichero. Es picklable para el modo proceso
+    """
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.data = FIXTURE.read_bytes()
+
+    def __call__(self, path: str) -> bytes:
+        sleep(self.latency)
+        return self.data
+
+
+def run(files: int, workers: int, executor: str, reader: SlowStore) -> float:
+    paths = [f"almacen/{i}.xml" for i in range(files)]
+    start = perf_counter()
+    for result in batch.parse_many(paths, extract=records.flatten, workers=workers, executor=executor, reader=reader):
+        if not result.ok:
+            raise Exception(result.error)
+    return files / (perf_counter() - start)
+
+
+def main(files: int = 400, workers: int = 16, latency_ms: float = 20.0) -> None:
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]} ({'con' if gil else 'sin'} GIL), {files} ficheros, {workers} workers, latencia {latency_ms} ms")
+    reader = SlowStore(latency_ms / 1000)
+    for name, workers_, executor in (("serie", 0, "process"), ("procesos", workers, "process"), ("hilos", workers, "thread")):
+        count = files if workers_ else max(files // 10, 1)
+        print(f"{name:<10} {run(count, workers_, executor, reader):10.1f} ficheros/s")
+    reader.latency = 0.0
+    print("sin latencia:")
+    for name, workers_, executor in (("serie", 0, "process"), ("procesos", workers, "process"), ("hilos", workers, "thread")):
+        print(f"{name:<10} {run(files, workers_, executor, reader):10.1f} ficheros/s")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i == 2 else int(arg) for i, arg in enumerate(sys.argv[1:])))
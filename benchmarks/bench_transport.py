@@ -0,0 +1,113 @@
+"""
+Coste de devolver registros desde los workers al proceso padre: pickle de diccionarios frente a
+columnas en memoria compartida (NumPy) y stream IPC de Arrow.
+
+No se parsea XML: cada worker replica el registro aplanado del fixture para medir solo el transporte.
+
+    python benchmarks/bench_transport.py [workers] [bloques] [registros_por_bloque]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+from multiprocessing import resource_tracker
+from pathlib import Path
+import sys
+import pickle
+from time import perf_counter
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+columnar = importlib.import_module(f"{ROOT.name}.columnar")
+parser_cex = importlib.import_module(f"{ROOT.name}.parser_cex")
+records = importlib.import_module(f"{ROOT.name}.records")
+
+RECORD = records.flatten(parser_cex.ParserCEX(ROOT / "test" / "test_cee.xml"))
+
+
+def make_records(size: int) -> list[dict]:
+    return [{"path": f"certificado_{i}.xml", **RECORD} for i in range(size)]
+
+
+def task_pickle(size: int):
+    return make_records(size)
+
+
+def task_shm(size: int):
+    return columnar.ColumnBatch.from_records(make_records(size)).to_shared()
+
+
+def task_arrow(size: int):
+    return columnar.ArrowBatch.from_records(make_records(size))
+
+
+def run_pickle(executor, sizes):
+    rows = []
+    for part in executor.map(task_pickle, sizes):
+        rows.extend(part)
+    return len(rows)
+
+
+def run_shared(executor, sizes, task):
+    handles, parts = [], []
+    for descriptor in executor.map(task, sizes):
+        handle, part = descriptor.attach()
+        handles.append(handle)
+        parts.append(part)
+        del part
+    if task is task_arrow:
+        import pyarrow as pa
+
+        length = columnar._copy_table(pa.concat_tables(parts)).num_rows
+    else:
+        length = len(columnar.ColumnBatch.concat(parts))
+    parts.clear()
+    columnar._release(handles)
+    return length
+
+
+def parent_cost(size: int) -> None:
+    """
+    Tiempo que pasa el proceso padre recibiendo un bloque: es la parte que no escala con el numero de workers
+    """
+    payload = pickle.dumps(task_pickle(size))
+    start = perf_counter()
+    pickle.loads(payload)
+    print(f"padre, pickle.loads de {size} registros:          {(perf_counter() - start) * 1000:8.2f}ms")
+
+    descriptor = task_shm(size)
+    start = perf_counter()
+    handle, part = descriptor.attach()
+    columnar.ColumnBatch.concat([part])
+    del part
+    print(f"padre, attach + concat de {size} registros:       {(perf_counter() - start) * 1000:8.2f}ms")
+    columnar._release([handle])
+
+
+def main(workers: int = 8, chunks: int = 32, size: int = 2000) -> None:
+    resource_tracker.ensure_running()
+    sizes = [size] * chunks
+    modes = {
+        "pickle dicts": lambda executor: run_pickle(executor, sizes),
+        "shared memory": lambda executor: run_shared(executor, sizes, task_shm),
+    }
+    try:
+        import pyarrow  # noqa: F401
+
+        modes["arrow ipc"] = lambda executor: run_shared(executor, sizes, task_arrow)
+    except ImportError:
+        pass
+
+    print(f"{workers} workers, {chunks} bloques x {size} registros, {len(RECORD) + 1} columnas")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(task_pickle, [1] * workers))
+        for name, run in modes.items():
+            start = perf_counter()
+            rows = run(executor)
+            elapsed = perf_counter() - start
+            print(f"{name:<14} {elapsed:8.3f}s  {rows / elapsed:12.0f} registros/s")
+    parent_cost(size)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
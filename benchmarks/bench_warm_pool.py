@@ -0,0 +1,51 @@
+"""
+Lotes pequeños y frecuentes: parse_many (pool nuevo en cada lote) frente a pool.WarmPool (workers persistentes).
+
+Cada lote procesa copias del fixture con records.RecordExtractor. parse_many se mide con el metodo de
+arranque por defecto de la plataforma y con spawn, que es el que se usa en macOS y Windows o cuando el
+proceso padre tiene hilos.
+
+    python benchmarks/bench_warm_pool.py [lotes] [ficheros_por_lote] [workers]
+"""
+
+import importlib
+import multiprocessing
+from pathlib import Path
+import sys
+from time import perf_counter
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT.parent))
+
+batch = importlib.import_module(f"{ROOT.name}.batch")
+pool = importlib.import_module(f"{ROOT.name}.pool")
+records = importlib.import_module(f"{ROOT.name}.records")
+
+FIXTURE = ROOT / "test" / "test_cee.xml"
+
+
+def main(batches: int = 10, files: int = 100, workers: int = 4) -> None:
+    paths = [FIXTURE] * files
+    extract = records.RecordExtractor()
+    print(f"{batches} lotes de {files} ficheros, {workers} workers")
+
+    for method in (multiprocessing.get_start_method(), "spawn"):
+        multiprocessing.set_start_method(method, force=True)
+        start = perf_counter()
+        for _ in range(batches):
+            list(batch.parse_many(paths, extract=extract, workers=workers))
+        print(f"parse_many ({method}):{'':<{8 - len(method)}} {(perf_counter() - start) / batches * 1000:8.1f} ms/lote")
+
+    with pool.WarmPool(extract=extract, workers=workers, chunk_size=8) as warm:
+        start = perf_counter()
+        warm.start()
+        warm.parse(paths)
+        print(f"WarmPool (primer lote):   {(perf_counter() - start) * 1000:8.1f} ms")
+        start = perf_counter()
+        for _ in range(batches):
+            warm.parse(paths)
+        print(f"WarmPool:                 {(perf_counter() - start) / batches * 1000:8.1f} ms/lote")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,353 @@
+"""
+Tablas de un corpus de cualquier tamaño por bloques, con un presupuesto de memoria por bloque.
+
+Una sola tabla del corpus completo no cabe en memoria cuando las tablas de la envolvente llegan a decenas de
+millones de filas. ChunkedFrames parsea los ficheros en grupos (en workers, como batch.parse_many), junta
+los grupos en columnas (columnar.ColumnBatch) y corta un bloque cuando la memoria estimada de sus tablas
+llegaria al presupuesto. La estimacion parte del tamaño de los XML y de lo medido hasta el momento: filas por
+byte de XML (en los grupos parseados) y bytes por fila (en las tablas ya entregadas) de cada tabla.
+
+El parseo va por delante en un hilo. Si el consumidor es mas lento, los bloques que no caben en memoria
+(max_pending) se vuelcan a disco y se leen cuando les toca, asi que la memoria queda acotada en torno a
+(max_pending + 2) * budget:
+
+    with ChunkedFrames(paths, budget=1 << 30, workers=8) as chunks:
+        for frames in chunks:
+            frames["IdentificacionEdificio"], frames["CerramientosOpacos"]  # una tabla por seccion y por tabla de la envolvente
+"""
+
+from collections import deque
+from functools import partial
+import os
+from pathlib import Path
+import pickle
+import shutil
+import tempfile
+import threading
+from typing import Any, Generator, Iterable
+
+from .batch import BatchResult, BatchStats, _process_file, map_groups
+from .columnar import ColumnBatch
+from .frames import ENVELOPE_TABLES, FRAME_BACKENDS, _is_categorical, to_frame
+from .parser_cex import ParserCEX
+from .records import SECTIONS, flatten
+
+
+RECORDS = "records"
+"""
+Nombre de la tabla de registros aplanados en MemoryBudget. En los bloques se entrega dividida por seccion
+"""
+
+
+def _extract(cex: ParserCEX, fields: list[str] | str | None, tables: tuple[str, ...]) -> tuple[dict, dict[str, list[dict]]]:
+    envolvente = cex.DatosEnvolventeTermica
+    return flatten(cex, fields), {table: getattr(envolvente, table).to_records() for table in tables}
+
+
+def _process_group(
+    paths: list[str],
+    fields: list[str] | str | None,
+    tables: tuple[str, ...],
+    timeout: float | None = None,
+) -> tuple[dict[str, ColumnBatch], list[BatchResult], int]:
+    """
+    Tarea de un worker: parsea un grupo de ficheros y devuelve sus tablas en columnas, los BatchResult sin valor
+    y los bytes de XML leidos
+    """
+    extract = partial(_extract, fields=fields, tables=tables)
+    rows: dict[str, list[dict]] = {RECORDS: [], **{table: [] for table in tables}}
+    results = []
+    size = 0
+    for path in paths:
+        result = _process_file(path, extract, None, False, timeout)
+        if result.ok:
+            size += os.path.getsize(path)
+            record, envelope = result.value
+            rows[RECORDS].append({"path": path, **record})
+            for table in tables:
+                rows[table].extend({"path": path, **row} for row in envelope[table])
+        result.value = None
+        results.append(result)
+    return {table: ColumnBatch.from_records(values) for table, values in rows.items()}, results, size
+
+
+def _nbytes(batch: ColumnBatch, backend: str, categorical: bool) -> int:
+    """
+    Bytes aproximados de la tabla de batch en el backend, antes de construirla: los buffers de las columnas y,
+    en pandas, un objeto str por cadena que no es categorica (unos 49 bytes de cabecera y el puntero)
+    """
+    total = 0
+    for name, column in batch.columns.items():
+        total += sum(buffer.nbytes for buffer in column.buffers)
+        if backend == "pandas" and column.kind == "str" and not (categorical and _is_categorical(name)):
+            total += 57 * int(column.valid.sum())
+        elif backend == "pandas" and column.kind == "obj":
+            total += 57 * sum(value is not None for value in column.values)
+    return total
+
+
+class MemoryBudget(object):
+    """
+    Estimacion de la memoria de las tablas de un bloque a partir de los bytes de XML de sus ficheros.
+
+    Por cada tabla se miden las filas por byte de XML (observe_input, con cada grupo parseado) y los bytes por
+    fila (observe_frames, con las tablas entregadas en el backend; hasta entonces, la aproximacion de observe_input)
+    """
+
+    __slots__ = ("budget", "_input", "_rows", "_columnar", "_frame_rows", "_frame_bytes", "_lock")
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self._input = 0
+        self._rows: dict[str, int] = {}
+        self._columnar: dict[str, int] = {}
+        self._frame_rows: dict[str, int] = {}
+        self._frame_bytes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} budget={self.budget} bytes_per_row={self.bytes_per_row()} >"
+
+    def observe_input(self, size: int, rows: dict[str, int], sizes: dict[str, int]) -> None:
+        with self._lock:
+            self._input += size
+            for table, count in rows.items():
+                self._rows[table] = self._rows.get(table, 0) + count
+                self._columnar[table] = self._columnar.get(table, 0) + sizes[table]
+
+    def observe_frames(self, rows: dict[str, int], sizes: dict[str, int]) -> None:
+        with self._lock:
+            for table, count in rows.items():
+                self._frame_rows[table] = self._frame_rows.get(table, 0) + count
+                self._frame_bytes[table] = self._frame_bytes.get(table, 0) + sizes[table]
+
+    def bytes_per_row(self) -> dict[str, float]:
+        with self._lock:
+            result = {}
+            for table, rows in self._rows.items():
+                if self._frame_rows.get(table):
+                    result[table] = self._frame_bytes[table] / self._frame_rows[table]
+                elif rows:
+                    result[table] = self._columnar[table] / rows
+            return result
+
+    def estimate(self, size: int) -> float:
+        """
+        Bytes estimados de las tablas de ficheros que suman size bytes de XML (0 si aun no hay medidas)
+        """
+        bytes_per_row = self.bytes_per_row()
+        with self._lock:
+            if not self._input:
+                return 0.0
+            return size * sum(self._rows[table] / self._input * per_row for table, per_row in bytes_per_row.items())
+
+
+def _frame_bytes(frame: Any, backend: str) -> int:
+    if backend == "pandas":
+        return int(frame.memory_usage(deep=True).sum())
+    if backend == "polars":
+        return int(frame.estimated_size())
+    return int(frame.nbytes)
+
+
+class _Spilled(object):
+    __slots__ = ("path",)
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+
+class _Failed(object):
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class ChunkedFrames(object):
+    """
+    Iterador de bloques {tabla: DataFrame} de un corpus (ver el docstring del modulo).
+
+    - budget: bytes objetivo de las tablas de cada bloque
+    - tables: tablas de DatosEnvolventeTermica que se incluyen (ENVELOPE_TABLES por defecto; () para ninguna)
+    - fields: proyeccion de columnas de los registros, como en records.flatten
+    - backend, categorical: como en frames.to_frame
+    - workers: procesos (0 para parsear en el hilo productor); group_size: ficheros por tarea
+    - timeout, memory_limit: como en batch.parse_many. Si un worker muere, sus grupos se reprocesan fichero a fichero
+    - max_pending: bloques terminados que se guardan en memoria a la espera del consumidor; el resto va a disco
+    - spill_dir: directorio para los bloques volcados (uno temporal por defecto)
+
+    Cada bloque tiene una tabla por seccion de los registros (con la columna 'path') y una por tabla de la
+    envolvente (una fila por elemento y la columna 'path' del certificado). Los ficheros que fallan se cuentan en stats
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[Path | str],
+        budget: int = 256 << 20,
+        tables: Iterable[str] = ENVELOPE_TABLES,
+        fields: list[str] | str | None = None,
+        backend: str = "pandas",
+        categorical: bool = True,
+        workers: int | None = None,
+        group_size: int = 32,
+        max_pending: int = 1,
+        spill_dir: Path | str | None = None,
+        stats: BatchStats | None = None,
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ) -> None:
+        if backend not in FRAME_BACKENDS:
+            raise Exception(f"Backend '{backend}' no soportado. Se esperaba uno de {FRAME_BACKENDS}")
+        tables = tuple(tables)
+        for table in tables:
+            if table not in ENVELOPE_TABLES:
+                raise Exception(f"Tabla '{table}' no soportada. Se esperaba una de {ENVELOPE_TABLES}")
+
+        self.budget = MemoryBudget(budget)
+        self.backend = backend
+        self.categorical = categorical
+        self.max_pending = max_pending
+        self.stats = stats
+        self.chunks = 0
+        self.spilled = 0
+        self._paths = [str(path) for path in paths]
+        self._options = (fields, tables, workers, max(group_size, 1), timeout, memory_limit)
+        self._spill_dir = Path(tempfile.mkdtemp(prefix="parser_cex_chunks_", dir=spill_dir))
+        self._entries: deque = deque()
+        self._in_memory = 0
+        self._emitted = 0
+        self._done = False
+        self._stop = threading.Event()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} files={len(self._paths)} chunks={self.chunks} spilled={self.spilled} >"
+
+    def __enter__(self) -> "ChunkedFrames":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> "ChunkedFrames":
+        return self
+
+    def _groups(self) -> Generator[tuple[dict[str, ColumnBatch], list[BatchResult], int], None, None]:
+        fields, tables, workers, group_size, timeout, memory_limit = self._options
+        groups = [self._paths[i : i + group_size] for i in range(0, len(self._paths), group_size)]
+        # Como mucho dos tareas por worker en vuelo: los resultados no se acumulan si el productor se retrasa
+        window = 2 * (workers or os.cpu_count() or 1)
+        outputs = map_groups(_process_group, groups, (fields, tables, timeout), workers, memory_limit, window=window)
+        try:
+            for output in outputs:
+                if self._stop.is_set():
+                    return
+                yield output
+        finally:
+            # Al cerrar se cancelan las tareas pendientes y se espera a las que estan en curso
+            outputs.close()
+
+    def _produce(self) -> None:
+        groups = self._groups()
+        try:
+            pending: list[dict[str, ColumnBatch]] = []
+            size = 0
+            for batches, results, group_size in groups:
+                if self._stop.is_set():
+                    return
+                if self.stats is not None:
+                    for result in results:
+                        self.stats.update(result)
+                self.budget.observe_input(
+                    group_size,
+                    {table: batch.length for table, batch in batches.items()},
+                    {table: _nbytes(batch, self.backend, self.categorical) for table, batch in batches.items()},
+                )
+                if pending and self.budget.estimate(size + group_size) > self.budget.budget:
+                    self._emit(pending)
+                    pending, size = [], 0
+                pending.append(batches)
+                size += group_size
+            if pending:
+                self._emit(pending)
+        except BaseException as error:
+            self._put(_Failed(error))
+        finally:
+            groups.close()
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def _emit(self, pending: list[dict[str, ColumnBatch]]) -> None:
+        chunk = {table: ColumnBatch.concat([batches[table] for batches in pending]) for table in pending[0]}
+        with self._condition:
+            keep = self._in_memory < self.max_pending
+            if keep:
+                self._in_memory += 1
+        self._emitted += 1
+        if not keep:
+            # El consumidor va por detras: el bloque se guarda en disco hasta que lo pida
+            path = self._spill_dir / f"{self._emitted:08d}.pickle"
+            with open(path, "wb") as file:
+                pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+            chunk = _Spilled(path)
+        self._put(chunk)
+
+    def _put(self, entry: Any) -> None:
+        with self._condition:
+            if isinstance(entry, _Spilled):
+                self.spilled += 1
+            self._entries.append(entry)
+            self._condition.notify_all()
+
+    def __next__(self) -> dict[str, Any]:
+        with self._condition:
+            while not self._entries and not self._done:
+                self._condition.wait()
+            if not self._entries:
+                raise StopIteration
+            entry = self._entries.popleft()
+            if isinstance(entry, dict):
+                self._in_memory -= 1
+
+        if isinstance(entry, _Failed):
+            raise entry.error
+        if isinstance(entry, _Spilled):
+            with open(entry.path, "rb") as file:
+                entry, path = pickle.load(file), entry.path
+            path.unlink()
+        self.chunks += 1
+        return self._frames(entry)
+
+    def _frames(self, chunk: dict[str, ColumnBatch]) -> dict[str, Any]:
+        records = chunk.pop(RECORDS)
+        frames: dict[str, Any] = {}
+        sizes = {RECORDS: 0}
+        for section, batch in records.sections().items():
+            if section in SECTIONS:
+                frames[section] = to_frame(batch, self.backend, self.categorical)
+                sizes[RECORDS] += _frame_bytes(frames[section], self.backend)
+        for table, batch in chunk.items():
+            frames[table] = to_frame(batch, self.backend, self.categorical)
+            sizes[table] = _frame_bytes(frames[table], self.backend)
+        self.budget.observe_frames({RECORDS: records.length, **{table: batch.length for table, batch in chunk.items()}}, sizes)
+        return frames
+
+    def close(self) -> None:
+        """
+        Detiene el parseo (termina el grupo en curso) y borra los bloques volcados a disco
+        """
+        self._stop.set()
+        self._thread.join()
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+
+def iter_frames(paths: Iterable[Path | str], budget: int = 256 << 20, **options) -> Generator[dict[str, Any], None, None]:
+    """
+    Generador de bloques {tabla: DataFrame} con ChunkedFrames (ver sus opciones). Se cierra al terminar o al abandonarlo
+    """
+    with ChunkedFrames(paths, budget, **options) as chunks:
+        yield from chunks
@@ -0,0 +1,342 @@
+"""
+Conversor masivo de XML CEX a Parquet, CSV, NDJSON o SQLite.
+
+    python -m parser_xml_cex certificados/ salida.parquet --workers 8
+    python -m parser_xml_cex "2023/**/*.xml" salida.csv --fields "IdentificacionEdificio,Calificacion.*.Global"
+    python -m parser_xml_cex lote.zip salida.db --incremental --cache-dir .cache
+    python -m parser_xml_cex /mnt/nfs/certificados salida.parquet --executor thread --workers 32
+
+Varios nodos con un directorio compartido: cada uno ejecuta el mismo comando con --queue y al terminar
+se juntan las partes con --merge (ver shards.py)
+
+    python -m parser_xml_cex /compartido/certificados /compartido/salida.parquet --queue /compartido/cola.db
+    python -m parser_xml_cex /compartido/certificados /compartido/salida.parquet --queue /compartido/cola.db --merge
+"""
+
+import argparse
+import glob
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+import tarfile
+import tempfile
+from time import perf_counter
+from typing import Generator
+import zipfile
+import zlib
+
+from .batch import EXECUTORS, BatchStats, parse_many
+from .records import RecordExtractor
+from .shards import ShardQueue, merge, run_node
+from .writers import FORMATS, open_writer, output_format
+
+
+def _member_path(destination: Path, name: str) -> Path | None:
+    """
+    Ruta de un miembro del archivo dentro de destination, o None si es absoluta o sale del directorio
+    """
+    parts = Path(name).parts
+    if not parts or Path(name).is_absolute() or ".." in parts:
+        return None
+    return destination.joinpath(*parts)
+
+
+def _crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as file:
+        while block := file.read(1 << 20):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def _extract_archive(archive: Path, cache_dir: Path) -> list[Path]:
+    """
+    Descomprime los .xml de un zip o tar en cache_dir y devuelve sus rutas.
+
+    Los miembros que ya estan descomprimidos y no han cambiado (mismo tamaño y CRC en zip, mismo tamaño y mtime en
+    tar) no se vuelven a escribir: conservan su mtime y el manifiesto incremental no los toma por nuevos
+    """
+    destination = cache_dir / "archives" / archive.name
+    destination.mkdir(parents=True, exist_ok=True)
+    paths = []
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as file:
+            for info in file.infolist():
+                target = _member_path(destination, info.filename)
+                if info.is_dir() or target is None or not info.filename.lower().endswith(".xml"):
+                    continue
+                if not (target.is_file() and target.stat().st_size == info.file_size and _crc32(target) == info.CRC):
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    with file.open(info) as source, open(target, "wb") as output:
+                        shutil.copyfileobj(source, output)
+                paths.append(target)
+    else:
+        with tarfile.open(archive) as file:
+            for member in file.getmembers():
+                target = _member_path(destination, member.name)
+                if not member.isfile() or target is None or not member.name.lower().endswith(".xml"):
+                    continue
+                if not (target.is_file() and target.stat().st_size == member.size and int(target.stat().st_mtime) == member.mtime):
+                    file.extract(member, destination, filter="data")
+                paths.append(target)
+    return sorted(paths)
+
+
+def _is_archive(path: Path) -> bool:
+    return path.is_file() and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def discover(inputs: list[str], cache_dir: Path) -> list[Path]:
+    """
+    Resuelve directorios (recursivo), patrones glob, ficheros xml y archivos comprimidos
+    """
+    paths: list[Path] = []
+    for item in inputs:
+        if glob.has_magic(item):
+            candidates = [Path(match) for match in sorted(glob.glob(item, recursive=True))]
+        else:
+            candidates = [Path(item)]
+
+        for candidate in candidates:
+            if candidate.is_dir():
+                paths.extend(sorted(candidate.rglob("*.xml")))
+            elif candidate.suffix.lower() == ".xml":
+                paths.append(candidate)
+            elif _is_archive(candidate):
+                paths.extend(_extract_archive(candidate, cache_dir))
+    return paths
+
+
+def _discover_lazily(inputs: list[str], cache_dir: Path) -> Generator[Path, None, None]:
+    """
+    discover como generador: no recorre las entradas hasta que se pide el primer fichero
+    """
+    yield from discover(inputs, cache_dir)
+
+
+class Manifest(object):
+    """
+    Registro de ficheros ya convertidos (ruta, tamaño y mtime) para el modo incremental
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._entries: dict[str, list[int]] = {}
+        if path.exists():
+            self._entries = json.loads(path.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def _key(path: Path) -> tuple[str, list[int]]:
+        stat = path.stat()
+        return str(path.resolve()), [stat.st_size, stat.st_mtime_ns]
+
+    def pending(self, paths: list[Path]) -> list[Path]:
+        result = []
+        for path in paths:
+            key, signature = self._key(path)
+            if self._entries.get(key) != signature:
+                result.append(path)
+        return result
+
+    def modified(self, paths: list[Path]) -> list[Path]:
+        """
+        Ficheros ya convertidos que han cambiado desde entonces
+        """
+        result = []
+        for path in paths:
+            key, signature = self._key(path)
+            if key in self._entries and self._entries[key] != signature:
+                result.append(path)
+        return result
+
+    def add(self, path: Path | str) -> None:
+        key, signature = self._key(Path(path))
+        self._entries[key] = signature
+
+    def save(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._path.write_text(json.dumps(self._entries), encoding="utf-8")
+
+
+class Progress(object):
+    """
+    Linea de progreso en stderr con ficheros/s y MB/s
+    """
+
+    def __init__(self, total: int, enabled: bool = True, interval: float = 0.5) -> None:
+        self.total = total
+        self.files = 0
+        self.bytes = 0
+        self._enabled = enabled
+        self._interval = interval
+        self._start = perf_counter()
+        self._last = 0.0
+
+    def update(self, size: int) -> None:
+        self.files += 1
+        self.bytes += size
+        now = perf_counter()
+        if self._enabled and (now - self._last >= self._interval or self.files == self.total):
+            self._last = now
+            self._print(now)
+
+    def _print(self, now: float) -> None:
+        elapsed = max(now - self._start, 1e-9)
+        sys.stderr.write(f"\r{self.files}/{self.total} ficheros  {self.files / elapsed:8.1f} ficheros/s  {self.bytes / elapsed / 1e6:8.2f} MB/s")
+        sys.stderr.flush()
+
+    def close(self) -> None:
+        if self._enabled and self.files:
+            sys.stderr.write("\n")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="parser_xml_cex", description="Convierte certificados CEX (XML) a Parquet, CSV, NDJSON o SQLite")
+    parser.add_argument("inputs", nargs="+", help="directorios, patrones glob, ficheros .xml o archivos .zip/.tar")
+    parser.add_argument("output", help="fichero de salida")
+    parser.add_argument("--format", choices=FORMATS, help="formato de salida. Por defecto se deduce de la extension")
+    parser.add_argument("--workers", type=int, default=None, help="numero de procesos, o de hilos con --executor thread (0 = sin paralelismo). Por defecto, uno por CPU")
+    parser.add_argument("--executor", choices=EXECUTORS, default="process", help="procesos o hilos. Los hilos solapan la lectura en discos de red (NFS, SMB)")
+    parser.add_argument("--prefetch", type=int, help="ficheros leidos por adelantado con --executor thread")
+    parser.add_argument("--fields", help="proyeccion de columnas separadas por comas, admite comodines: 'IdentificacionEdificio,Calificacion.*.Global'")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="registros por bloque de escritura")
+    parser.add_argument("--cache-dir", type=Path, help="directorio para archivos descomprimidos y el manifiesto incremental")
+    parser.add_argument("--incremental", action="store_true", help="procesa solo los ficheros nuevos o modificados y añade a la salida. En sqlite los modificados sustituyen a sus filas; en csv y ndjson no se admiten")
+    parser.add_argument("--xsd", help="valida cada fichero contra el esquema XSD")
+    parser.add_argument("--timeout", type=float, help="segundos maximos por fichero. Solo con --executor process")
+    parser.add_argument("--quarantine", help="CSV con los ficheros que no se han podido convertir. Con --queue se escribe al hacer --merge")
+    parser.add_argument("--quiet", action="store_true", help="no muestra la linea de progreso")
+    parser.add_argument("--queue", type=Path, help="cola SQLite compartida: el nodo procesa shards y escribe su parte junto a la salida")
+    parser.add_argument("--node", help="nombre del nodo en la cola. Por defecto, host y pid")
+    parser.add_argument("--shard-size", type=int, default=1000, help="ficheros por shard al crear la cola")
+    parser.add_argument("--lease", type=float, default=600.0, help="segundos de concesion de un shard")
+    parser.add_argument("--merge", action="store_true", help="con --queue, junta las partes en la salida cuando no quedan shards")
+    return parser
+
+
+def run_sharded(args: argparse.Namespace) -> int:
+    """
+    Modo --queue: crea la cola si no existe (los archivos comprimidos se descomprimen junto a ella para que los
+    vean todos los nodos), procesa shards hasta que no quedan y escribe las partes en <salida>.partes/.
+    Con --quarantine los ficheros fallidos de cada shard se listan en un CSV junto a su parte, y --merge los
+    junta en el CSV indicado
+    """
+    output = Path(args.output)
+    if args.merge:
+        records = merge(args.queue, output, args.format, quarantine=args.quarantine)
+        print(f"{records} registros en {output}")
+        return 0
+
+    cache_dir = args.cache_dir or args.queue.with_name(args.queue.name + ".cache")
+    # ShardQueue.create solo recorre el generador (y descomprime) en el nodo que crea la cola; el resto espera a que aparezca
+    queue = ShardQueue.create(args.queue, _discover_lazily(args.inputs, cache_dir), args.shard_size, lease=args.lease)
+
+    stats = BatchStats()
+    part_format = "parquet" if output_format(output, args.format) == "parquet" else "ndjson"
+    with queue:
+        shards = run_node(
+            queue,
+            output.with_name(output.name + ".partes"),
+            node=args.node,
+            fields=args.fields,
+            format=part_format,
+            chunk_size=args.chunk_size,
+            stats=stats,
+            xsd=args.xsd,
+            workers=args.workers,
+            timeout=args.timeout,
+            quarantine=args.quarantine is not None,
+            executor=args.executor,
+            prefetch=args.prefetch,
+        )
+        print(f"{shards} shards procesados por este nodo. Estado de la cola: {queue.status()}")
+    print(stats.summary())
+    return 1 if stats.failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.timeout is not None and args.executor == "thread":
+        parser.error("--timeout no se aplica con --executor thread: un hilo no se puede interrumpir. Usa --executor process")
+    if args.incremental and output_format(args.output, args.format) == "parquet":
+        parser.error("--incremental no admite salida parquet: un fichero parquet no se puede ampliar. Usa csv, ndjson o sqlite")
+    if args.queue is not None:
+        return run_sharded(args)
+
+    if args.incremental and args.cache_dir is None:
+        args.cache_dir = Path(".parser_cex_cache")
+    temporary = args.cache_dir is None
+    cache_dir = Path(tempfile.mkdtemp(prefix="parser_cex_")) if temporary else args.cache_dir
+
+    try:
+        paths = discover(args.inputs, cache_dir)
+        manifest = Manifest(cache_dir / "manifest.json") if args.incremental else None
+        options = {}
+        if manifest is not None:
+            paths = manifest.pending(paths)
+            modified = manifest.modified(paths)
+            if output_format(args.output, args.format) == "sqlite":
+                # Las filas de un fichero que ha cambiado se sustituyen
+                options["key"] = "path"
+            elif modified:
+                parser.error(
+                    f"{len(modified)} ficheros ya convertidos han cambiado (el primero, {modified[0]}) y sus filas se duplicarian en la salida. "
+                    "Usa salida sqlite, que las sustituye, o convierte de nuevo sin --incremental"
+                )
+
+        sizes = {str(path): os.path.getsize(path) for path in paths}
+        stats = BatchStats()
+        progress = Progress(len(paths), enabled=not args.quiet)
+        results = parse_many(
+            paths,
+            extract=RecordExtractor(args.fields),
+            xsd=args.xsd,
+            workers=args.workers,
+            stats=stats,
+            timeout=args.timeout,
+            quarantine=args.quarantine,
+            executor=args.executor,
+            prefetch=args.prefetch,
+        )
+
+        try:
+            writer = open_writer(args.output, args.format, append=args.incremental, **options)
+        except ImportError as error:
+            parser.error(str(error))
+
+        chunk: list[dict] = []
+        with writer:
+            for result in results:
+                progress.update(sizes[result.path])
+                if not result.valid:
+                    # Un certificado que no cumple el XSD no se escribe y cuenta como fallido (parse_many ya lo ha puesto en cuarentena)
+                    if result.ok:
+                        stats.failed += 1
+                    continue
+
+                record, timings = result.value
+                for section, seconds in timings.items():
+                    stats.add(f"  {section}", seconds)
+                chunk.append({"path": result.path, **record})
+                if manifest is not None:
+                    manifest.add(result.path)
+
+                if len(chunk) >= args.chunk_size:
+                    writer.write(chunk)
+                    chunk = []
+            writer.write(chunk)
+        progress.close()
+
+        if manifest is not None:
+            manifest.save()
+
+        print(f"{stats.files - stats.failed} ficheros convertidos, {stats.failed} con errores")
+        print(stats.summary())
+    finally:
+        if temporary:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return 1 if stats.failed else 0
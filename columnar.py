@@ -0,0 +1,394 @@
+"""
+Transporte columnar de resultados desde los workers al proceso padre.
+
+Cada worker procesa un bloque de ficheros, acumula los registros aplanados en columnas
+(float64, datetime64 o cadenas codificadas como offsets + bytes UTF-8) y las copia a un
+bloque de multiprocessing.shared_memory. Al padre solo viaja un descriptor con el nombre del
+bloque y la posicion de cada buffer, que se lee sin copiar y se concatena en la tabla final. Las columnas que
+mezclan tipos (numeros y texto) se guardan como objetos de Python y viajan serializadas con pickle.
+
+Con transport="arrow" el bloque contiene un stream IPC de Arrow (requiere pyarrow)
+"""
+
+from datetime import datetime
+import pickle
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+from .batch import BatchResult, BatchStats, _process_file, map_groups
+from .records import SECTIONS, RecordExtractor
+
+
+TRANSPORTS = ("shm", "arrow")
+
+_ALIGN = 8
+_NUMBERS = {float, int, type(None)}
+_DATES = {datetime, type(None)}
+_STRINGS = {str, type(None)}
+
+
+def _object_array(values: list) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class Column(object):
+    """
+    Columna de un ColumnBatch.
+
+    - kind 'f8': values es float64 (None -> NaN)
+    - kind 'M8': values es datetime64[us] (None -> NaT)
+    - kind 'str': values son los bytes UTF-8 concatenados, offsets (n + 1) delimita cada valor y valid marca los nulos
+    - kind 'obj': values es un array de objetos con los valores originales (columnas que mezclan numeros, texto...)
+    """
+
+    __slots__ = ("kind", "values", "offsets", "valid")
+
+    def __init__(self, kind: str, values: np.ndarray, offsets: np.ndarray | None = None, valid: np.ndarray | None = None) -> None:
+        self.kind = kind
+        self.values = values
+        self.offsets = offsets
+        self.valid = valid
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.kind} >"
+
+    def __len__(self):
+        if self.kind == "str":
+            return len(self.valid)
+        return len(self.values)
+
+    @property
+    def buffers(self) -> list[np.ndarray]:
+        if self.kind == "str":
+            return [self.values, self.offsets, self.valid]
+        return [self.values]
+
+    @classmethod
+    def from_values(cls, values: list) -> "Column":
+        types = set(map(type, values))
+        if types <= _NUMBERS:
+            return cls("f8", np.array(values, dtype=np.float64))
+        if types <= _DATES:
+            return cls("M8", np.array(values, dtype="datetime64[us]"))
+        if not types <= _STRINGS:
+            return cls("obj", _object_array(values))
+
+        encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        valid = np.array([value is not None for value in values], dtype=np.bool_)
+        return cls("str", data, offsets, valid)
+
+    def to_list(self) -> list:
+        if self.kind == "f8":
+            return [None if np.isnan(value) else float(value) for value in self.values]
+        if self.kind == "M8":
+            return [None if np.isnat(value) else value.astype(datetime) for value in self.values]
+        if self.kind == "obj":
+            return self.values.tolist()
+
+        data = self.values.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[offsets[i] : offsets[i + 1]].decode("utf-8") if self.valid[i] else None for i in range(len(self.valid))]
+
+    @classmethod
+    def concat(cls, columns: list["Column"]) -> "Column":
+        kinds = {column.kind for column in columns}
+        if len(kinds) > 1:
+            # Un bloque ha inferido otro tipo para la misma columna (o solo tiene nulos): se vuelve a inferir con todos los valores
+            return cls.from_values([value for column in columns for value in column.to_list()])
+
+        kind = kinds.pop()
+        if kind != "str":
+            return cls(kind, np.concatenate([column.values for column in columns]))
+
+        offsets = [np.zeros(1, dtype=np.int64)]
+        shift = 0
+        for column in columns:
+            offsets.append(column.offsets[1:] + shift)
+            shift += int(column.offsets[-1])
+        return cls(
+            kind,
+            np.concatenate([column.values for column in columns]),
+            np.concatenate(offsets),
+            np.concatenate([column.valid for column in columns]),
+        )
+
+    @classmethod
+    def nulls(cls, length: int) -> "Column":
+        return cls("f8", np.full(length, np.nan))
+
+
+class ColumnBatch(object):
+    """
+    Tabla columnar: {nombre de columna: Column}, todas con la misma longitud
+    """
+
+    __slots__ = ("columns", "length")
+
+    def __init__(self, columns: dict[str, Column], length: int) -> None:
+        self.columns = columns
+        self.length = length
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} rows={self.length} columns={len(self.columns)} >"
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name: str) -> Column:
+        return self.columns[name]
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "ColumnBatch":
+        names = dict.fromkeys(name for record in records for name in record)
+        columns = {name: Column.from_values([record.get(name) for record in records]) for name in names}
+        return cls(columns, len(records))
+
+    @classmethod
+    def concat(cls, batches: list["ColumnBatch"]) -> "ColumnBatch":
+        """
+        Concatena varios lotes en uno nuevo (copia los buffers). Las columnas que faltan en un lote se rellenan con nulos
+        """
+        names = dict.fromkeys(name for batch in batches for name in batch.columns)
+        columns = {}
+        for name in names:
+            parts = [batch.columns[name] if name in batch.columns else Column.nulls(batch.length) for batch in batches]
+            columns[name] = Column.concat(parts)
+        return cls(columns, sum(batch.length for batch in batches))
+
+    def to_pydict(self) -> dict[str, list]:
+        return {name: column.to_list() for name, column in self.columns.items()}
+
+    def sections(self) -> dict[str, "ColumnBatch"]:
+        """
+        Divide las columnas 'Seccion.Campo' en una tabla por seccion. Todas conservan el orden de filas
+        """
+        tables: dict[str, dict[str, Column]] = {}
+        for name, column in self.columns.items():
+            section = name.split(".", 1)[0] if name.split(".", 1)[0] in SECTIONS else ""
+            tables.setdefault(section, {})[name] = column
+        shared = tables.pop("", {})
+        return {section: ColumnBatch({**shared, **columns}, self.length) for section, columns in tables.items()}
+
+    def to_shared(self) -> "SharedBatch":
+        """
+        Copia los buffers a un bloque de memoria compartida y devuelve su descriptor picklable
+        """
+        layout = []
+        sources = []
+        position = 0
+        for name, column in self.columns.items():
+            # Los objetos no se pueden ver desde otro proceso: una columna 'obj' se guarda serializada
+            arrays = [np.frombuffer(pickle.dumps(column.to_list()), dtype=np.uint8)] if column.kind == "obj" else column.buffers
+            buffers = []
+            for buffer in arrays:
+                buffers.append((buffer.dtype.str, position, len(buffer)))
+                position += -(-buffer.nbytes // _ALIGN) * _ALIGN
+            layout.append((name, column.kind, buffers))
+            sources.append(arrays)
+
+        shm = SharedMemory(create=True, size=max(position, 1))
+        for (_, _, buffers), arrays in zip(layout, sources):
+            for (dtype, offset, count), buffer in zip(buffers, arrays):
+                np.ndarray(count, dtype=dtype, buffer=shm.buf, offset=offset)[:] = buffer
+        name = shm.name
+        shm.close()
+        return SharedBatch(name, layout, self.length)
+
+
+class SharedBatch(object):
+    """
+    Descriptor de un ColumnBatch guardado en memoria compartida. Es lo unico que se serializa entre procesos
+    """
+
+    __slots__ = ("name", "layout", "length")
+
+    def __init__(self, name: str, layout: list, length: int) -> None:
+        self.name = name
+        self.layout = layout
+        self.length = length
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.name} rows={self.length} >"
+
+    def attach(self) -> tuple[SharedMemory, ColumnBatch]:
+        """
+        Abre el bloque y devuelve un ColumnBatch cuyas columnas son vistas sobre la memoria compartida (sin copia,
+        salvo las columnas 'obj'). Las vistas deben liberarse antes de cerrar el bloque
+        """
+        shm = SharedMemory(name=self.name)
+        columns = {}
+        for name, kind, buffers in self.layout:
+            arrays = [np.ndarray(count, dtype=dtype, buffer=shm.buf, offset=offset) for dtype, offset, count in buffers]
+            if kind == "obj":
+                arrays = [_object_array(pickle.loads(arrays[0].tobytes()))]
+            columns[name] = Column(kind, *arrays)
+        return shm, ColumnBatch(columns, self.length)
+
+
+class ArrowBatch(object):
+    """
+    Descriptor de un RecordBatch de Arrow escrito como stream IPC en memoria compartida
+    """
+
+    __slots__ = ("name", "size", "length")
+
+    def __init__(self, name: str, size: int, length: int) -> None:
+        self.name = name
+        self.size = size
+        self.length = length
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.name} rows={self.length} >"
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "ArrowBatch":
+        """
+        Los tipos se infieren como en ColumnBatch: una columna que mezcla numeros y texto se escribe como texto
+        """
+        import pyarrow as pa
+
+        from .frames import to_frame
+
+        table = to_frame(ColumnBatch.from_records(records), "pyarrow", categorical=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        data = sink.getvalue()
+
+        shm = SharedMemory(create=True, size=max(data.size, 1))
+        np.ndarray(data.size, dtype=np.uint8, buffer=shm.buf)[:] = np.frombuffer(data, dtype=np.uint8)
+        name = shm.name
+        shm.close()
+        return cls(name, data.size, len(records))
+
+    def attach(self):
+        import pyarrow as pa
+
+        shm = SharedMemory(name=self.name)
+        table = pa.ipc.open_stream(pa.py_buffer(shm.buf[: self.size])).read_all()
+        return shm, table
+
+
+def _process_chunk(paths: list[str], fields: list[str] | str | None, transport: str, timeout: float | None = None) -> tuple[Any, list[BatchResult]]:
+    """
+    Tarea de un worker: procesa un bloque de ficheros y deja sus registros en memoria compartida.
+    Devuelve el descriptor y los BatchResult sin valor (para estadisticas y errores)
+    """
+    extract = RecordExtractor(fields)
+    records = []
+    results = []
+    for path in paths:
+        result = _process_file(path, extract, None, False, timeout)
+        if result.ok:
+            record, _ = result.value
+            records.append({"path": path, **record})
+        result.value = None
+        results.append(result)
+
+    if not records:
+        return None, results
+    if transport == "arrow":
+        return ArrowBatch.from_records(records), results
+    return ColumnBatch.from_records(records).to_shared(), results
+
+
+def _release(handles: list[SharedMemory]) -> None:
+    for shm in handles:
+        shm.close()
+        shm.unlink()
+
+
+def parse_columnar(
+    paths: Iterable[Path | str],
+    fields: list[str] | str | None = None,
+    workers: int | None = None,
+    chunk_size: int = 256,
+    transport: str = "shm",
+    stats: BatchStats | None = None,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+):
+    """
+    Parsea los ficheros en bloques de chunk_size por worker y devuelve una unica tabla con un certificado por fila
+    (columna 'path' + columnas 'Seccion.Campo').
+
+    - transport='shm': devuelve un ColumnBatch (arrays de NumPy). ColumnBatch.sections() lo divide por seccion
+    - transport='arrow': devuelve un pyarrow.Table
+
+    timeout y memory_limit aislan los ficheros defectuosos como en batch.parse_many (ver batch.map_groups).
+    Los ficheros fallidos no aparecen en la tabla y se cuentan en stats
+    """
+    if transport not in TRANSPORTS:
+        raise Exception(f"Transporte '{transport}' no soportado. Se esperaba uno de {TRANSPORTS}")
+
+    paths = [str(path) for path in paths]
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+    # El resource tracker debe ser comun a padre y workers: el worker registra el bloque y el padre lo libera
+    resource_tracker.ensure_running()
+
+    handles: list[SharedMemory] = []
+    parts = []
+    try:
+        for descriptor, results in map_groups(_process_chunk, chunks, (fields, transport, timeout), workers=workers, memory_limit=memory_limit):
+            if stats is not None:
+                for result in results:
+                    stats.update(result)
+            if descriptor is None:
+                continue
+            handle, part = descriptor.attach()
+            handles.append(handle)
+            parts.append(part)
+            del part
+
+        if transport == "arrow":
+            import pyarrow as pa
+
+            if not parts:
+                return pa.table({})
+            # La tabla concatenada sigue apuntando a la memoria compartida: se copia antes de liberarla
+            return _copy_table(pa.concat_tables(_unify_parts(parts), promote_options="default")).combine_chunks()
+        return ColumnBatch.concat(parts) if parts else ColumnBatch({}, 0)
+    finally:
+        parts.clear()
+        _release(handles)
+
+
+def _unify_parts(parts: list) -> list:
+    """
+    Tablas de Arrow de varios bloques con un tipo comun por columna. Si un bloque ha inferido numeros y otro
+    texto (o un bloque solo tiene nulos), la columna pasa a texto en todos, como las columnas 'obj' en frames.to_frame
+    """
+    import pyarrow as pa
+
+    types: dict[str, set] = {}
+    for part in parts:
+        for field in part.schema:
+            if part.column(field.name).null_count < part.num_rows:
+                types.setdefault(field.name, set()).add(field.type)
+    unified = []
+    for part in parts:
+        for i, field in enumerate(part.schema):
+            if len(types.get(field.name, ())) > 1 or (field.name in types and field.type not in types[field.name]):
+                values = [None if value is None else str(value) for value in part.column(i).to_pylist()]
+                part = part.set_column(i, field.name, pa.array(values, type=pa.large_string()))
+        unified.append(part)
+    return unified
+
+
+def _copy_table(table):
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return pa.ipc.open_stream(sink.getvalue()).read_all()
@@ -0,0 +1,184 @@
+"""
+Carga de un corpus en esquema estrella: los bloques que se repiten entre certificados (datos del certificador,
+factores de paso) se guardan una sola vez en tablas de dimension y la tabla de hechos los referencia por clave.
+
+La clave es un hash del subarbol XML canonico (C14N 2.0 sin espacios), asi que dos bloques con el mismo
+contenido tienen la misma clave aunque cambie el formato del fichero. Cada worker recuerda las claves que ya
+ha visto y solo parsea y envia los bloques nuevos:
+
+    star = load_star(paths, workers=8)
+    star.facts[0]["DatosDelCertificador.key"], star.dimensions["DatosDelCertificador"]
+    star.write("almacen", format="parquet")
+"""
+
+from hashlib import blake2b
+from pathlib import Path
+import threading
+from typing import Iterable
+from uuid import uuid4
+from xml.etree import ElementTree
+
+from lxml import etree
+
+from .batch import BatchStats, parse_many
+from .parser_cex import ParserCEX
+from .records import flatten, flatten_dict
+from .writers import open_writer
+
+
+class Dimension(object):
+    """
+    Bloque del certificado que se guarda como dimension.
+    path es a la vez la ruta de atributos del ParserCEX ('Consumo.FactoresdePaso') y la del elemento XML
+    """
+
+    __slots__ = ("name", "path")
+
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self.path = path
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.name} >"
+
+    @property
+    def column(self) -> str:
+        """
+        Columna de la tabla de hechos con la clave del bloque
+        """
+        return f"{self.name}.key"
+
+    def key(self, cex: ParserCEX) -> str | None:
+        element = cex._xml.find(self.path.replace(".", "/"))
+        if element is None:
+            return None
+        if isinstance(element, etree._Element):
+            canonical = etree.tostring(element, method="c14n2", strip_text=True)
+        else:
+            canonical = ElementTree.canonicalize(ElementTree.tostring(element), strip_text=True).encode("utf-8")
+        return blake2b(canonical, digest_size=16).hexdigest()
+
+    def record(self, cex: ParserCEX) -> dict:
+        """
+        Fila de la tabla de dimension, con los mismos nombres de columna que records.flatten
+        """
+        parser = cex
+        for attr in self.path.split("."):
+            parser = getattr(parser, attr)
+        return flatten_dict(parser.to_dict(), self.path)
+
+
+DIMENSIONS = (
+    Dimension("DatosDelCertificador", "DatosDelCertificador"),
+    Dimension("FactoresdePaso", "Consumo.FactoresdePaso"),
+)
+
+# Claves que ya ha enviado este proceso en la carga actual. Se reinicia al cambiar de carga (session).
+# Con parse_many(executor="thread") lo comparten todos los hilos: se accede con _seen_lock
+_seen: dict = {"session": None, "keys": set()}
+_seen_lock = threading.Lock()
+
+
+class DimensionExtractor(object):
+    """
+    Funcion de extraccion picklable para batch.parse_many.
+    Devuelve el registro de hechos y las filas de dimension que este proceso aun no habia enviado
+    """
+
+    def __init__(self, fields: list[str] | str | None = None, dimensions: tuple[Dimension, ...] = DIMENSIONS) -> None:
+        self.fields = fields
+        self.dimensions = dimensions
+        self.session = uuid4().hex
+
+    def __call__(self, cex: ParserCEX) -> tuple[dict, dict[str, dict[str, dict]]]:
+        record = flatten(cex, self.fields, exclude=[dimension.path for dimension in self.dimensions])
+        keys = {dimension: dimension.key(cex) for dimension in self.dimensions}
+        with _seen_lock:
+            if _seen["session"] != self.session:
+                _seen["session"] = self.session
+                _seen["keys"] = set()
+            new = [dimension for dimension, key in keys.items() if key is not None and (dimension.name, key) not in _seen["keys"]]
+            _seen["keys"].update((dimension.name, keys[dimension]) for dimension in new)
+
+        rows: dict[str, dict[str, dict]] = {}
+        for dimension, key in keys.items():
+            record[dimension.column] = key
+        for dimension in new:
+            rows.setdefault(dimension.name, {})[keys[dimension]] = dimension.record(cex)
+        return record, rows
+
+
+class StarSchema(object):
+    """
+    Tabla de hechos (un registro por certificado) y tablas de dimension {nombre: {clave: fila}}
+    """
+
+    def __init__(self, dimensions: tuple[Dimension, ...] = DIMENSIONS) -> None:
+        self.facts: list[dict] = []
+        self.dimensions: dict[str, dict[str, dict]] = {dimension.name: {} for dimension in dimensions}
+
+    def __repr__(self):
+        sizes = ", ".join(f"{name}={len(rows)}" for name, rows in self.dimensions.items())
+        return f"< {self.__class__.__name__} facts={len(self.facts)} {sizes} >"
+
+    def add(self, record: dict, rows: dict[str, dict[str, dict]]) -> None:
+        self.facts.append(record)
+        for name, keys in rows.items():
+            for key, row in keys.items():
+                # Varios workers pueden enviar el mismo bloque: se queda el primero
+                self.dimensions[name].setdefault(key, row)
+
+    def join(self, record: dict) -> dict:
+        """
+        Registro de hechos con los campos de sus dimensiones, como lo devolveria records.flatten
+        """
+        joined = {field: value for field, value in record.items() if not field.endswith(".key")}
+        for name, keys in self.dimensions.items():
+            joined.update(keys.get(record.get(f"{name}.key"), {}))
+        return joined
+
+    def write(self, folder: Path | str, format: str = "parquet") -> dict[str, Path]:
+        """
+        Escribe 'certificados' y una tabla por dimension (con la columna 'key') en folder, un fichero por tabla.
+        Devuelve las rutas
+        """
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        suffix = {"sqlite": "db"}.get(format, format)
+        tables = {"certificados": self.facts}
+        for name, keys in self.dimensions.items():
+            tables[name] = [{"key": key, **row} for key, row in keys.items()]
+
+        paths = {}
+        for name, records in tables.items():
+            paths[name] = folder / f"{name}.{suffix}"
+            options = {"table": name} if format == "sqlite" else {}
+            with open_writer(paths[name], format, **options) as writer:
+                writer.write(records)
+        return paths
+
+
+def load_star(
+    paths: Iterable[Path | str],
+    fields: list[str] | str | None = None,
+    workers: int | None = None,
+    stats: BatchStats | None = None,
+    dimensions: tuple[Dimension, ...] = DIMENSIONS,
+) -> StarSchema:
+    """
+    Parsea el corpus con batch.parse_many y lo devuelve como StarSchema. La tabla de hechos incluye la columna 'path'
+    """
+    star = StarSchema(dimensions)
+    for result in parse_many(paths, extract=DimensionExtractor(fields, dimensions), workers=workers, stats=stats):
+        if result.ok:
+            record, rows = result.value
+            star.add({"path": result.path, **record}, rows)
+
+    # Si un fichero falla despues de que su worker registre una clave, esa fila no llega al padre: se lee aqui
+    for dimension in dimensions:
+        keys = star.dimensions[dimension.name]
+        for record in star.facts:
+            key = record[dimension.column]
+            if key is not None and key not in keys:
+                keys[key] = dimension.record(ParserCEX(record["path"]))
+    return star
@@ -0,0 +1,162 @@
+"""
+Recalculo matricial de la energia primaria no renovable y las emisiones de CO2 de un corpus.
+
+Cada certificado declara su energia final por vector y servicio (Consumo.EnergiaFinalVectores) y los factores
+de paso que aplico (Consumo.FactoresdePaso). Con ambos cargados como tensores del corpus:
+
+    final[n, v, s]    energia final del certificado n, vector v y servicio s (kWh/m2 año)
+    factors[n, k, v]  factor de paso del indicador k (EnergiaPrimariaNoRenovable, EmisionesCO2) para el vector v
+
+el indicador por servicio es einsum('nvs,nkv->nks'). Los escenarios what-if sustituyen factores para todo el corpus:
+
+    tensors = EnergyTensors.from_many(paths, workers=8)
+    compare(tensors)["mismatch"], compare(tensors)["missing"]
+    what_if(tensors, {"red_2030": {"EmisionesCO2": {"ElectricidadPeninsular": 0.1}}})["red_2030"]
+"""
+
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .batch import BatchStats, parse_many
+from .envelope import to_float
+from .parser_cex import ParserCEX
+
+
+VECTORES = ("GasNatural", "ElectricidadPeninsular", "BiomasaOtros", "GasoleoC", "GLP", "Carbon", "Biocarburante", "BiomasaPellet")
+SERVICIOS = ("Calefaccion", "Refrigeracion", "ACS", "Iluminacion")
+INDICADORES = ("EnergiaPrimariaNoRenovable", "EmisionesCO2")
+"""
+Ejes de los tensores. Los resultados tienen una columna mas que SERVICIOS: la ultima es el Global (suma de servicios)
+"""
+
+_FACTORES = {"EnergiaPrimariaNoRenovable": "FinalAPrimariaNoRenovable", "EmisionesCO2": "FinalAEmisiones"}
+
+Overrides = dict[str, dict[str, float]]
+"""
+Factores sustituidos: {indicador: {vector: factor}}
+"""
+
+
+def energy_dict(cex: ParserCEX) -> dict:
+    """
+    Subconjunto de ParserCEX.to_dict con los datos del recalculo. Es picklable y sirve como extract de parse_many
+    """
+    return {"Consumo": cex.Consumo.to_dict(), "EmisionesCO2": cex.EmisionesCO2.to_dict()}
+
+
+class EnergyTensors(object):
+    """
+    Datos de consumo de un corpus como tensores de NumPy (ver el docstring del modulo).
+
+    - stored[n, k, s]: valores declarados por indicador y servicio, con el Global en la ultima columna
+    """
+
+    __slots__ = ("keys", "final", "factors", "stored")
+
+    def __init__(self, keys: list, final: np.ndarray, factors: np.ndarray, stored: np.ndarray) -> None:
+        self.keys = keys
+        self.final = final
+        self.factors = factors
+        self.stored = stored
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} certificates={len(self)} >"
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_certificates(cls, certificates: Iterable[ParserCEX | dict], keys: list | None = None) -> "EnergyTensors":
+        """
+        certificates: objetos ParserCEX o diccionarios con la forma de ParserCEX.to_dict (basta con energy_dict)
+        """
+        values = [energy_dict(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+        columns = (*SERVICIOS, "Global")
+
+        final = np.array(
+            [[[to_float(value["Consumo"]["EnergiaFinalVectores"][vector].get(servicio)) for servicio in SERVICIOS] for vector in VECTORES] for value in values],
+            dtype=np.float64,
+        ).reshape(len(values), len(VECTORES), len(SERVICIOS))
+        factors = np.array(
+            [[[to_float(value["Consumo"]["FactoresdePaso"][_FACTORES[indicador]].get(vector)) for vector in VECTORES] for indicador in INDICADORES] for value in values],
+            dtype=np.float64,
+        ).reshape(len(values), len(INDICADORES), len(VECTORES))
+        stored = np.array(
+            [
+                [
+                    [to_float(value["Consumo"]["EnergiaPrimariaNoRenovable"].get(column)) for column in columns],
+                    [to_float(value["EmisionesCO2"].get(column)) for column in columns],
+                ]
+                for value in values
+            ],
+            dtype=np.float64,
+        ).reshape(len(values), len(INDICADORES), len(columns))
+        return cls(list(range(len(values))) if keys is None else list(keys), final, factors, stored)
+
+    @classmethod
+    def from_many(cls, paths: Iterable[Path | str], workers: int | None = None, stats: BatchStats | None = None) -> "EnergyTensors":
+        """
+        Parsea los ficheros con batch.parse_many. Las claves son las rutas de los ficheros validos; los fallidos se omiten
+        """
+        keys, values = [], []
+        for result in parse_many(paths, extract=energy_dict, workers=workers, stats=stats):
+            if result.ok:
+                keys.append(result.path)
+                values.append(result.value)
+        return cls.from_certificates(values, keys)
+
+    def replace_factors(self, overrides: Overrides) -> np.ndarray:
+        """
+        Copia de factors con los factores indicados sustituidos en todos los certificados
+        """
+        factors = self.factors.copy()
+        for indicador, vectores in overrides.items():
+            if indicador not in INDICADORES:
+                raise Exception(f"Indicador '{indicador}' no soportado. Se esperaba uno de {INDICADORES}")
+            for vector, factor in vectores.items():
+                if vector not in VECTORES:
+                    raise Exception(f"Vector '{vector}' no soportado. Se esperaba uno de {VECTORES}")
+                factors[:, INDICADORES.index(indicador), VECTORES.index(vector)] = factor
+        return factors
+
+
+def _with_global(values: np.ndarray) -> np.ndarray:
+    return np.concatenate([values, values.sum(axis=-1, keepdims=True)], axis=-1)
+
+
+def recompute(tensors: EnergyTensors, overrides: Overrides | None = None) -> np.ndarray:
+    """
+    Indicadores recalculados (n, len(INDICADORES), len(SERVICIOS) + 1), con el Global en la ultima columna.
+    overrides sustituye factores de paso en todo el corpus
+    """
+    factors = tensors.factors if overrides is None else tensors.replace_factors(overrides)
+    return _with_global(np.einsum("nvs,nkv->nks", tensors.final, factors))
+
+
+def compare(tensors: EnergyTensors, atol: float = 0.02) -> dict[str, np.ndarray]:
+    """
+    Compara el recalculo con los valores declarados. Los XML redondean a 2 decimales, de ahi la tolerancia.
+
+    - recomputed, stored, difference: (n, len(INDICADORES), len(SERVICIOS) + 1)
+    - mismatch: (n, len(INDICADORES)) True si algun servicio declarado difiere mas de atol
+    - missing: (n, len(INDICADORES)) True si algun servicio no se puede comparar porque falta el valor declarado,
+        la energia final o el factor de paso (difference es NaN). Esos servicios no cuentan en mismatch
+    """
+    recomputed = recompute(tensors)
+    difference = recomputed - tensors.stored
+    missing = np.isnan(difference)
+    with np.errstate(invalid="ignore"):
+        mismatch = (np.abs(difference) > atol).any(axis=-1)
+    return {"recomputed": recomputed, "stored": tensors.stored, "difference": difference, "mismatch": mismatch, "missing": missing.any(axis=-1)}
+
+
+def what_if(tensors: EnergyTensors, scenarios: dict[str, Overrides]) -> dict[str, np.ndarray]:
+    """
+    Recalcula el corpus con varios juegos de factores en un solo einsum: {escenario: indicadores como en recompute}
+    """
+    names = list(scenarios)
+    factors = np.stack([tensors.replace_factors(scenarios[name]) for name in names]) if names else np.empty((0, *tensors.factors.shape))
+    results = _with_global(np.einsum("nvs,mnkv->mnks", tensors.final, factors))
+    return dict(zip(names, results))
@@ -0,0 +1,238 @@
+"""
+Metricas derivadas de la envolvente termica para un corpus completo, sin bucles de Python por edificio.
+
+Las tablas de DatosEnvolventeTermica de todos los certificados se guardan como arrays irregulares:
+un array plano por atributo (Superficie, Transmitancia, Longitud, orientacion...) y un array de offsets
+que delimita los elementos de cada edificio. Las sumas por edificio son reducciones por segmento de NumPy:
+
+    arrays = EnvelopeArrays.from_many(paths, workers=8)
+    metrics = envelope_metrics(arrays)
+    metrics["H_tr"], metrics["Acristalamiento"][:, ORIENTACIONES.index("S")]
+"""
+
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .batch import BatchStats, parse_many
+from .parser_cex import ParserCEX
+
+
+ORIENTACIONES = ("N", "NE", "E", "SE", "S", "SO", "O", "NO")
+"""
+Orden de las columnas de Acristalamiento, igual que las claves de PorcentajeSuperficieAcristalada
+"""
+
+_ORIENTACION = {
+    "Norte": 0,
+    "Noreste": 1,
+    "Este": 2,
+    "Sureste": 3,
+    "Sur": 4,
+    "Suroeste": 5,
+    "Oeste": 6,
+    "Noroeste": 7,
+    **{code: i for i, code in enumerate(ORIENTACIONES)},
+}
+
+ADIABATICO = "Adiabatico"
+"""
+Tipo de los cerramientos en contacto con otro edificio o espacio calefactado (medianerias)
+"""
+
+
+def to_float(value) -> float:
+    """
+    Valor numerico de un campo del certificado para un array de NumPy: None o '' pasan a NaN
+    """
+    return np.nan if value is None or value == "" else value
+
+
+class RaggedTable(object):
+    """
+    Una tabla de la envolvente para todos los edificios.
+
+    - offsets: (n + 1,) los elementos del edificio i son [offsets[i], offsets[i + 1])
+    - medida: Superficie (m2) o Longitud (m) de cada elemento
+    - transmitancia: U (W/m2K) o psi (W/mK)
+    - orientacion: indice en ORIENTACIONES o -1 (Horizontal, Suelo, sin orientacion)
+    - exterior: False para los cerramientos adiabaticos (medianerias)
+    """
+
+    __slots__ = ("offsets", "medida", "transmitancia", "orientacion", "exterior", "_ids")
+
+    def __init__(self, offsets: np.ndarray, medida: np.ndarray, transmitancia: np.ndarray, orientacion: np.ndarray, exterior: np.ndarray) -> None:
+        self.offsets = offsets
+        self.medida = medida
+        self.transmitancia = transmitancia
+        self.orientacion = orientacion
+        self.exterior = exterior
+        self._ids: np.ndarray | None = None
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} buildings={len(self)} elements={len(self.medida)} >"
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def ids(self) -> np.ndarray:
+        """
+        Edificio al que pertenece cada elemento
+        """
+        if self._ids is None:
+            self._ids = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+        return self._ids
+
+    def sum(self, values: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+        """
+        Suma por edificio. Los edificios sin elementos suman 0 y un valor NaN hace NaN la suma de su edificio
+        """
+        ids = self.ids
+        if mask is not None:
+            ids, values = ids[mask], values[mask]
+        return np.bincount(ids, weights=values, minlength=len(self))
+
+    def sum_by_orientation(self, values: np.ndarray) -> np.ndarray:
+        """
+        Suma por edificio y orientacion: matriz (n, len(ORIENTACIONES))
+        """
+        mask = self.orientacion >= 0
+        keys = self.ids[mask] * len(ORIENTACIONES) + self.orientacion[mask]
+        sums = np.bincount(keys, weights=values[mask], minlength=len(self) * len(ORIENTACIONES))
+        return sums.reshape(len(self), len(ORIENTACIONES))
+
+    @classmethod
+    def from_records(cls, tables: list[list[dict]], medida: str) -> "RaggedTable":
+        """
+        tables: una lista de elementos (IElementContainer.to_records) por edificio
+        """
+        offsets = np.zeros(len(tables) + 1, dtype=np.int64)
+        np.cumsum([len(records) for records in tables], out=offsets[1:])
+        elements = [record for records in tables for record in records]
+        return cls(
+            offsets,
+            np.array([to_float(record.get(medida)) for record in elements], dtype=np.float64),
+            np.array([to_float(record.get("Transmitancia")) for record in elements], dtype=np.float64),
+            np.array([_ORIENTACION.get(record.get("Orientacion"), -1) for record in elements], dtype=np.int8),
+            np.array([record.get("Tipo") != ADIABATICO for record in elements], dtype=np.bool_),
+        )
+
+
+def envelope_dict(cex: ParserCEX) -> dict:
+    """
+    Subconjunto de ParserCEX.to_dict con los datos que usan las metricas. Es picklable y sirve como extract de parse_many
+    """
+    geometria = cex.DatosGeneralesyGeometria
+    return {
+        "DatosGeneralesyGeometria": {
+            "SuperficieHabitable": geometria.SuperficieHabitable,
+            "VolumenEspacioHabitable": geometria.VolumenEspacioHabitable,
+        },
+        "DatosEnvolventeTermica": cex.DatosEnvolventeTermica.to_dict(),
+    }
+
+
+class EnvelopeArrays(object):
+    """
+    Envolventes de un corpus de edificios: una RaggedTable por tabla y los datos de geometria de cada edificio
+    """
+
+    __slots__ = ("keys", "opacos", "huecos", "puentes", "superficie", "volumen")
+
+    def __init__(
+        self,
+        keys: list,
+        opacos: RaggedTable,
+        huecos: RaggedTable,
+        puentes: RaggedTable,
+        superficie: np.ndarray,
+        volumen: np.ndarray,
+    ) -> None:
+        self.keys = keys
+        self.opacos = opacos
+        self.huecos = huecos
+        self.puentes = puentes
+        self.superficie = superficie
+        self.volumen = volumen
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} buildings={len(self)} >"
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_certificates(cls, certificates: Iterable[ParserCEX | dict], keys: list | None = None) -> "EnvelopeArrays":
+        """
+        certificates: objetos ParserCEX o diccionarios con la forma de ParserCEX.to_dict (basta con envelope_dict)
+        """
+        values = [envelope_dict(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+        geometria = [value["DatosGeneralesyGeometria"] for value in values]
+        envolvente = [value["DatosEnvolventeTermica"] for value in values]
+        return cls(
+            list(range(len(values))) if keys is None else list(keys),
+            RaggedTable.from_records([tables["CerramientosOpacos"] for tables in envolvente], "Superficie"),
+            RaggedTable.from_records([tables["HuecosyLucernarios"] for tables in envolvente], "Superficie"),
+            RaggedTable.from_records([tables["PuentesTermicos"] for tables in envolvente], "Longitud"),
+            np.array([to_float(item.get("SuperficieHabitable")) for item in geometria], dtype=np.float64),
+            np.array([to_float(item.get("VolumenEspacioHabitable")) for item in geometria], dtype=np.float64),
+        )
+
+    @classmethod
+    def from_many(cls, paths: Iterable[Path | str], workers: int | None = None, stats: BatchStats | None = None) -> "EnvelopeArrays":
+        """
+        Parsea los ficheros con batch.parse_many. Las claves son las rutas de los ficheros validos; los fallidos se omiten
+        """
+        keys, values = [], []
+        for result in parse_many(paths, extract=envelope_dict, workers=workers, stats=stats):
+            if result.ok:
+                keys.append(result.path)
+                values.append(result.value)
+        return cls.from_certificates(values, keys)
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    result = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def envelope_metrics(arrays: EnvelopeArrays) -> dict[str, np.ndarray]:
+    """
+    Metricas por edificio (arrays de longitud n, en el orden de arrays.keys):
+
+    - UA_opacos, UA_huecos: sum(U * A) de cerramientos opacos y huecos (W/K)
+    - PsiL: sum(psi * L) de los puentes termicos (W/K)
+    - H_tr: coeficiente de transmision UA_opacos + UA_huecos + PsiL (W/K)
+    - H_tr_superficie: H_tr por m2 de SuperficieHabitable (W/m2K)
+    - SuperficieEnvolvente: area de los cerramientos opacos no adiabaticos (m2). En CE3X incluye la de los huecos
+    - Compacidad: VolumenEspacioHabitable / SuperficieEnvolvente (m3/m2), comparable con la declarada
+    - Acristalamiento: matriz (n, 8) con el % de huecos sobre la fachada de cada orientacion (columnas en ORIENTACIONES),
+        comparable con PorcentajeSuperficieAcristalada. Es NaN si hay huecos sin fachada en esa orientacion
+    """
+    opacos, huecos, puentes = arrays.opacos, arrays.huecos, arrays.puentes
+
+    ua_opacos = opacos.sum(opacos.transmitancia * opacos.medida)
+    ua_huecos = huecos.sum(huecos.transmitancia * huecos.medida)
+    psi_l = puentes.sum(puentes.transmitancia * puentes.medida)
+    h_tr = ua_opacos + ua_huecos + psi_l
+    superficie = opacos.sum(opacos.medida, opacos.exterior)
+
+    area_huecos = huecos.sum_by_orientation(huecos.medida)
+    area_fachada = opacos.sum_by_orientation(opacos.medida)
+    acristalamiento = 100 * _divide(area_huecos, area_fachada)
+    # Como en PorcentajeSuperficieAcristalada, una orientacion sin fachada ni huecos tiene un 0 %
+    acristalamiento[(area_huecos == 0) & (area_fachada == 0)] = 0.0
+
+    return {
+        "UA_opacos": ua_opacos,
+        "UA_huecos": ua_huecos,
+        "PsiL": psi_l,
+        "H_tr": h_tr,
+        "H_tr_superficie": _divide(h_tr, arrays.superficie),
+        "SuperficieEnvolvente": superficie,
+        "Compacidad": _divide(arrays.volumen, superficie),
+        "Acristalamiento": acristalamiento,
+    }
@@ -0,0 +1,136 @@
+"""
+Camino rapido con expat: lee el XML como eventos SAX y escribe los valores seleccionados directamente en un
+registro plano, sin construir ningun arbol ni objetos de seccion.
+
+Sirve para proyecciones de pocos campos sobre corpus grandes. Las columnas son las rutas de los elementos en
+el XML ('Seccion.Elemento'), los valores se convierten como get_value (salvo los de TEXT_FIELDS, que quedan como
+texto) y se deja de leer el fichero en cuanto se tienen todos los campos pedidos sin comodines:
+
+    extract = ExpatExtractor("IdentificacionEdificio.ZonaClimatica,Calificacion.EmisionesCO2.Global")
+    record = extract(path)
+
+A diferencia de records.flatten no aplica las conversiones propias de cada seccion (NormativaVigente, fechas
+de DatosPersonalizados, Medida_1...), y en los elementos repetidos solo se queda el primero
+"""
+
+from pathlib import Path
+from typing import BinaryIO
+from xml.parsers import expat
+
+from .parser_cex import CATEGORICAL_FIELDS, TEXT_FIELDS, intern_value
+from .records import _match, compile_fields
+
+
+class _Done(Exception):
+    """
+    Se lanza desde el handler para cortar el parseo cuando ya estan todos los campos
+    """
+
+
+class ExpatExtractor(object):
+    """
+    Extractor picklable: ExpatExtractor(fields)(ruta o fichero binario) -> {'Seccion.Campo': valor}
+    """
+
+    def __init__(self, fields: list[str] | str) -> None:
+        self.fields = fields
+        self._patterns = compile_fields(fields)
+        # Con comodines no se sabe cuando se han visto todos los campos: se lee el fichero completo
+        self._exact = None if any("*" in part or "?" in part or "[" in part for pattern in self._patterns for part in pattern) else {
+            ".".join(pattern) for pattern in self._patterns
+        }
+        # Resultado de _match por ruta: las rutas se repiten en todos los ficheros
+        self._selected: dict[str, bool | None] = {}
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.fields} >"
+
+    def __call__(self, source: Path | str | BinaryIO) -> dict:
+        record: dict = {}
+        stack: list[str] = []
+        pending = set(self._exact) if self._exact is not None else None
+        # Estado del elemento abierto mas profundo: (ruta, seleccionado, tiene hijos, trozos de texto)
+        frames: list[list] = []
+        skip = 0
+        patterns = self._patterns
+        cache = self._selected
+
+        def start(tag: str, attrs) -> None:
+            nonlocal skip
+            if frames:
+                frames[-1][2] = True
+            if skip:
+                skip += 1
+                return
+            stack.append(tag)
+            if len(stack) == 1:
+                # Elemento raiz
+                frames.append(["", False, False, []])
+                return
+            path = ".".join(stack[1:])
+            if path in cache:
+                selected = cache[path]
+            else:
+                selected = cache[path] = _match(path, patterns)
+            if selected is False or path in record:
+                stack.pop()
+                skip = 1
+                return
+            frames.append([path, selected, False, []])
+
+        def end(tag: str) -> None:
+            nonlocal skip
+            if skip:
+                skip -= 1
+                return
+            path, selected, children, text = frames.pop()
+            stack.pop()
+            if selected and not children and path not in record:
+                record[path] = _value("".join(text), path)
+            if pending is not None and path in pending:
+                pending.discard(path)
+                if not pending:
+                    raise _Done
+
+        def data(text: str) -> None:
+            if not skip and frames and frames[-1][1]:
+                frames[-1][3].append(text)
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = data
+
+        file = open(source, "rb") if isinstance(source, (str, Path)) else source
+        try:
+            parser.ParseFile(file)
+        except _Done:
+            pass
+        finally:
+            if file is not source:
+                file.close()
+
+        # Campos pedidos que no estan en el fichero
+        for field in pending or ():
+            record.setdefault(field, None)
+        return record
+
+
+def _value(text: str, path: str):
+    """
+    Misma conversion que get_value. Los campos categoricos pasan por el pool de cadenas y los de TEXT_FIELDS
+    (codigos postales, telefonos...) se quedan como texto, como en los parsers
+    """
+    if not text:
+        return None
+    text = text.strip()
+    if path in TEXT_FIELDS:
+        return text
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if path.rsplit(".", 1)[-1] in CATEGORICAL_FIELDS:
+        return intern_value(text)
+    return text
@@ -0,0 +1,146 @@
+"""
+Filtros evaluados durante el parseo incremental del XML.
+
+El fichero se lee por bloques y se pasa a un XMLPullParser. Cada vez que se cierra una seccion de primer
+nivel se evaluan las condiciones sobre ella; si alguna falla se abandona el fichero sin leer el resto
+(IdentificacionEdificio esta al principio, asi que un descarte cuesta unos pocos KB). Si todas se cumplen
+se termina de parsear el mismo arbol y se devuelve el ParserCEX:
+
+    where = [
+        ("IdentificacionEdificio.ZonaClimatica", "==", "D3"),
+        ("IdentificacionEdificio.TipoDeEdificio", "==", "BloqueDeViviendaCompleto"),
+        ("IdentificacionEdificio.AnoConstruccion", "<", 1980),
+    ]
+    cex = read_filtered(path, where)  # None si no cumple el filtro
+    parse_many(paths, extract, where=where)
+"""
+
+import operator
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable
+
+from lxml import etree
+
+from .parser_cex import ParserCEX, get_value
+
+
+def _in(value: Any, target: Any) -> bool:
+    return value in target
+
+
+def _not_in(value: Any, target: Any) -> bool:
+    return value not in target
+
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": _in,
+    "not in": _not_in,
+}
+
+Condition = tuple[str, str, Any]
+"""
+('Seccion.Elemento.Subelemento', operador, valor). El campo es la ruta del elemento en el XML
+"""
+
+
+def _value(element: etree._Element | None, target: Any) -> Any:
+    """
+    Valor del elemento con el tipo del objetivo. Si el objetivo es una cadena se compara el texto tal cual: get_value
+    convertiria a float campos que el parser guarda como texto ('08028', '911835430'). Si es numerico se convierte
+    a float (el texto que no es un numero se deja como esta y no cumple la condicion)
+    """
+    if element is None or not element.text or not element.text.strip():
+        return None
+    sample = next(iter(target), None) if isinstance(target, (list, tuple, set, frozenset)) else target
+    text = element.text.strip()
+    if isinstance(sample, str):
+        return text
+    if isinstance(sample, (int, float)):
+        try:
+            return float(text)
+        except ValueError:
+            return text
+    return get_value(element)
+
+
+class Predicate(object):
+    """
+    Conjuncion (AND) de condiciones agrupadas por seccion de primer nivel.
+    Un campo que no existe en el XML no cumple ninguna condicion
+    """
+
+    __slots__ = ("conditions", "sections")
+
+    def __init__(self, conditions: Iterable[Condition]) -> None:
+        self.conditions = [tuple(condition) for condition in conditions]
+        self.sections: dict[str, list[tuple[str, Any, Any]]] = {}
+        for field, op, target in self.conditions:
+            if op not in OPERATORS:
+                raise Exception(f"Operador '{op}' no soportado. Se esperaba uno de {tuple(OPERATORS)}")
+            section, _, path = field.partition(".")
+            if not path:
+                raise Exception(f"El campo '{field}' debe tener la forma 'Seccion.Campo'")
+            self.sections.setdefault(section, []).append((path.replace(".", "/"), OPERATORS[op], target))
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.conditions} >"
+
+    def evaluate(self, section: str, element: etree._Element | None) -> bool:
+        """
+        Evalua las condiciones de una seccion sobre su elemento (None si el XML no la contiene)
+        """
+        for path, function, target in self.sections.get(section, ()):
+            value = _value(element.find(path), target) if element is not None else None
+            if value is None:
+                return False
+            try:
+                if not function(value, target):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def __call__(self, cex: ParserCEX) -> bool:
+        """
+        Evalua el filtro sobre un certificado ya parseado
+        """
+        root = cex._xml.getroot()
+        return all(self.evaluate(section, root.find(section)) for section in self.sections)
+
+
+def read_filtered(source: Path | str | BinaryIO, where: Predicate | Iterable[Condition], chunk_size: int = 4096) -> ParserCEX | None:
+    """
+    Parsea el fichero solo si cumple el filtro. Devuelve None en cuanto una seccion no lo cumple, sin leer el resto.
+    source puede ser una ruta o un fichero binario abierto
+    """
+    predicate = where if isinstance(where, Predicate) else Predicate(where)
+    pending = set(predicate.sections)
+    parser = etree.XMLPullParser(events=("end",), tag=list(pending) or None)
+
+    file = open(source, "rb") if isinstance(source, (str, Path)) else source
+    try:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                parent = element.getparent()
+                # Solo cuentan las secciones de primer nivel (Demanda tambien aparece dentro de Calificacion)
+                if element.tag not in pending or parent is None or parent.getparent() is not None:
+                    continue
+                pending.discard(element.tag)
+                if not predicate.evaluate(element.tag, element):
+                    return None
+        root = parser.close()
+    finally:
+        if file is not source:
+            file.close()
+
+    # Secciones del filtro que no aparecen en el fichero
+    if any(not predicate.evaluate(section, None) for section in pending):
+        return None
+    return ParserCEX(etree.ElementTree(root))
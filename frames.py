@@ -0,0 +1,127 @@
+"""
+Utilidades para construir tablas (pandas, polars o pyarrow.Table) a partir de los parsers.
+
+Las tablas se construyen desde los buffers columnares de columnar.ColumnBatch (float64, datetime64 y
+cadenas como offsets + bytes UTF-8), sin pasar por objetos de pandas cuando el destino es polars o pyarrow.
+Cada libreria se importa dentro de cada funcion: el nucleo (parser_cex, batch, records...) solo necesita lxml
+"""
+
+from typing import Any, Iterable, TYPE_CHECKING
+
+from .parser_cex import CATEGORICAL_FIELDS, ParserCEX
+from .records import SECTIONS, flatten_dict
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from .columnar import Column, ColumnBatch
+
+
+ENVELOPE_TABLES = ("CerramientosOpacos", "HuecosyLucernarios", "PuentesTermicos")
+
+FRAME_BACKENDS = ("pandas", "polars", "pyarrow")
+
+
+def _is_categorical(name: str) -> bool:
+    return name.rsplit(".", 1)[-1] in CATEGORICAL_FIELDS
+
+
+def _arrow_array(column: "Column", categorical: bool):
+    import numpy as np
+    import pyarrow as pa
+
+    if column.kind == "f8":
+        return pa.array(column.values, mask=np.isnan(column.values))
+    if column.kind == "M8":
+        return pa.array(column.values, mask=np.isnat(column.values))
+    if column.kind == "obj":
+        # Arrow no admite columnas con varios tipos: las columnas mixtas se entregan como texto
+        return pa.array([None if value is None else str(value) for value in column.values], type=pa.large_string())
+
+    # Las cadenas se entregan a Arrow con sus propios buffers: validez (bitmap), offsets int64 y bytes UTF-8
+    length = len(column.valid)
+    validity = pa.py_buffer(np.packbits(column.valid, bitorder="little"))
+    array = pa.LargeStringArray.from_buffers(length, pa.py_buffer(column.offsets), pa.py_buffer(column.values), validity)
+    if categorical and array.null_count < length:
+        return array.dictionary_encode()
+    return array
+
+
+def _pandas_column(column: "Column", categorical: bool):
+    import pandas as pd
+
+    if column.kind != "str":
+        # Las columnas 'obj' conservan los valores originales en una columna object
+        return column.values
+    values = column.to_list()
+    if categorical and any(value is not None for value in values):
+        return pd.Categorical(values)
+    return values
+
+
+def to_frame(data: "ColumnBatch | Iterable[dict]", backend: str = "pandas", categorical: bool = True) -> Any:
+    """
+    Tabla en el backend indicado ('pandas', 'polars' o 'pyarrow') a partir de un ColumnBatch (p. ej. el de
+    columnar.parse_columnar) o de una lista de registros. Una columna que mezcla numeros y texto queda como object
+    en pandas, con los valores originales, y como texto en polars y pyarrow.
+    Con categorical los campos de CATEGORICAL_FIELDS se crean como category / dictionary / Categorical
+    """
+    from .columnar import ColumnBatch
+
+    if backend not in FRAME_BACKENDS:
+        raise Exception(f"Backend '{backend}' no soportado. Se esperaba uno de {FRAME_BACKENDS}")
+    batch = data if isinstance(data, ColumnBatch) else ColumnBatch.from_records(list(data))
+
+    if backend == "pandas":
+        import pandas as pd
+
+        columns = {name: _pandas_column(column, categorical and _is_categorical(name)) for name, column in batch.columns.items()}
+        return pd.DataFrame(columns, index=pd.RangeIndex(batch.length))
+
+    import pyarrow as pa
+
+    table = pa.table({name: _arrow_array(column, categorical and _is_categorical(name)) for name, column in batch.columns.items()})
+    if backend == "pyarrow":
+        return table
+
+    import polars as pl
+
+    return pl.from_arrow(table)
+
+
+def records_frame(records: Iterable[dict], categorical: bool = True, backend: str = "pandas") -> Any:
+    """
+    Tabla con un certificado por fila a partir de los registros de records.flatten.
+    Con categorical los campos de CATEGORICAL_FIELDS (provincia, zona climatica, letras...) se crean como category
+    """
+    return to_frame(records, backend, categorical)
+
+
+def section_frames(data: "ColumnBatch | Iterable[dict]", backend: str = "pandas", categorical: bool = True) -> dict[str, Any]:
+    """
+    Una tabla por seccion ({'IdentificacionEdificio': tabla, ...}) a partir de registros de records.flatten o
+    de un ColumnBatch. Las columnas que no son de ninguna seccion (como 'path') se repiten en todas
+    """
+    from .columnar import ColumnBatch
+
+    batch = data if isinstance(data, ColumnBatch) else ColumnBatch.from_records(list(data))
+    return {section: to_frame(table, backend, categorical) for section, table in batch.sections().items() if section in SECTIONS}
+
+
+def envelope_frames(cex: ParserCEX, backend: str = "pandas") -> dict[str, Any]:
+    """
+    Tablas de DatosEnvolventeTermica: {'CerramientosOpacos': tabla, 'HuecosyLucernarios': tabla, 'PuentesTermicos': tabla}
+    """
+    envolvente = cex.DatosEnvolventeTermica
+    return {table: to_frame(getattr(envolvente, table).to_records(), backend) for table in ENVELOPE_TABLES}
+
+
+def measures_frame(cex: ParserCEX, backend: str = "pandas") -> Any:
+    """
+    Medidas de mejora con una fila por medida ('Medida_1', 'Medida_2'...) y columnas 'Campo.Subcampo'
+    """
+    rows = []
+    for name, values in cex.MedidasDeMejora.to_dict().items():
+        record = flatten_dict(values, "Medida")
+        rows.append({"Medida": name, **{field.removeprefix("Medida."): value for field, value in record.items()}})
+    return to_frame(rows, backend)
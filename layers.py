@@ -0,0 +1,167 @@
+"""
+Capas de los cerramientos opacos de un corpus en formato columnar, al estilo de las columnas lista de Arrow.
+
+Todas las capas de todos los certificados forman una tabla plana (un ColumnBatch) y dos arrays de offsets
+las agrupan por elemento y por certificado:
+
+    layers.columns               capas de todos los elementos, en orden (Material, Espesor...)
+    layers.element_offsets       (elementos + 1,) las capas del elemento e son [element_offsets[e], element_offsets[e + 1])
+    layers.certificate_offsets   (certificados + 1,) los elementos del certificado c son [certificate_offsets[c], certificate_offsets[c + 1])
+
+Los elementos siguen el orden de CerramientosOpacos.to_records() de cada certificado, asi que
+(certificado, elemento) une las capas con las tablas de la envolvente y con la de certificados:
+
+    layers = LayerTable.from_many(paths, workers=8)
+    espesor = layers.sum_by_element(layers.values("Espesor"))
+    layers.to_arrow()  # ListArray<ListArray<Struct>> por certificado
+"""
+
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .batch import BatchStats, parse_many
+from .columnar import ColumnBatch
+from .parser_cex import ParserCEX
+
+
+def layer_records(cex: ParserCEX) -> list[list[dict]]:
+    """
+    Capas de cada cerramiento opaco del certificado. Es picklable y sirve como extract de parse_many
+    """
+    return [elemento.Capas for elemento in cex.DatosEnvolventeTermica.CerramientosOpacos.elementos]
+
+
+class LayerTable(object):
+    """
+    Tabla plana de capas con offsets por elemento y por certificado (ver el docstring del modulo)
+    """
+
+    __slots__ = ("keys", "columns", "element_offsets", "certificate_offsets")
+
+    def __init__(self, keys: list, columns: ColumnBatch, element_offsets: np.ndarray, certificate_offsets: np.ndarray) -> None:
+        self.keys = keys
+        self.columns = columns
+        self.element_offsets = element_offsets
+        self.certificate_offsets = certificate_offsets
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} certificates={len(self.keys)} elements={self.elements} layers={len(self)} >"
+
+    def __len__(self):
+        return self.columns.length
+
+    @property
+    def elements(self) -> int:
+        return len(self.element_offsets) - 1
+
+    @classmethod
+    def from_certificates(cls, certificates: Iterable[ParserCEX | list[list[dict]]], keys: list | None = None) -> "LayerTable":
+        """
+        certificates: objetos ParserCEX o las listas de capas por elemento de layer_records
+        """
+        values = [layer_records(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+        certificate_offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(elements) for elements in values], out=certificate_offsets[1:])
+
+        elements = [capas for certificate in values for capas in certificate]
+        element_offsets = np.zeros(len(elements) + 1, dtype=np.int64)
+        np.cumsum([len(capas) for capas in elements], out=element_offsets[1:])
+
+        columns = ColumnBatch.from_records([capa for capas in elements for capa in capas])
+        return cls(list(range(len(values))) if keys is None else list(keys), columns, element_offsets, certificate_offsets)
+
+    @classmethod
+    def from_many(cls, paths: Iterable[Path | str], workers: int | None = None, stats: BatchStats | None = None) -> "LayerTable":
+        """
+        Parsea los ficheros con batch.parse_many. Las claves son las rutas de los ficheros validos; los fallidos se omiten
+        """
+        keys, values = [], []
+        for result in parse_many(paths, extract=layer_records, workers=workers, stats=stats):
+            if result.ok:
+                keys.append(result.path)
+                values.append(result.value)
+        return cls.from_certificates(values, keys)
+
+    def values(self, name: str) -> np.ndarray:
+        """
+        Array plano de un campo numerico de las capas (NaN si falta)
+        """
+        if name not in self.columns.columns:
+            return np.full(len(self), np.nan)
+        column = self.columns[name]
+        if column.kind != "f8":
+            raise Exception(f"El campo '{name}' de las capas no es numerico")
+        return column.values
+
+    @property
+    def element_ids(self) -> np.ndarray:
+        """
+        Elemento (indice global) de cada capa
+        """
+        return np.repeat(np.arange(self.elements, dtype=np.int64), np.diff(self.element_offsets))
+
+    @property
+    def certificate_ids(self) -> np.ndarray:
+        """
+        Certificado de cada capa
+        """
+        element_certificate = np.repeat(np.arange(len(self.keys), dtype=np.int64), np.diff(self.certificate_offsets))
+        return element_certificate[self.element_ids]
+
+    def element_index(self) -> np.ndarray:
+        """
+        Posicion del elemento de cada capa dentro de los CerramientosOpacos de su certificado
+        """
+        return self.element_ids - self.certificate_offsets[self.certificate_ids]
+
+    def sum_by_element(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.element_ids, weights=values, minlength=self.elements)
+
+    def sum_by_certificate(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.certificate_ids, weights=values, minlength=len(self.keys))
+
+    def to_pydict(self) -> dict[str, list]:
+        """
+        Tabla plana de capas con las columnas de union: certificado (clave), elemento (posicion en su certificado) y capa
+        """
+        element_ids = self.element_ids
+        return {
+            "key": [self.keys[i] for i in self.certificate_ids],
+            "elemento": self.element_index().tolist(),
+            "capa": (np.arange(len(self)) - self.element_offsets[element_ids]).tolist(),
+            **self.columns.to_pydict(),
+        }
+
+    def frame(self, backend: str = "pandas", categorical: bool = True):
+        """
+        Tabla plana de capas (ver to_pydict) en el backend de frames.to_frame
+        """
+        from .columnar import Column
+        from .frames import to_frame
+
+        element_ids = self.element_ids
+        index = {
+            "key": Column.from_values([self.keys[i] for i in self.certificate_ids]),
+            "elemento": Column("f8", self.element_index().astype(np.float64)),
+            "capa": Column("f8", (np.arange(len(self)) - self.element_offsets[element_ids]).astype(np.float64)),
+        }
+        return to_frame(ColumnBatch({**index, **self.columns.columns}, len(self)), backend, categorical)
+
+    def to_arrow(self):
+        """
+        pyarrow.ListArray con un valor por certificado: la lista de sus elementos, cada uno con la lista de sus capas
+        (list<list<struct>>). Se construye sobre los offsets sin copiar la estructura
+        """
+        import pyarrow as pa
+
+        from .frames import _arrow_array
+
+        fields = {name: _arrow_array(column, False) for name, column in self.columns.columns.items()}
+        if fields:
+            layers = pa.StructArray.from_arrays(list(fields.values()), names=list(fields))
+        else:
+            layers = pa.array([], type=pa.struct([]))
+        elements = pa.LargeListArray.from_arrays(pa.array(self.element_offsets), layers)
+        return pa.LargeListArray.from_arrays(pa.array(self.certificate_offsets), elements)
@@ -1,11 +1,32 @@
+import os
 from pathlib import Path
-from typing import Any, Generator
+from typing import Any, BinaryIO, Callable, Generator, Iterable, TYPE_CHECKING
+from xml.etree import ElementTree
 from lxml import etree
 from datetime import datetime
 
 from abc import abstractmethod, ABC
 
-import pandas as pd
+if TYPE_CHECKING:
+    # pandas solo se importa al construir el primer DataFrame (ver IElementContainer._create_df)
+    import pandas as pd
+
+
+BACKENDS: dict[str, Callable[[Any], Any]] = {
+    "lxml": etree.parse,
+    "etree": ElementTree.parse,
+}
+"""
+Backends de arbol XML: funcion que recibe una ruta o fichero y devuelve un arbol con getroot() y find().
+Los parsers de seccion solo usan find, findall, .tag, .text y la iteracion sobre los hijos, asi que
+sirven para lxml y para xml.etree.ElementTree. Se pueden registrar otros con la misma interfaz.
+
+El backend por defecto es lxml o el de la variable de entorno PARSER_CEX_BACKEND (la heredan los workers)
+"""
+
+
+def _is_tree(xml: Any) -> bool:
+    return isinstance(xml, (etree._ElementTree, ElementTree.ElementTree))
 
 
 def get_value(element: etree._Element):
@@ -22,12 +43,124 @@ def get_value(element: etree._Element):
     return None
 
 
+# Pool de cadenas del proceso para los campos categoricos (_Primitive._categorical): todas las apariciones de
+# 'Madrid', 'Fachada' o 'E' comparten el mismo objeto str. Se limita el tamaño por si un campo no es tan repetitivo.
+# Es el unico estado mutable compartido del modulo: se usa setdefault para que dos hilos que añaden la misma
+# cadena a la vez se queden con el mismo objeto (el limite puede superarse en unas pocas entradas)
+_strings: dict[str, str] = {}
+_STRINGS_MAX = 65536
+
+
+def intern_value(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    pooled = _strings.get(value)
+    if pooled is not None:
+        return pooled
+    if len(_strings) < _STRINGS_MAX:
+        return _strings.setdefault(value, value)
+    return value
+
+
+def get_category(element: etree._Element):
+    """
+    get_value para campos con pocos valores distintos: devuelve la cadena del pool del proceso
+    """
+    return intern_value(get_value(element))
+
+
+def as_categories(df: "pd.DataFrame", names: Iterable[str]) -> "pd.DataFrame":
+    """
+    Convierte a category las columnas de texto del DataFrame cuyo nombre (o ultimo tramo de 'Seccion.Campo') esta en names
+    """
+    from pandas.api.types import is_numeric_dtype
+
+    names = set(names)
+    for column in df.columns:
+        if column.rsplit(".", 1)[-1] in names and not is_numeric_dtype(df[column]) and df[column].notna().any():
+            df[column] = df[column].astype("category")
+    return df
+
+
+# Atributo con el que ParserCEX.close() marca un arbol cerrado: la raiz en lxml, cada elemento en ElementTree
+_CLOSED = "_parser_cex_cerrado"
+
+
+class _Document(object):
+    """
+    Estado que comparten un ParserCEX de lxml y los bloques que se crean a partir de su arbol
+    """
+
+    __slots__ = ("closed",)
+
+    def __init__(self) -> None:
+        self.closed = False
+
+
+class _Marked(object):
+    """
+    Documento sin _Document (ElementTree, o un arbol que no viene de un ParserCEX): se mira la marca de close()
+    en la raiz (lxml) o en el propio elemento (ElementTree, donde close() los marca uno a uno)
+    """
+
+    __slots__ = ("_element",)
+
+    def __init__(self, element: etree._Element) -> None:
+        self._element = element
+
+    @property
+    def closed(self) -> bool:
+        return self._element.get(_CLOSED) is not None
+
+
+# _Document de cada ParserCEX de lxml abierto, por id de la raiz. Se guarda la raiz para que su id no se reutilice
+_documents: dict[int, tuple[etree._Element, _Document]] = {}
+_OPEN = _Document()
+
+
+def _document_of(element: etree._Element | None) -> _Document | _Marked:
+    """
+    Documento de element. Cada bloque lo busca una vez al crearse y en cada acceso solo mira document.closed
+    """
+    if element is None:
+        return _OPEN
+    if not isinstance(element, etree._Element):
+        return _Marked(element)
+    root = element.getroottree().getroot()
+    entry = _documents.get(id(root))
+    if entry is not None and entry[0] is root:
+        return entry[1]
+    return _Marked(root)
+
+
+def _check_open(element: etree._Element, document: _Document | _Marked) -> etree._Element:
+    """
+    Devuelve element, o lanza una excepcion si pertenece a un certificado cerrado con ParserCEX.close()
+    """
+    if document.closed:
+        raise Exception("El certificado esta cerrado (ParserCEX.close): los datos se deben extraer antes de cerrarlo")
+    return element
+
+
+def _to_dict(parser: type, element: etree._Element) -> dict | None:
+    if element is None:
+        return None
+    return parser(element).to_dict()
+
+
 class _Primitive(ABC):
     """
     Clase utilizada para realizar busquedas en un elemento etree._Element
     Tambien se utiliza para aquellas clases que implementen __slots__
     """
 
+    # Campos de __slots__ que contienen otro bloque y el parser que lo lee
+    _nested: dict[str, type["_Primitive"]] = {}
+    # Campos de __slots__ que se devuelven como texto sin convertir a float
+    _text: tuple[str, ...] = ()
+    # Campos de __slots__ con pocos valores distintos: se guardan en el pool de cadenas y los DataFrames los crean como category
+    _categorical: tuple[str, ...] = ()
+
     def __init__(self, root: etree._Element):
         if root is None:
             raise Exception(f"el argumento 'root' es {type(root)}.\nSe esperaba {etree._Element}")
@@ -37,6 +170,16 @@ class _Primitive(ABC):
     def __repr__(self):
         return f"< {self.__class__.__name__} >"
 
+    @property
+    def _root(self) -> etree._Element:
+        # Un bloque que sobrevive a su ParserCEX no puede seguir leyendo el arbol (ver ParserCEX.close)
+        return _check_open(self._element, self._document)
+
+    @_root.setter
+    def _root(self, root: etree._Element) -> None:
+        self._element = root
+        self._document = _document_of(root)
+
     def _find(self, name: str) -> etree._Element:
         return self._root.find(name)
 
@@ -49,6 +192,28 @@ class _Primitive(ABC):
         for attr in self.__slots__:
             setattr(self, attr, attr.removeprefix("_"))
 
+    def to_dict(self) -> dict:
+        """
+        Devuelve todos los campos de __slots__ recorriendo una sola vez los hijos del elemento,
+        en lugar de hacer un find por cada property
+        """
+        dicc = dict.fromkeys(attr.removeprefix("_") for attr in self.__slots__)
+        seen = set()
+        for child in self._root:
+            tag = child.tag
+            if tag not in dicc or tag in seen:
+                continue
+            seen.add(tag)
+            if tag in self._nested:
+                dicc[tag] = self._nested[tag](child).to_dict()
+            elif tag in self._text:
+                dicc[tag] = child.text
+            elif tag in self._categorical:
+                dicc[tag] = get_category(child)
+            else:
+                dicc[tag] = get_value(child)
+        return dicc
+
 
 class _Parser_escala_global(_Primitive):
     """
@@ -120,6 +285,7 @@ class _Parser_calificacion_instalaciones(_Primitive):
     """
 
     __slots__ = ("_Calefaccion", "_Refrigeracion", "_ACS", "_Global")
+    _categorical = ("Calefaccion", "Refrigeracion", "ACS", "Global")
 
     def __init__(self, root: etree._Element):
         super().__init__(root)
@@ -127,19 +293,19 @@ class _Parser_calificacion_instalaciones(_Primitive):
 
     @property
     def Calefaccion(self):
-        return get_value(self._find(self._Calefaccion))
+        return get_category(self._find(self._Calefaccion))
 
     @property
     def Refrigeracion(self):
-        return get_value(self._find(self._Refrigeracion))
+        return get_category(self._find(self._Refrigeracion))
 
     @property
     def ACS(self):
-        return get_value(self._find(self._ACS))
+        return get_category(self._find(self._ACS))
 
     @property
     def Global(self):
-        return get_value(self._find(self._Global))
+        return get_category(self._find(self._Global))
 
 
 class _Parser_calificacion_EnergiaPrimariaNoRenovable(_Parser_calificacion_instalaciones):
@@ -151,6 +317,11 @@ class _Parser_calificacion_EnergiaPrimariaNoRenovable(_Parser_calificacion_insta
     def EscalaGlobal(self):
         return _Parser_escala_global(self._EscalaGlobal)
 
+    def to_dict(self) -> dict:
+        dicc = super().to_dict()
+        dicc["EscalaGlobal"] = _to_dict(_Parser_escala_global, self._EscalaGlobal)
+        return dicc
+
 
 class _Parser_calificacion_EmisionesCO2(_Parser_calificacion_EnergiaPrimariaNoRenovable):
     """
@@ -174,6 +345,12 @@ class _Parser_calificacion_demanda(_Parser_calificacion_instalaciones):
     def EscalaRefrigeracion(self):
         return _Parser_escala_global(self._EscalaRefrigeracion)
 
+    def to_dict(self) -> dict:
+        dicc = super().to_dict()
+        dicc["EscalaCalefaccion"] = _to_dict(_Parser_escala_global, self._EscalaCalefaccion)
+        dicc["EscalaRefrigeracion"] = _to_dict(_Parser_escala_global, self._EscalaRefrigeracion)
+        return dicc
+
 
 class _Parser_instalaciones(_Primitive):
     __slots__ = ("_ACS", "_Calefaccion", "_Global", "_Refrigeracion", "_Iluminacion", "_GlobalDiferenciaSituacionInicial", "_Conjunta")
@@ -227,30 +404,38 @@ class _Parser_IdentificacionEdificio(_Primitive):
         "_Municipio",
         "_AnoConstruccion",
     )
+    _text = ("CodigoPostal", "AnoConstruccion")
+    _categorical = ("Provincia", "ComunidadAutonoma", "ZonaClimatica", "TipoDeEdificio", "NormativaVigente", "Procedimiento", "AlcanceInformacionXML", "Municipio")
 
     def __init__(self, root: etree._Element):
         super().__init__(root.find("IdentificacionEdificio"))
         self.set_args()
 
+    def to_dict(self) -> dict:
+        dicc = super().to_dict()
+        if dicc["NormativaVigente"] == "Anterior":
+            dicc["NormativaVigente"] = "Anterior a la NBE-CT-79"
+        return dicc
+
     @property
     def ReferenciaCatastral(self):
         return get_value(self._find(self._ReferenciaCatastral))
 
     @property
     def Provincia(self):
-        return get_value(self._find(self._Provincia))
+        return get_category(self._find(self._Provincia))
 
     @property
     def ComunidadAutonoma(self):
-        return get_value(self._find(self._ComunidadAutonoma))
+        return get_category(self._find(self._ComunidadAutonoma))
 
     @property
     def ZonaClimatica(self):
-        return get_value(self._find(self._ZonaClimatica))
+        return get_category(self._find(self._ZonaClimatica))
 
     @property
     def TipoDeEdificio(self):
-        return get_value(self._find(self._TipoDeEdificio))
+        return get_category(self._find(self._TipoDeEdificio))
 
     @property
     def NormativaVigente(self):
@@ -258,7 +443,7 @@ class _Parser_IdentificacionEdificio(_Primitive):
         # Condicion para que devuelva un mensaje mas especifico
         if norma == "Anterior":
             return "Anterior a la NBE-CT-79"
-        return get_value(self._find(self._NormativaVigente))
+        return get_category(self._find(self._NormativaVigente))
 
     @property
     def Direccion(self):
@@ -270,7 +455,7 @@ class _Parser_IdentificacionEdificio(_Primitive):
 
     @property
     def Procedimiento(self):
-        return get_value(self._find(self._Procedimiento))
+        return get_category(self._find(self._Procedimiento))
 
     @property
     def CodigoPostal(self):
@@ -278,11 +463,11 @@ class _Parser_IdentificacionEdificio(_Primitive):
 
     @property
     def AlcanceInformacionXML(self):
-        return get_value(self._find(self._AlcanceInformacionXML))
+        return get_category(self._find(self._AlcanceInformacionXML))
 
     @property
     def Municipio(self):
-        return get_value(self._find(self._Municipio))
+        return get_category(self._find(self._Municipio))
 
     @property
     def AnoConstruccion(self):
@@ -305,6 +490,8 @@ class _Parser_DatosDelCertificador(_Primitive):
         "_Email",
         "_Domicilio",
     )
+    _text = ("CodigoPostal", "Telefono")
+    _categorical = ("ComunidadAutonoma", "Titulacion", "Municipio", "Provincia")
 
     def __init__(self, root: etree._Element):
         super().__init__(root.find("DatosDelCertificador"))
@@ -316,11 +503,11 @@ class _Parser_DatosDelCertificador(_Primitive):
 
     @property
     def ComunidadAutonoma(self):
-        return get_value(self._find(self._ComunidadAutonoma))
+        return get_category(self._find(self._ComunidadAutonoma))
 
     @property
     def Titulacion(self):
-        return get_value(self._find(self._Titulacion))
+        return get_category(self._find(self._Titulacion))
 
     @property
     def Fecha(self):
@@ -340,7 +527,7 @@ class _Parser_DatosDelCertificador(_Primitive):
 
     @property
     def Municipio(self):
-        return get_value(self._find(self._Municipio))
+        return get_category(self._find(self._Municipio))
 
     @property
     def CodigoPostal(self):
@@ -348,7 +535,7 @@ class _Parser_DatosDelCertificador(_Primitive):
 
     @property
     def Provincia(self):
-        return get_value(self._find(self._Provincia))
+        return get_category(self._find(self._Provincia))
 
     @property
     def Telefono(self):
@@ -420,6 +607,7 @@ class _Parser_DatosGeneralesyGeometria(_Primitive):
         "_Imagen",
         "_PorcentajeSuperficieAcristalada",
     )
+    _nested = {"PorcentajeSuperficieAcristalada": _Parser_PorcentajeSuperficieAcristalada}
 
     def __init__(self, root: etree._Element):
         self._root = root.find("DatosGeneralesyGeometria")
@@ -483,13 +671,22 @@ class _Parser_DatosGeneralesyGeometria(_Primitive):
 
 
 class IElementContainer(ABC):
-    __slots__ = ("_elementos", "_df", "_root")
+    __slots__ = ("_elementos", "_df", "_element", "_document")
 
     def __repr__(self):
         return f"< {self.__class__.__name__} >"
 
     @property
-    def df(self) -> pd.DataFrame:
+    def _root(self) -> etree._Element:
+        return _check_open(self._element, self._document)
+
+    @_root.setter
+    def _root(self, root: etree._Element) -> None:
+        self._element = root
+        self._document = _document_of(root)
+
+    @property
+    def df(self) -> "pd.DataFrame":
         return self._create_df()
 
     @abstractmethod
@@ -499,9 +696,16 @@ class IElementContainer(ABC):
     @abstractmethod
     def elementos(self): ...
 
-    def _create_df(self) -> pd.DataFrame:
-        lista = [x.get_dict() for x in self._elementos]
-        return pd.DataFrame(lista)
+    def to_records(self) -> list[dict]:
+        """
+        Lista con el diccionario de cada elemento, en una sola pasada por elemento
+        """
+        return [x.to_dict() for x in self._get_elementos()]
+
+    def _create_df(self) -> "pd.DataFrame":
+        import pandas as pd
+
+        return as_categories(pd.DataFrame(self.to_records()), _CommonAttributes._categorical)
 
 
 class _CommonAttributes(_Primitive):
@@ -510,6 +714,7 @@ class _CommonAttributes(_Primitive):
         "_Tipo",
         "_Transmitancia",
     )
+    _categorical = ("Tipo", "ModoDeObtencion", "Orientacion", "ModoDeObtencionTransmitancia", "ModoDeObtencionFactorSolar")
 
     def __repr__(self):
         return f"Element <{self.__class__.__name__}>"
@@ -535,11 +740,11 @@ class _Parser_elemento_CerramientosOpacos(_CommonAttributes):
 
     @property
     def Tipo(self):
-        return get_value(self._find(self._Tipo))
+        return get_category(self._find(self._Tipo))
 
     @property
     def ModoDeObtencion(self):
-        return get_value(self._find(self._ModoDeObtencion))
+        return get_category(self._find(self._ModoDeObtencion))
 
     @property
     def Transmitancia(self):
@@ -551,12 +756,38 @@ class _Parser_elemento_CerramientosOpacos(_CommonAttributes):
 
     @property
     def Orientacion(self):
-        return get_value(self._find(self._Orientacion))
+        return get_category(self._find(self._Orientacion))
 
     @property
     def Superficie(self):
         return get_value(self._find(self._Superficie))
 
+    @property
+    def Capas(self) -> list[dict]:
+        """
+        Capas del cerramiento, una por <Capa> con todos sus campos. No forma parte de to_dict ni de la tabla de
+        elementos: es una lista anidada (ver layers.LayerTable para tenerlas en columnas planas)
+        """
+        capas = self._find("Capas")
+        if capas is None:
+            return []
+        return [_Parser_Capa(capa).to_dict() for capa in capas.findall("Capa")]
+
+
+class _Parser_Capa(_Primitive):
+    """
+    Una capa de <Capas>. Los campos dependen de la version de CE3X, asi que se leen todos los hijos
+    """
+
+    _categorical = ("Material",)
+
+    def to_dict(self) -> dict:
+        return {
+            child.tag: get_category(child) if child.tag in self._categorical else get_value(child)
+            for child in self._root
+            if isinstance(child.tag, str)
+        }
+
 
 class _Parser_CerramientosOpacos(IElementContainer):
     def __init__(self, root: etree._Element) -> None:
@@ -584,7 +815,7 @@ class _Parser_elemento_HuecosyLucernarios(_CommonAttributes):
 
     @property
     def Tipo(self):
-        return get_value(self._find(self._Tipo))
+        return get_category(self._find(self._Tipo))
 
     @property
     def Superficie(self):
@@ -600,15 +831,15 @@ class _Parser_elemento_HuecosyLucernarios(_CommonAttributes):
 
     @property
     def ModoDeObtencionTransmitancia(self):
-        return get_value(self._find(self._ModoDeObtencionTransmitancia))
+        return get_category(self._find(self._ModoDeObtencionTransmitancia))
 
     @property
     def Orientacion(self):
-        return get_value(self._find(self._Orientacion))
+        return get_category(self._find(self._Orientacion))
 
     @property
     def ModoDeObtencionFactorSolar(self):
-        return get_value(self._find(self._ModoDeObtencionFactorSolar))
+        return get_category(self._find(self._ModoDeObtencionFactorSolar))
 
     @property
     def FactorSolar(self):
@@ -645,7 +876,7 @@ class _Parser_elemento_PuentesTermicos(_CommonAttributes):
 
     @property
     def ModoDeObtencion(self):
-        return get_value(self._find(self._ModoDeObtencion))
+        return get_category(self._find(self._ModoDeObtencion))
 
     @property
     def Transmitancia(self):
@@ -653,7 +884,7 @@ class _Parser_elemento_PuentesTermicos(_CommonAttributes):
 
     @property
     def Tipo(self):
-        return get_value(self._find(self._Tipo))
+        return get_category(self._find(self._Tipo))
 
     @property
     def Longitud(self):
@@ -697,9 +928,17 @@ class _Parser_DatosEnvolventeTermica(_Primitive):
     def PuentesTermicos(self):
         return self._PuentesTermicos(self._root)
 
+    def to_dict(self) -> dict:
+        return {
+            "CerramientosOpacos": self.CerramientosOpacos.to_records(),
+            "HuecosyLucernarios": self.HuecosyLucernarios.to_records(),
+            "PuentesTermicos": self.PuentesTermicos.to_records(),
+        }
+
 
 class _Parser_InstalacionesTermicas_data(_Primitive):
     __slots__ = ("_RendimientoNominal", "_Tipo", "_ModoDeObtencion", "_VectorEnergetico", "_PotenciaNominal", "_Nombre", "_RendimientoEstacional")
+    _categorical = ("Tipo", "ModoDeObtencion", "VectorEnergetico")
 
     def __init__(self, root: etree._Element) -> None:
         super().__init__(root)
@@ -711,15 +950,15 @@ class _Parser_InstalacionesTermicas_data(_Primitive):
 
     @property
     def Tipo(self):
-        return get_value(self._find(self._Tipo))
+        return get_category(self._find(self._Tipo))
 
     @property
     def ModoDeObtencion(self):
-        return get_value(self._find(self._ModoDeObtencion))
+        return get_category(self._find(self._ModoDeObtencion))
 
     @property
     def VectorEnergetico(self):
-        return get_value(self._find(self._VectorEnergetico))
+        return get_category(self._find(self._VectorEnergetico))
 
     @property
     def PotenciaNominal(self):
@@ -746,9 +985,16 @@ class _Parser_InstalacionesTermicas(object):
     def InstalacionesACS(self):
         return _Parser_InstalacionesTermicas_data(self._root.find("InstalacionesACS").find("Instalacion"))
 
+    def to_dict(self) -> dict:
+        return {
+            "GeneradoresDeCalefaccion": _to_dict(_Parser_InstalacionesTermicas_data, self._root.find("GeneradoresDeCalefaccion/Generador")),
+            "InstalacionesACS": _to_dict(_Parser_InstalacionesTermicas_data, self._root.find("InstalacionesACS/Instalacion")),
+        }
+
 
 class _Parser_CondicionesFuncionamientoyOcupacion(_Primitive):
     __slots__ = ("_Nombre", "_Superficie", "_NivelDeAcondicionamiento", "_PerfilDeUso")
+    _categorical = ("NivelDeAcondicionamiento", "PerfilDeUso")
 
     def __init__(self, root: etree._Element):
         self.set_args()
@@ -764,11 +1010,11 @@ class _Parser_CondicionesFuncionamientoyOcupacion(_Primitive):
 
     @property
     def NivelDeAcondicionamiento(self):
-        return get_value(self._find(self._NivelDeAcondicionamiento))
+        return get_category(self._find(self._NivelDeAcondicionamiento))
 
     @property
     def PerfilDeUso(self):
-        return get_value(self._find(self._PerfilDeUso))
+        return get_category(self._find(self._PerfilDeUso))
 
 
 class _Parser_Demanda(object):
@@ -777,6 +1023,9 @@ class _Parser_Demanda(object):
 
         self.EdificioObjeto = _Parser_instalaciones(self._root.find("EdificioObjeto"))
 
+    def to_dict(self) -> dict:
+        return {"EdificioObjeto": self.EdificioObjeto.to_dict()}
+
 
 class _Parser_combustibles(_Primitive):
     __slots__ = (
@@ -849,6 +1098,12 @@ class _Parser_FactoresDePaso(object):
         self.FinalAPrimariaNoRenovable = _Parser_combustibles(self._root.find("FinalAPrimariaNoRenovable"))
         self.FinalAEmisiones = _Parser_combustibles(self._root.find("FinalAEmisiones"))
 
+    def to_dict(self) -> dict:
+        return {
+            "FinalAPrimariaNoRenovable": self.FinalAPrimariaNoRenovable.to_dict(),
+            "FinalAEmisiones": self.FinalAEmisiones.to_dict(),
+        }
+
 
 class _Parser_EnergiaFinalVectores:
     """
@@ -867,6 +1122,8 @@ class _Parser_EnergiaFinalVectores:
 
     """
 
+    _vectores = ("GasNatural", "ElectricidadPeninsular", "BiomasaOtros", "GasoleoC", "GLP", "Carbon", "Biocarburante", "BiomasaPellet")
+
     def __init__(self, root: etree._Element) -> None:
         self._root = root.find("EnergiaFinalVectores")
 
@@ -879,8 +1136,14 @@ class _Parser_EnergiaFinalVectores:
         self.Biocarburante = _Parser_instalaciones(self._root.find("Biocarburante"))
         self.BiomasaPellet = _Parser_instalaciones(self._root.find("BiomasaPellet"))
 
+    def to_dict(self) -> dict:
+        return {vector: getattr(self, vector).to_dict() for vector in self._vectores}
+
 
 class _Parser_Consumo(object):
+    # Bloques que to_dict puede omitir sin leerlos (ver records.flatten con exclude)
+    _excludable = ("FactoresdePaso",)
+
     def __init__(self, root: etree._Element):
         self._root = root.find("Consumo")
 
@@ -900,6 +1163,12 @@ class _Parser_Consumo(object):
     def EnergiaPrimariaNoRenovable(self):
         return self._EnergiaPrimariaNoRenovable(self._root.find("EnergiaPrimariaNoRenovable"))
 
+    def to_dict(self, exclude: Iterable[str] = ()) -> dict:
+        values = {} if "FactoresdePaso" in exclude else {"FactoresdePaso": self.FactoresdePaso.to_dict()}
+        values["EnergiaFinalVectores"] = self.EnergiaFinalVectores.to_dict()
+        values["EnergiaPrimariaNoRenovable"] = _to_dict(self._EnergiaPrimariaNoRenovable, self._root.find("EnergiaPrimariaNoRenovable"))
+        return values
+
 
 class _Parser_EmisionesCO2(object):
     def __init__(self, root: etree._Element):
@@ -917,6 +1186,9 @@ class _Parser_EmisionesCO2(object):
         self.ConsumoOtros = get_value(self._root.find("ConsumoOtros"))
         self.Iluminacion = self._instal.Iluminacion
 
+    def to_dict(self) -> dict:
+        return {key: value for key, value in vars(self).items() if not key.startswith("_")}
+
 
 class _Parser_Calificacion(object):
     _Demanda = "Demanda"
@@ -941,6 +1213,13 @@ class _Parser_Calificacion(object):
     def EmisionesCO2(self):
         return self._parser_EmisionesCO2(self._root.find(self._EmisionesCO2))
 
+    def to_dict(self) -> dict:
+        return {
+            "Demanda": _to_dict(self._parser_demanda, self._root.find(self._Demanda)),
+            "EnergiaPrimariaNoRenovable": _to_dict(self._parser_EPNR, self._root.find(self._EPNR)),
+            "EmisionesCO2": _to_dict(self._parser_EmisionesCO2, self._root.find(self._EmisionesCO2)),
+        }
+
 
 class _Parser_Medida(_Primitive):
     __slots__ = (
@@ -956,6 +1235,15 @@ class _Parser_Medida(_Primitive):
         "_EmisionesCO2",
         "_CalificacionEmisionesCO2",
     )
+    _nested = {
+        "CalificacionDemanda": _Parser_instalaciones,
+        "EnergiaFinal": _Parser_instalaciones,
+        "CalificacionEnergiaPrimariaNoRenovable": _Parser_instalaciones,
+        "Demanda": _Parser_instalaciones,
+        "EnergiaPrimariaNoRenovable": _Parser_instalaciones,
+        "EmisionesCO2": _Parser_instalaciones,
+        "CalificacionEmisionesCO2": _Parser_instalaciones,
+    }
 
     def __init__(self, root: etree._Element):
         super().__init__(root)
@@ -1028,6 +1316,13 @@ class _Parser_MedidasDeMejora(_Primitive):
     def Medida_3(self):
         return _Parser_Medida(self._m3)
 
+    def to_dict(self) -> dict:
+        return {
+            "Medida_1": self.Medida_1.to_dict(),
+            "Medida_2": self.Medida_2.to_dict(),
+            "Medida_3": self.Medida_3.to_dict(),
+        }
+
     def _get_medidas(self) -> etree._Element:
         """
         Finds all tags with the same name.
@@ -1054,6 +1349,9 @@ class _Parser_PruebasComprobacionesInspecciones(object):
             return datetime.strptime(text, "%d/%m/%Y")
         return None
 
+    def to_dict(self) -> dict:
+        return {"Datos": self.Datos, "FechaVisita": self.FechaVisita}
+
 
 class _Parser_DatosPersonalizados(object):
     def __init__(self, root: etree._Element):
@@ -1073,10 +1371,72 @@ class _Parser_DatosPersonalizados(object):
             return datetime.strptime(text, "%d/%m/%Y")
         return None
 
+    def to_dict(self) -> dict:
+        return {"Aplicacion": self.Aplicacion, "FechaGeneracion": self.FechaGeneracion}
+
+
+CATEGORICAL_FIELDS = frozenset(
+    field
+    for parser in (
+        _Parser_calificacion_instalaciones,
+        _Parser_IdentificacionEdificio,
+        _Parser_DatosDelCertificador,
+        _CommonAttributes,
+        _Parser_Capa,
+        _Parser_InstalacionesTermicas_data,
+        _Parser_CondicionesFuncionamientoyOcupacion,
+    )
+    for field in parser._categorical
+)
+"""
+Nombres de los campos categoricos de todos los parsers (ver frames.records_frame)
+"""
+
+TEXT_FIELDS = frozenset(
+    f"{section}.{field}"
+    for section, parser in (
+        ("IdentificacionEdificio", _Parser_IdentificacionEdificio),
+        ("DatosDelCertificador", _Parser_DatosDelCertificador),
+    )
+    for field in parser._text
+)
+"""
+Rutas 'Seccion.Campo' que los parsers devuelven como texto sin convertir a float ('08028' no es 8028.0)
+"""
+
 
 class ParserCEX(object):
-    def __init__(self, xml: Path | str) -> None:
-        self._xml = etree.parse(xml)
+    _sections = (
+        "DatosDelCertificador",
+        "IdentificacionEdificio",
+        "DatosGeneralesyGeometria",
+        "DatosEnvolventeTermica",
+        "InstalacionesTermicas",
+        "CondicionesFuncionamientoyOcupacion",
+        "Demanda",
+        "Consumo",
+        "EmisionesCO2",
+        "Calificacion",
+        "MedidasDeMejora",
+        "PruebasComprobacionesInspecciones",
+        "DatosPersonalizados",
+    )
+
+    def __init__(self, xml: Path | str | BinaryIO | etree._ElementTree | ElementTree.ElementTree, backend: str | None = None) -> None:
+        # Tambien admite un fichero binario abierto o un arbol ya parseado (p. ej. por filters.read_filtered)
+        if _is_tree(xml):
+            self._tree = xml
+        else:
+            backend = backend or os.environ.get("PARSER_CEX_BACKEND", "lxml")
+            if backend not in BACKENDS:
+                raise Exception(f"Backend '{backend}' no soportado. Se esperaba uno de {tuple(BACKENDS)}")
+            self._tree = BACKENDS[backend](xml)
+
+        root = self._tree.getroot()
+        self._document = _Document()
+        self._root_id = id(root) if isinstance(root, etree._Element) else None
+        if self._root_id is not None:
+            _documents[self._root_id] = (root, self._document)
 
         self._DatosDelCertificador = _Parser_DatosDelCertificador
         self._IdentificacionEdificio = _Parser_IdentificacionEdificio
@@ -1092,6 +1452,58 @@ class ParserCEX(object):
         self._PruebasComprobacionesInspecciones = _Parser_PruebasComprobacionesInspecciones
         self._DatosPersonalizados = _Parser_DatosPersonalizados
 
+    def __enter__(self) -> "ParserCEX":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def _xml(self) -> etree._ElementTree | ElementTree.ElementTree:
+        if self._tree is None:
+            raise Exception("El certificado esta cerrado (ParserCEX.close): los datos se deben extraer antes de cerrarlo")
+        return self._tree
+
+    @property
+    def closed(self) -> bool:
+        return self._tree is None
+
+    def close(self) -> None:
+        """
+        Libera el arbol XML. Para servicios que procesan certificados durante semanas:
+
+            with ParserCEX(path) as cex:
+                record = flatten(cex)  # to_dict, flatten y los DataFrames no guardan referencias al arbol
+
+        Despues de cerrar, el ParserCEX y cualquier bloque o elemento que se haya obtenido de el (cex.Demanda,
+        cex.DatosEnvolventeTermica.CerramientosOpacos.elementos, ...) lanzan una excepcion en lugar de seguir
+        leyendo el arbol. El arbol se vacia: solo quedan en memoria los elementos que aun tenga algun bloque y
+        se liberan con el. Llamar dos veces a close no hace nada
+        """
+        tree, self._tree = self._tree, None
+        if tree is None:
+            return
+        self._document.closed = True
+        self._forget()
+        root = tree.getroot()
+        if isinstance(root, etree._Element):
+            # lxml libera al momento los nodos que no tienen proxy de Python y los bloques ven la marca en la raiz
+            root.clear()
+            root.set(_CLOSED, "")
+        else:
+            for element in list(root.iter()):
+                element.clear()
+                element.set(_CLOSED, "")
+
+    def _forget(self) -> None:
+        if getattr(self, "_root_id", None) is not None:
+            _documents.pop(self._root_id, None)
+            self._root_id = None
+
+    def __del__(self) -> None:
+        # Un ParserCEX que no se cierra deja de estar en _documents al liberarse; sus bloques siguen viendo la marca de la raiz
+        self._forget()
+
     @property
     def DatosDelCertificador(self):
         return self._DatosDelCertificador(self._xml)
@@ -1143,3 +1555,10 @@ class ParserCEX(object):
     @property
     def DatosPersonalizados(self):
         return self._DatosPersonalizados(self._xml)
+
+    def to_dict(self) -> dict:
+        """
+        Certificado completo como diccionario anidado (secciones, escalas, medidas y tablas de la envolvente).
+        Las fechas se devuelven como datetime
+        """
+        return {section: getattr(self, section).to_dict() for section in self._sections}
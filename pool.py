@@ -0,0 +1,260 @@
+"""
+Pool de workers persistente para lotes pequeños y frecuentes.
+
+parse_many crea un pool nuevo en cada llamada: con lotes de 50-200 ficheros el arranque de los procesos
+(importar lxml, pandas y parser_cex) y el envio del extract con cada tarea se llevan buena parte del tiempo.
+WarmPool arranca los workers una vez, desde un forkserver que ya tiene importados los modulos de PRELOAD,
+y cada worker prepara en el inicializador su XMLParser, el esquema XSD compilado y la funcion de extraccion.
+Las tareas solo envian las rutas:
+
+    with WarmPool(extract=RecordExtractor(fields), workers=4, idle_timeout=300) as pool:
+        results = pool.parse(paths)  # list[BatchResult], en el orden de entrada
+        ...
+        results = pool.parse(otros)  # mismos workers
+
+Si el pool pasa idle_timeout segundos sin trabajo se cierran los workers; la siguiente llamada los vuelve a arrancar.
+Si un worker muere, los ficheros de las tareas en vuelo se vuelven a procesar uno a uno en un worker propio, asi que
+solo falla el fichero que lo rompe
+"""
+
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from pathlib import Path
+import threading
+from time import monotonic
+from typing import Any, Callable, Iterable
+from weakref import WeakKeyDictionary
+
+from lxml import etree
+
+from .batch import BatchResult, BatchStats, _broken_result, _init_worker, _process_file
+from .parser_cex import ParserCEX
+from .validation import load_schema
+
+
+PRELOAD = ("lxml.etree", f"{__package__}.parser_cex", f"{__package__}.batch", f"{__package__}.records")
+"""
+Modulos que importa el forkserver antes de crear los workers
+"""
+
+# Estado de cada worker, preparado por _init_warm
+_state: dict[str, Any] = {}
+
+
+def _init_warm(
+    extract: Callable[[ParserCEX], Any] | None,
+    xsd: str | None,
+    where: list | None,
+    parser_options: dict,
+    memory_limit: int | None,
+    timeout: float | None,
+) -> None:
+    _init_worker(memory_limit)
+    _state["extract"] = extract
+    _state["xsd"] = xsd
+    _state["where"] = where
+    _state["timeout"] = timeout
+    _state["parser"] = etree.XMLParser(**parser_options)
+    if xsd is not None:
+        load_schema(xsd)
+
+
+def _warm_chunk(items: list[str | tuple[str, bytes]]) -> list[BatchResult]:
+    results = []
+    for item in items:
+        path, source = item if isinstance(item, tuple) else (item, None)
+        results.append(_process_file(path, _state["extract"], _state["xsd"], False, _state["timeout"], _state["where"], None, source, _state["parser"]))
+    return results
+
+
+def _item_path(item: str | tuple[str, bytes]) -> str:
+    return item[0] if isinstance(item, tuple) else str(item)
+
+
+def _context() -> multiprocessing.context.BaseContext:
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(list(PRELOAD))
+    return context
+
+
+class WarmPool(object):
+    """
+    Pool de procesos persistente (ver el docstring del modulo).
+
+    - extract, xsd, where: como en batch.parse_many. Se envian una vez a cada worker y deben ser picklables
+    - workers: numero de procesos (uno por CPU por defecto)
+    - idle_timeout: segundos sin trabajo tras los que se cierran los workers (None para no cerrarlos)
+    - chunk_size: ficheros por tarea
+    - parser_options: argumentos del etree.XMLParser de cada worker (p. ej. {'huge_tree': True})
+    - memory_limit: bytes de espacio de direcciones por worker (RLIMIT_AS)
+    - timeout: segundos maximos por fichero; el fichero que los supera falla con FileTimeoutError
+    """
+
+    def __init__(
+        self,
+        extract: Callable[[ParserCEX], Any] | None = None,
+        xsd: Path | str | None = None,
+        workers: int | None = None,
+        idle_timeout: float | None = 60.0,
+        chunk_size: int = 8,
+        where: list | None = None,
+        parser_options: dict | None = None,
+        memory_limit: int | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.chunk_size = max(chunk_size, 1)
+        self._initargs = (extract, str(xsd) if xsd is not None else None, where, parser_options or {}, memory_limit, timeout)
+        self._executor: ProcessPoolExecutor | None = None
+        # Executor que ha creado cada Future de submit: al romperse solo se descarta ese, no uno creado despues
+        self._origins: WeakKeyDictionary[Future, ProcessPoolExecutor] = WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last_used = monotonic()
+        self._timer: threading.Timer | None = None
+        self._closed = False
+        self.starts = 0
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} workers={self.workers} alive={self.alive} >"
+
+    def __enter__(self) -> "WarmPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def alive(self) -> bool:
+        return self._executor is not None
+
+    def start(self) -> None:
+        """
+        Arranca los workers si no estan en marcha. parse lo llama automaticamente
+        """
+        with self._lock:
+            self._ensure_started()
+
+    def _ensure_started(self) -> ProcessPoolExecutor:
+        if self._closed:
+            raise Exception("El pool esta cerrado")
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_context(), initializer=_init_warm, initargs=self._initargs)
+            self.starts += 1
+        return self._executor
+
+    def submit(self, paths: Iterable[Path | str | tuple[str, bytes]]) -> list[Future]:
+        """
+        Envia los ficheros en tareas de chunk_size. Cada Future devuelve la lista de BatchResult de su tarea
+        (se recogen con collect). Un certificado que no esta en disco se envia como (nombre, bytes del XML)
+        """
+        items = [item if isinstance(item, tuple) else str(item) for item in paths]
+        with self._lock:
+            executor = self._ensure_started()
+            self._active += 1
+            futures = [executor.submit(_warm_chunk, items[i : i + self.chunk_size]) for i in range(0, len(items), self.chunk_size)]
+            for future in futures:
+                self._origins[future] = executor
+        if not futures:
+            self._release()
+            return futures
+
+        # El pool cuenta como inactivo cuando terminan todas las tareas del envio
+        remaining = [len(futures)]
+
+        def finished(_: Future) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._release()
+
+        for future in futures:
+            future.add_done_callback(finished)
+        return futures
+
+    def collect(self, future: Future, paths: list) -> list[BatchResult]:
+        """
+        Resultados de una tarea de submit con sus paths. Si un worker ha muerto (en esta tarea o en otra que estaba
+        en vuelo), los ficheros de la tarea se vuelven a procesar uno a uno con _run_isolated y el pool se vuelve a
+        crear en el siguiente envio. Lo mismo con una tarea cancelada al descartar su pool, salvo si el pool esta cerrado
+        """
+        try:
+            return future.result()
+        except (BrokenProcessPool, CancelledError) as error:
+            with self._lock:
+                origin = self._origins.get(future)
+                closed = self._closed
+            if isinstance(error, BrokenProcessPool) and origin is not None:
+                self._discard(origin)
+            if closed:
+                return [BatchResult(_item_path(item), error_class=type(error).__name__, error="el pool se ha cerrado") for item in paths]
+            return [self._run_isolated(item) for item in paths]
+
+    def _run_isolated(self, item: str | tuple[str, bytes]) -> BatchResult:
+        """
+        Procesa un fichero en un worker propio, como batch._run_isolated. Si vuelve a romper el worker, el culpable es este fichero
+        """
+        with ProcessPoolExecutor(max_workers=1, mp_context=_context(), initializer=_init_warm, initargs=self._initargs) as executor:
+            try:
+                return executor.submit(_warm_chunk, [item]).result()[0]
+            except BrokenProcessPool:
+                return _broken_result(_item_path(item))
+
+    def parse(self, paths: Iterable[Path | str | tuple[str, bytes]], stats: BatchStats | None = None) -> list[BatchResult]:
+        """
+        Procesa los ficheros en los workers y devuelve un BatchResult por fichero, en el orden de entrada
+        """
+        paths = list(paths)
+        futures = self.submit(paths)
+        results: list[BatchResult] = []
+        for i, future in enumerate(futures):
+            results.extend(self.collect(future, paths[i * self.chunk_size : (i + 1) * self.chunk_size]))
+        if stats is not None:
+            for result in results:
+                stats.update(result)
+        return results
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Descarta el executor roto. Si ya se ha creado otro (otra tarea rota lo descarto antes), el nuevo se conserva
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._last_used = monotonic()
+            if self.idle_timeout is not None and self._active == 0:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = threading.Timer(self.idle_timeout, self._stop_if_idle)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _stop_if_idle(self) -> None:
+        with self._lock:
+            if self._active or monotonic() - self._last_used < self.idle_timeout:
+                return
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def close(self) -> None:
+        """
+        Cierra los workers. El pool ya no admite trabajo
+        """
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,380 @@
+"""
+Control de calidad de un corpus de certificados con reglas declarativas evaluadas por columnas.
+
+Los registros de records.flatten se pasan a un ColumnBatch (float64 con NaN, cadenas como offsets + bytes)
+y se añaden las columnas derivadas de la envolvente ('Envolvente.Acristalamiento.N'...). Cada regla es una
+operacion de NumPy sobre columnas completas que devuelve una mascara por certificado; el informe guarda un
+bitmap por certificado (bit i = regla i) y un resumen por regla:
+
+    report = check_many(paths, workers=8)
+    report.summary()  # [{'rule': 'centinela', 'issues': 12, 'rate': 0.003, 'passed': False, ...}, ...]
+    report.issues(0)  # ['centinela', 'acristalamiento']
+
+Los campos de las reglas admiten comodines como los de records.flatten ('Calificacion.*.Global')
+"""
+
+from abc import ABC, abstractmethod
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .batch import BatchStats, parse_many
+from .columnar import Column, ColumnBatch
+from .envelope import ORIENTACIONES, EnvelopeArrays, envelope_dict, envelope_metrics
+from .parser_cex import ParserCEX
+from .records import flatten
+
+
+SENTINELS = (99999999.99, 99999999.0)
+"""
+Valores que CE3X escribe cuando un dato no se ha rellenado
+"""
+
+LETRAS = ("A", "B", "C", "D", "E", "F", "G")
+
+_SERVICIOS = ("Calefaccion", "Refrigeracion", "ACS", "Iluminacion")
+
+
+class Rule(ABC):
+    """
+    Regla de calidad. mask(table) devuelve un array bool con True en los certificados con incidencia.
+
+    - name: nombre de la regla en el informe (unico)
+    - fields: patrones de las columnas que usa la regla
+    - max_rate: proporcion de incidencias admitida en el corpus (0 por defecto)
+    """
+
+    __slots__ = ("name", "fields", "max_rate")
+
+    def __init__(self, name: str, fields: Iterable[str], max_rate: float = 0.0) -> None:
+        self.name = name
+        self.fields = tuple(fields)
+        self.max_rate = max_rate
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.name} {self.fields} >"
+
+    def columns(self, table: ColumnBatch) -> list[str]:
+        """
+        Columnas de la tabla que seleccionan los patrones de la regla
+        """
+        return [name for name in table.columns if any(fnmatchcase(name, pattern) for pattern in self.fields)]
+
+    @abstractmethod
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        pass
+
+
+def _numeric(column: Column | None, length: int) -> np.ndarray:
+    """
+    Valores de la columna como float64. Las cadenas que no son numeros (y las columnas que faltan) son NaN
+    """
+    if column is None:
+        return np.full(length, np.nan)
+    if column.kind == "f8":
+        return column.values
+    if column.kind == "M8":
+        return np.full(length, np.nan)
+    values = np.full(length, np.nan)
+    for i, value in enumerate(column.to_list()):
+        try:
+            values[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return values
+
+
+def _missing(column: Column) -> np.ndarray:
+    if column.kind == "f8":
+        return np.isnan(column.values)
+    if column.kind == "M8":
+        return np.isnat(column.values)
+    if column.kind == "obj":
+        return np.array([value is None or value == "" for value in column.values], dtype=np.bool_)
+    # Nulo o cadena vacia (get_value devuelve '' para un elemento con solo espacios)
+    return ~column.valid | (np.diff(column.offsets) == 0)
+
+
+class Sentinel(Rule):
+    """
+    Alguna de las columnas tiene un valor centinela (99999999.99...)
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, name: str, fields: Iterable[str], values: Iterable[float] = SENTINELS, max_rate: float = 0.0) -> None:
+        super().__init__(name, fields, max_rate)
+        self.values = np.array(list(values), dtype=np.float64)
+
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        result = np.zeros(table.length, dtype=np.bool_)
+        for name in self.columns(table):
+            if table[name].kind == "f8":
+                result |= np.isin(table[name].values, self.values)
+        return result
+
+
+class Range(Rule):
+    """
+    Algun valor numerico fuera de [low, high]. Los valores que faltan no cuentan
+    """
+
+    __slots__ = ("low", "high")
+
+    def __init__(self, name: str, fields: Iterable[str], low: float = -np.inf, high: float = np.inf, max_rate: float = 0.0) -> None:
+        super().__init__(name, fields, max_rate)
+        self.low = low
+        self.high = high
+
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        result = np.zeros(table.length, dtype=np.bool_)
+        for name in self.columns(table):
+            values = _numeric(table[name], table.length)
+            with np.errstate(invalid="ignore"):
+                result |= (values < self.low) | (values > self.high)
+        return result
+
+
+class Missing(Rule):
+    """
+    Alguna de las columnas es nula o una cadena vacia. Una columna que no esta en la tabla falta en todos
+    """
+
+    __slots__ = ()
+
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        if any(pattern not in table.columns and not any(char in pattern for char in "*?[") for pattern in self.fields):
+            return np.ones(table.length, dtype=np.bool_)
+        result = np.zeros(table.length, dtype=np.bool_)
+        for name in self.columns(table):
+            result |= _missing(table[name])
+        return result
+
+
+class Allowed(Rule):
+    """
+    Algun valor de texto no esta entre los permitidos (p. ej. letras con espacios o minusculas). Los nulos no cuentan
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, name: str, fields: Iterable[str], values: Iterable[str], max_rate: float = 0.0) -> None:
+        super().__init__(name, fields, max_rate)
+        self.values = np.array(list(values), dtype=object)
+
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        result = np.zeros(table.length, dtype=np.bool_)
+        for name in self.columns(table):
+            column = table[name]
+            if column.kind == "f8":
+                result |= ~np.isnan(column.values)
+            elif column.kind in ("str", "obj"):
+                values = column.to_list()
+                present = np.array([value is not None for value in values], dtype=np.bool_)
+                result |= present & ~np.isin(np.array(values, dtype=object), self.values)
+        return result
+
+
+class Rating(Rule):
+    """
+    La letra declarada no es la que corresponde al valor con los limites de su escala (A..F; por encima de F es G).
+    La letra es la primera cuyo limite supera el valor
+    """
+
+    __slots__ = ("letter", "value", "scale")
+
+    def __init__(self, name: str, letter: str, value: str, scale: str, max_rate: float = 0.0) -> None:
+        super().__init__(name, (letter, value, f"{scale}.*"), max_rate)
+        self.letter = letter
+        self.value = value
+        self.scale = scale
+
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        if self.letter not in table.columns or table[self.letter].kind != "str":
+            return np.zeros(table.length, dtype=np.bool_)
+        value = _numeric(table.columns.get(self.value), table.length)
+        limits = np.stack([_numeric(table.columns.get(f"{self.scale}.{letra}"), table.length) for letra in LETRAS[:-1]], axis=1)
+        known = ~np.isnan(value) & ~np.isnan(limits).any(axis=1) & table[self.letter].valid
+
+        expected = np.array(LETRAS, dtype=object)[(value[:, None] >= limits).sum(axis=1)]
+        declared = np.array(table[self.letter].to_list(), dtype=object)
+        return known & (declared != expected)
+
+
+class Consistent(Rule):
+    """
+    Alguna columna no coincide con su valor esperado (otra columna o la suma de varias) dentro de atol.
+    pairs: {columna: columna esperada o tupla de columnas a sumar}. Los valores que faltan no cuentan
+    """
+
+    __slots__ = ("pairs", "atol")
+
+    def __init__(self, name: str, pairs: dict[str, str | tuple[str, ...]], atol: float = 0.01, max_rate: float = 0.0) -> None:
+        fields = [field for column, expected in pairs.items() for field in (column, *((expected,) if isinstance(expected, str) else expected))]
+        super().__init__(name, fields, max_rate)
+        self.pairs = pairs
+        self.atol = atol
+
+    def mask(self, table: ColumnBatch) -> np.ndarray:
+        result = np.zeros(table.length, dtype=np.bool_)
+        for column, expected in self.pairs.items():
+            parts = (expected,) if isinstance(expected, str) else expected
+            value = _numeric(table.columns.get(column), table.length)
+            total = sum(_numeric(table.columns.get(part), table.length) for part in parts)
+            with np.errstate(invalid="ignore"):
+                result |= np.abs(value - total) > self.atol
+        return result
+
+
+RULES = (
+    Sentinel("centinela", ["*"]),
+    Range("superficie", ["DatosGeneralesyGeometria.SuperficieHabitable", "DatosGeneralesyGeometria.VolumenEspacioHabitable"], low=1e-6, high=1e7),
+    Range("compacidad", ["DatosGeneralesyGeometria.Compacidad"], low=1e-6, high=50),
+    Range("ano_construccion", ["IdentificacionEdificio.AnoConstruccion"], low=1500, high=2100),
+    Range("porcentajes", ["DatosGeneralesyGeometria.Porcentaje*"], low=0, high=100),
+    Missing("identificacion", ["IdentificacionEdificio.ReferenciaCatastral", "IdentificacionEdificio.ZonaClimatica", "IdentificacionEdificio.TipoDeEdificio"]),
+    Missing("datos_visita", ["PruebasComprobacionesInspecciones.Datos"], max_rate=1.0),
+    Allowed("letras", [f"Calificacion.*.{servicio}" for servicio in (*_SERVICIOS, "Global")], LETRAS),
+    Rating(
+        "calificacion_energia_primaria",
+        "Calificacion.EnergiaPrimariaNoRenovable.Global",
+        "Consumo.EnergiaPrimariaNoRenovable.Global",
+        "Calificacion.EnergiaPrimariaNoRenovable.EscalaGlobal",
+    ),
+    Rating("calificacion_emisiones", "Calificacion.EmisionesCO2.Global", "EmisionesCO2.Global", "Calificacion.EmisionesCO2.EscalaGlobal"),
+    Consistent(
+        "suma_servicios",
+        {
+            "Consumo.EnergiaPrimariaNoRenovable.Global": tuple(f"Consumo.EnergiaPrimariaNoRenovable.{servicio}" for servicio in _SERVICIOS),
+            "EmisionesCO2.Global": tuple(f"EmisionesCO2.{servicio}" for servicio in _SERVICIOS),
+        },
+        atol=0.05,
+    ),
+    # Los porcentajes declarados son enteros: se admite el redondeo
+    Consistent(
+        "acristalamiento",
+        {f"DatosGeneralesyGeometria.PorcentajeSuperficieAcristalada.{o}": f"Envolvente.Acristalamiento.{o}" for o in ORIENTACIONES},
+        atol=1.0,
+    ),
+)
+"""
+Reglas por defecto de check y check_many
+"""
+
+
+def quality_dict(cex: ParserCEX) -> dict:
+    """
+    Registro plano y datos de envolvente del certificado. Es picklable y sirve como extract de parse_many
+    """
+    return {
+        "record": flatten(cex, exclude="DatosGeneralesyGeometria.Plano,DatosGeneralesyGeometria.Imagen"),
+        "envelope": envelope_dict(cex),
+    }
+
+
+def quality_table(certificates: Iterable[ParserCEX | dict]) -> ColumnBatch:
+    """
+    Tabla de columnas para las reglas a partir de objetos ParserCEX o de diccionarios de quality_dict.
+    Añade las columnas derivadas 'Envolvente.<metrica>' de envelope.envelope_metrics
+    """
+    values = [quality_dict(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+    table = ColumnBatch.from_records([value["record"] for value in values])
+    metrics = envelope_metrics(EnvelopeArrays.from_certificates([value["envelope"] for value in values]))
+    for name, array in metrics.items():
+        if array.ndim == 1:
+            table.columns[f"Envolvente.{name}"] = Column("f8", array)
+        else:
+            for i, orientacion in enumerate(ORIENTACIONES):
+                table.columns[f"Envolvente.{name}.{orientacion}"] = Column("f8", array[:, i])
+    return table
+
+
+class QualityReport(object):
+    """
+    Resultado de check: bits (n,) uint64 con un bit por regla (en el orden de rules) para cada certificado
+    """
+
+    __slots__ = ("keys", "rules", "bits")
+
+    def __init__(self, keys: list, rules: tuple[Rule, ...], bits: np.ndarray) -> None:
+        self.keys = keys
+        self.rules = rules
+        self.bits = bits
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} certificates={len(self.keys)} rules={len(self.rules)} >"
+
+    def __len__(self):
+        return len(self.keys)
+
+    def mask(self, rule: str) -> np.ndarray:
+        """
+        Certificados con incidencia en la regla
+        """
+        names = [item.name for item in self.rules]
+        if rule not in names:
+            raise Exception(f"Regla '{rule}' no encontrada. Se esperaba una de {names}")
+        return (self.bits >> np.uint64(names.index(rule))) & np.uint64(1) == 1
+
+    def issues(self, index: int) -> list[str]:
+        """
+        Reglas con incidencia del certificado index
+        """
+        bits = int(self.bits[index])
+        return [rule.name for i, rule in enumerate(self.rules) if bits >> i & 1]
+
+    def summary(self) -> list[dict]:
+        """
+        Una fila por regla: incidencias, proporcion sobre el corpus y si cumple su max_rate
+        """
+        rows = []
+        for rule in self.rules:
+            issues = int(self.mask(rule.name).sum())
+            rate = issues / len(self) if len(self) else 0.0
+            rows.append(
+                {
+                    "rule": rule.name,
+                    "type": rule.__class__.__name__,
+                    "issues": issues,
+                    "rate": rate,
+                    "max_rate": rule.max_rate,
+                    "passed": rate <= rule.max_rate,
+                }
+            )
+        return rows
+
+
+def check(table: ColumnBatch | Iterable[ParserCEX | dict], rules: Iterable[Rule] = RULES, keys: list | None = None) -> QualityReport:
+    """
+    Evalua las reglas sobre una tabla de quality_table (o sobre los certificados con los que construirla)
+    """
+    table = table if isinstance(table, ColumnBatch) else quality_table(table)
+    rules = tuple(rules)
+    if len(rules) > 64:
+        raise Exception(f"Se admiten como mucho 64 reglas por informe y se han recibido {len(rules)}")
+    if len({rule.name for rule in rules}) != len(rules):
+        raise Exception("Los nombres de las reglas deben ser unicos")
+
+    bits = np.zeros(table.length, dtype=np.uint64)
+    for i, rule in enumerate(rules):
+        bits |= rule.mask(table).astype(np.uint64) << np.uint64(i)
+    return QualityReport(list(range(table.length)) if keys is None else list(keys), rules, bits)
+
+
+def check_many(
+    paths: Iterable[Path | str],
+    rules: Iterable[Rule] = RULES,
+    workers: int | None = None,
+    stats: BatchStats | None = None,
+) -> QualityReport:
+    """
+    Parsea los ficheros con batch.parse_many y evalua las reglas. Las claves son las rutas de los ficheros validos
+    """
+    keys, values = [], []
+    for result in parse_many(paths, extract=quality_dict, workers=workers, stats=stats):
+        if result.ok:
+            keys.append(result.path)
+            values.append(result.value)
+    return check(quality_table(values), rules, keys)
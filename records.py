@@ -0,0 +1,124 @@
+from fnmatch import fnmatchcase
+from time import perf_counter
+
+from .parser_cex import ParserCEX
+
+
+SECTIONS = (
+    "DatosDelCertificador",
+    "IdentificacionEdificio",
+    "DatosGeneralesyGeometria",
+    "InstalacionesTermicas",
+    "CondicionesFuncionamientoyOcupacion",
+    "Demanda",
+    "Consumo",
+    "EmisionesCO2",
+    "Calificacion",
+    "MedidasDeMejora",
+    "PruebasComprobacionesInspecciones",
+    "DatosPersonalizados",
+)
+"""
+Secciones de ParserCEX que se aplanan a columnas. DatosEnvolventeTermica queda fuera porque
+son tablas de elementos (ver IElementContainer.df)
+"""
+
+
+def _match(name: str, patterns: list[list[str]] | None) -> bool | None:
+    """
+    Compara la ruta 'Seccion.Campo.Subcampo' con los patrones de proyeccion.
+
+    Devuelve True si algun patron selecciona la ruta (o un antecesor suyo), None si algun patron
+    podria seleccionar un descendiente (hay que seguir bajando) y False en otro caso
+    """
+    if patterns is None:
+        return True
+    parts = name.split(".")
+    result = False
+    for pattern in patterns:
+        if all(fnmatchcase(part, pat) for part, pat in zip(parts, pattern)):
+            if len(parts) >= len(pattern):
+                return True
+            result = None
+    return result
+
+
+def _walk(values: dict, prefix: str, patterns: list[list[str]] | None, record: dict, exclude: list[list[str]] | None = None) -> None:
+    for field, value in values.items():
+        name = f"{prefix}.{field}"
+        selected = _match(name, patterns)
+        if selected is False or isinstance(value, list) or (exclude and _match(name, exclude) is True):
+            continue
+
+        if isinstance(value, dict):
+            _walk(value, name, None if selected else patterns, record, exclude)
+        elif selected:
+            record[name] = value
+
+
+def flatten_dict(values: dict, prefix: str) -> dict:
+    """
+    Aplana un diccionario anidado de to_dict en {'prefijo.Campo.Subcampo': valor}, como flatten con cada seccion
+    """
+    record: dict = {}
+    _walk(values, prefix, None, record)
+    return record
+
+
+def compile_fields(fields: list[str] | str | None) -> list[list[str]] | None:
+    """
+    Convierte la proyeccion 'IdentificacionEdificio.*,Calificacion.EmisionesCO2.Global' en patrones.
+    Un nombre de seccion sin campos selecciona la seccion completa
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    return [field.strip().split(".") for field in fields if field.strip()]
+
+
+def flatten(
+    cex: ParserCEX,
+    fields: list[str] | str | None = None,
+    timings: dict[str, float] | None = None,
+    exclude: list[str] | str | None = None,
+) -> dict:
+    """
+    Aplana las secciones escalares del certificado en un diccionario {'Seccion.Campo': valor}.
+
+    - fields: proyeccion de columnas (admite comodines). Las secciones sin ningun campo seleccionado no se leen; las
+        demas se leen completas con to_dict y despues se filtran los campos
+    - timings: si se indica, acumula el tiempo empleado en cada seccion
+    - exclude: campos que se descartan aunque los seleccione fields. Una seccion excluida completa no se lee, ni
+        los bloques excluidos que la seccion declara en _excludable (Consumo.FactoresdePaso)
+    """
+    patterns = compile_fields(fields)
+    excluded = compile_fields(exclude)
+    record: dict = {}
+    for section in SECTIONS:
+        selected = _match(section, patterns)
+        if selected is False or (excluded and _match(section, excluded) is True):
+            continue
+
+        start = perf_counter()
+        parser = getattr(cex, section)
+        # Los bloques excluidos que la seccion sabe omitir no se llegan a leer
+        skip = [name for name in getattr(parser, "_excludable", ()) if excluded and _match(f"{section}.{name}", excluded) is True]
+        _walk(parser.to_dict(exclude=skip) if skip else parser.to_dict(), section, None if selected else patterns, record, excluded)
+        if timings is not None:
+            timings[section] = timings.get(section, 0.0) + perf_counter() - start
+    return record
+
+
+class RecordExtractor(object):
+    """
+    Funcion de extraccion picklable para batch.parse_many.
+    Devuelve el registro aplanado junto a los tiempos de cada seccion
+    """
+
+    def __init__(self, fields: list[str] | str | None = None) -> None:
+        self.fields = fields
+
+    def __call__(self, cex: ParserCEX) -> tuple[dict, dict[str, float]]:
+        timings: dict[str, float] = {}
+        return flatten(cex, self.fields, timings), timings
@@ -0,0 +1,200 @@
+"""
+Anonimizacion de certificados CEX sin construir el arbol completo.
+
+El XML se lee con iterparse y se reescribe a la vez con etree.xmlfile: cada elemento se escribe en cuanto se
+cierra y se libera, asi que la memoria no depende del tamaño del fichero. Los elementos sin regla pasan tal
+cual; a los que tienen regla se les aplica una accion de ACTIONS:
+
+- drop: el elemento desaparece (p. ej. las imagenes base64 de DatosGeneralesyGeometria)
+- empty: se conserva el elemento sin texto
+- hash: el texto se sustituye por un hash con sal (el mismo valor da el mismo hash, sirve para unir ficheros).
+    Sin sal un NIF se recupera probando todos los posibles, asi que no se admite una sal vacia: si no se indica
+    se genera una aleatoria, que redact devuelve. Para unir ficheros de varias llamadas hay que pasar siempre la misma
+- mask: el texto se sustituye por asteriscos de la misma longitud
+
+    salt = redact("certificado.xml", "anonimo.xml")
+    for path, output in redact_many(paths, "anonimos", salt=salt, workers=8): ...
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from hashlib import blake2b
+import os
+from pathlib import Path
+import secrets
+import tempfile
+from typing import BinaryIO, Generator, Iterable
+
+from lxml import etree
+
+
+ACTIONS = ("drop", "empty", "hash", "mask")
+
+RULES = {
+    "DatosDelCertificador.NIF": "hash",
+    "DatosDelCertificador.NombreyApellidos": "mask",
+    "DatosDelCertificador.Telefono": "mask",
+    "DatosDelCertificador.Email": "mask",
+    "DatosDelCertificador.Domicilio": "mask",
+    "DatosGeneralesyGeometria.Plano": "drop",
+    "DatosGeneralesyGeometria.Imagen": "drop",
+}
+"""
+Reglas por defecto: {'Seccion.Elemento': accion}. Las rutas admiten comodines ('DatosDelCertificador.*')
+"""
+
+
+class Redactor(object):
+    """
+    Reescritor picklable: Redactor(rules, salt)(origen, destino). Origen y destino pueden ser rutas o ficheros binarios.
+    Si alguna regla usa hash y salt es None, se genera una sal aleatoria (atributo salt).
+    Un destino que es una ruta se escribe en un temporal de su carpeta y se renombra al terminar: si falla, el
+    destino no cambia y no queda un fichero a medias. El destino no puede ser el propio origen
+    """
+
+    __slots__ = ("rules", "salt", "_actions")
+
+    def __init__(self, rules: dict[str, str] = RULES, salt: bytes | str | None = None) -> None:
+        for pattern, action in rules.items():
+            if action not in ACTIONS:
+                raise Exception(f"Accion '{action}' no soportada para '{pattern}'. Se esperaba una de {ACTIONS}")
+        self.rules = dict(rules)
+        if salt is not None and not salt:
+            raise Exception("La sal no puede estar vacia: con un hash sin sal los NIF se pueden recuperar")
+        if salt is None:
+            salt = secrets.token_bytes(16) if "hash" in self.rules.values() else b""
+        self.salt = salt.encode("utf-8") if isinstance(salt, str) else salt
+        # Accion de cada ruta ya vista: las rutas se repiten en todos los ficheros
+        self._actions: dict[str, str | None] = {}
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.rules} >"
+
+    def __getstate__(self):
+        return self.rules, self.salt
+
+    def __setstate__(self, state):
+        self.rules, self.salt = state
+        self._actions = {}
+
+    def action(self, path: str) -> str | None:
+        if path not in self._actions:
+            self._actions[path] = next((action for pattern, action in self.rules.items() if fnmatchcase(path, pattern)), None)
+        return self._actions[path]
+
+    def apply(self, action: str | None, text: str) -> str:
+        if action == "empty":
+            return ""
+        if action == "hash":
+            return blake2b(self.salt + text.strip().encode("utf-8"), digest_size=8).hexdigest()
+        if action == "mask":
+            return "*" * len(text.strip())
+        return text
+
+    def __call__(self, source: Path | str | BinaryIO, output: Path | str | BinaryIO) -> None:
+        if isinstance(source, Path):
+            source = str(source)
+        if not isinstance(output, (str, Path)):
+            self._write(source, output)
+            return
+
+        output = Path(output)
+        if isinstance(source, str) and output.resolve() == Path(source).resolve():
+            raise Exception(f"El destino {output} es el propio fichero de origen")
+        descriptor, temporary = tempfile.mkstemp(prefix=f".{output.name}.", suffix=".tmp", dir=output.parent)
+        os.close(descriptor)
+        try:
+            self._write(source, temporary)
+            os.replace(temporary, output)
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+
+    def _write(self, source: str | BinaryIO, output: str | BinaryIO) -> None:
+        with etree.xmlfile(output, encoding="utf-8") as xf:
+            xf.write_declaration()
+            # Escritores abiertos (uno por antecesor del elemento actual) con su accion, y la ruta sin la raiz
+            writers: list[tuple] = []
+            path: list[str] = []
+            dropped = 0
+            for event, element in etree.iterparse(source, events=("start", "end"), huge_tree=True):
+                if event == "start":
+                    if dropped:
+                        dropped += 1
+                        continue
+                    action = self.action(".".join((*path[1:], element.tag))) if writers else None
+                    if action == "drop":
+                        dropped = 1
+                        continue
+                    writer = xf.element(element.tag, dict(element.attrib))
+                    writer.__enter__()
+                    writers.append((writer, action))
+                    path.append(element.tag)
+                    continue
+
+                if dropped:
+                    dropped -= 1
+                else:
+                    writer, action = writers.pop()
+                    path.pop()
+                    # Solo los elementos hoja tienen texto en un CEX; el de los contenedores es indentacion
+                    if len(element) == 0 and element.text:
+                        xf.write(self.apply(action, element.text))
+                    writer.__exit__(None, None, None)
+
+                # Lo ya escrito se libera: el elemento y los hermanos anteriores
+                element.clear(keep_tail=False)
+                parent = element.getparent()
+                if parent is not None:
+                    while element.getprevious() is not None:
+                        del parent[0]
+
+
+def redact(source: Path | str | BinaryIO, output: Path | str | BinaryIO, rules: dict[str, str] = RULES, salt: bytes | str | None = None) -> bytes:
+    """
+    Escribe en output la version anonimizada de source (ver el docstring del modulo). Devuelve la sal usada
+    """
+    redactor = Redactor(rules, salt)
+    redactor(source, output)
+    return redactor.salt
+
+
+def _redact_file(redactor: Redactor, source: str, output: str) -> Path | Exception:
+    try:
+        redactor(source, output)
+        return Path(output)
+    except Exception as error:
+        # Algunas excepciones de lxml no son picklables: se devuelve una con su texto
+        return Exception(f"{type(error).__name__}: {error}")
+
+
+def redact_many(
+    paths: Iterable[Path | str],
+    folder: Path | str,
+    rules: dict[str, str] = RULES,
+    salt: bytes | str | None = None,
+    workers: int | None = None,
+) -> Generator[tuple[str, Path | Exception], None, None]:
+    """
+    Anonimiza cada fichero en folder con el mismo nombre, en paralelo (workers procesos; 0 en el proceso actual).
+    Todos los ficheros usan la misma sal; si no se indica, los hashes solo se pueden unir dentro de esta llamada.
+    Devuelve (ruta, fichero escrito) en el orden de entrada; los ficheros que fallan devuelven una excepcion con
+    la clase y el mensaje del error y no dejan fichero de salida (ni cambian uno que ya existiera). folder puede ser
+    la carpeta de los originales solo si ningun fichero de salida coincide con su origen
+    """
+    paths = [str(path) for path in paths]
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    outputs = [str(folder / Path(path).name) for path in paths]
+    if len(set(outputs)) != len(outputs):
+        raise Exception("Hay ficheros con el mismo nombre: se sobrescribirian en la carpeta de salida")
+    for path, output in zip(paths, outputs):
+        if Path(output).resolve() == Path(path).resolve():
+            raise Exception(f"{path} se sobrescribiria con su version anonimizada: usa otra carpeta de salida")
+
+    redactor = Redactor(rules, salt)
+    if workers == 0:
+        yield from zip(paths, map(_redact_file, [redactor] * len(paths), paths, outputs))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from zip(paths, executor.map(_redact_file, [redactor] * len(paths), paths, outputs, chunksize=16))
@@ -0,0 +1,124 @@
+"""
+Serializacion en streaming de certificados completos (ParserCEX.to_dict) a NDJSON o msgpack, sin pandas.
+
+Se usa orjson si esta instalado y json de la libreria estandar en otro caso. msgpack es opcional
+"""
+
+from datetime import datetime
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable
+
+from .batch import BatchStats, parse_many
+from .parser_cex import ParserCEX
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende del entorno
+    msgpack = None
+
+
+FORMATS = ("ndjson", "msgpack")
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value)}")
+
+
+def dumps_ndjson(obj: dict) -> bytes:
+    """
+    Una linea JSON terminada en salto de linea. Las fechas se escriben en ISO 8601
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(obj, ensure_ascii=False, default=_default).encode("utf-8") + b"\n"
+
+
+def dumps_msgpack(obj: dict) -> bytes:
+    if msgpack is None:
+        raise ImportError("La salida msgpack necesita msgpack: pip install msgpack")
+    return msgpack.packb(obj, default=_default)
+
+
+_DUMPS = {"ndjson": dumps_ndjson, "msgpack": dumps_msgpack}
+
+
+def get_dumps(format: str):
+    if format not in _DUMPS:
+        raise Exception(f"Formato '{format}' no soportado. Se esperaba uno de {FORMATS}")
+    return _DUMPS[format]
+
+
+class Serializer(object):
+    """
+    Funcion de extraccion picklable para batch.parse_many: el worker devuelve el certificado ya serializado,
+    de modo que al proceso padre solo viajan bytes y no diccionarios anidados
+    """
+
+    def __init__(self, format: str = "ndjson") -> None:
+        get_dumps(format)
+        self.format = format
+
+    def __call__(self, cex: ParserCEX) -> bytes:
+        return get_dumps(self.format)(cex.to_dict())
+
+
+class StreamWriter(object):
+    """
+    Escribe certificados uno detras de otro en un flujo binario (fichero, pipe, sys.stdout.buffer...)
+    """
+
+    def __init__(self, sink: BinaryIO | Path | str, format: str = "ndjson") -> None:
+        self._dumps = get_dumps(format)
+        self._owned = isinstance(sink, (str, Path))
+        self._sink: BinaryIO = open(sink, "wb") if self._owned else sink
+        self.count = 0
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} count={self.count} >"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, cex: ParserCEX | dict) -> None:
+        obj = cex.to_dict() if isinstance(cex, ParserCEX) else cex
+        self.write_bytes(self._dumps(obj))
+
+    def write_bytes(self, data: bytes) -> None:
+        self._sink.write(data)
+        self.count += 1
+
+    def close(self) -> None:
+        self._sink.flush()
+        if self._owned:
+            self._sink.close()
+
+
+def stream_many(
+    paths: Iterable[Path | str],
+    sink: BinaryIO | Path | str,
+    format: str = "ndjson",
+    workers: int | None = None,
+    stats: BatchStats | None = None,
+    **kwargs,
+) -> BatchStats:
+    """
+    Parsea los ficheros en paralelo y vuelca cada certificado al flujo en el orden de entrada.
+    Los ficheros que fallan se omiten (ver parse_many: quarantine, timeout...)
+    """
+    stats = stats if stats is not None else BatchStats()
+    with StreamWriter(sink, format) as writer:
+        for result in parse_many(paths, extract=Serializer(format), workers=workers, stats=stats, **kwargs):
+            if result.ok:
+                writer.write_bytes(result.value)
+    return stats
@@ -0,0 +1,400 @@
+"""
+Servicio HTTP local de parseo sobre un pool de workers persistente (pool.WarmPool).
+
+Las aplicaciones que embeben ParserCEX pagan el arranque (importar lxml, compilar el XSD...) en cada proceso.
+El servicio mantiene los workers calientes y junta las peticiones concurrentes en tareas de chunk_size
+ficheros. Hay dos carriles: 'interactive' para certificados sueltos, que siempre pasa primero, y 'bulk' para
+cargas masivas. Como mucho hay in_flight tareas en los workers, asi que una peticion interactiva espera
+como maximo a que termine una tarea en curso aunque haya miles de ficheros en bulk.
+
+    python -m parser_xml_cex.service --port 8765 --workers 4
+    python -m parser_xml_cex.service --unix /run/parser_cex.sock
+
+    POST /parse?lane=interactive&format=json    cuerpo: el XML de un certificado
+    POST /parse?lane=bulk&format=arrow          cuerpo: {"paths": ["/datos/a.xml", ...]}
+    GET  /metrics                               colas, tareas en curso y latencias p50/p99 por carril
+    GET  /health
+
+La respuesta JSON es {"results": [{"path", "record", "error"}, ...]} en el orden de entrada. La respuesta Arrow
+(requiere pyarrow) es un stream IPC con una fila por fichero y las columnas 'path', 'error' y 'Seccion.Campo'.
+El servicio lee las rutas que recibe con los permisos de su usuario: por defecto solo escucha en 127.0.0.1
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+import socketserver
+import threading
+from time import perf_counter
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .batch import BatchResult
+from .parser_cex import ParserCEX
+from .pool import WarmPool
+from .records import RecordExtractor
+from .serializers import dumps_ndjson
+
+
+LANES = ("interactive", "bulk")
+"""
+Carriles de prioridad, de mayor a menor
+"""
+
+RESPONSE_FORMATS = ("json", "arrow")
+
+
+def _name(item: str | tuple[str, bytes]) -> str:
+    return item[0] if isinstance(item, tuple) else item
+
+
+class _Request(object):
+    """
+    Peticion en cola: sus ficheros, los resultados que van llegando y el evento que la despierta al terminar
+    """
+
+    __slots__ = ("items", "lane", "results", "pending", "start", "done")
+
+    def __init__(self, items: list, lane: str) -> None:
+        self.items = items
+        self.lane = lane
+        self.results: list[BatchResult | None] = [None] * len(items)
+        self.pending = len(items)
+        self.start = perf_counter()
+        self.done = threading.Event()
+
+
+class ParseService(object):
+    """
+    Planificador de peticiones sobre un WarmPool (ver el docstring del modulo).
+
+    - pool: WarmPool ya creado; si no se indica se crea uno con extract (por defecto records.RecordExtractor) y workers
+    - chunk_size: ficheros por tarea; las peticiones pequeñas del mismo carril se juntan en una tarea
+    - in_flight: tareas en los workers a la vez (por defecto, una por worker)
+    - max_wait: segundos que se espera a que lleguen mas peticiones antes de enviar una tarea incompleta
+    - window: peticiones por carril que se usan para los percentiles de latencia
+    """
+
+    def __init__(
+        self,
+        pool: WarmPool | None = None,
+        extract: Callable[[ParserCEX], Any] | None = None,
+        workers: int | None = None,
+        chunk_size: int = 8,
+        in_flight: int | None = None,
+        max_wait: float = 0.002,
+        window: int = 10000,
+    ) -> None:
+        self.pool = pool or WarmPool(extract=extract or RecordExtractor(), workers=workers, chunk_size=chunk_size, idle_timeout=None)
+        self.chunk_size = min(chunk_size, self.pool.chunk_size)
+        self.in_flight = in_flight or self.pool.workers or os.cpu_count() or 1
+        self.max_wait = max_wait
+        self._lanes: dict[str, deque[tuple[_Request, int]]] = {lane: deque() for lane in LANES}
+        self._latencies: dict[str, deque[float]] = {lane: deque(maxlen=window) for lane in LANES}
+        self._counts = {lane: {"requests": 0, "files": 0, "tasks": 0} for lane in LANES}
+        self._running = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.pool.start()
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.pool} >"
+
+    def __enter__(self) -> "ParseService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def submit(self, items: list[Path | str | tuple[str, bytes]], lane: str = "interactive") -> _Request:
+        """
+        Encola rutas o (nombre, bytes del XML). La peticion devuelta tiene done (threading.Event) y results
+        """
+        if lane not in LANES:
+            raise Exception(f"Carril '{lane}' no soportado. Se esperaba uno de {LANES}")
+        request = _Request([item if isinstance(item, tuple) else str(item) for item in items], lane)
+        with self._condition:
+            if self._closed:
+                raise Exception("El servicio esta cerrado")
+            if not request.items:
+                request.done.set()
+                return request
+            self._lanes[lane].extend((request, i) for i in range(len(request.items)))
+            self._counts[lane]["requests"] += 1
+            self._counts[lane]["files"] += len(request.items)
+            self._condition.notify_all()
+        return request
+
+    def parse(self, items: list[Path | str | tuple[str, bytes]], lane: str = "interactive", timeout: float | None = None) -> list[BatchResult]:
+        """
+        Procesa los ficheros y devuelve un BatchResult por fichero, en el orden de entrada
+        """
+        request = self.submit(items, lane)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"La peticion no ha terminado en {timeout} segundos")
+        return request.results
+
+    def _take(self) -> tuple[str, list[tuple[_Request, int]]] | None:
+        """
+        Siguiente tarea (carril y ficheros), o None al cerrar. Se llama con el lock tomado
+        """
+        while not self._closed:
+            lane = next((lane for lane in LANES if self._lanes[lane]), None)
+            if lane is None or self._running >= self.in_flight:
+                self._condition.wait()
+                continue
+
+            # Una tarea incompleta espera un poco a otras peticiones del mismo carril, salvo que llegue una de mas prioridad
+            queue = self._lanes[lane]
+            deadline = perf_counter() + self.max_wait
+            while len(queue) < self.chunk_size and not self._closed and not any(self._lanes[other] for other in LANES[: LANES.index(lane)]):
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if lane == next((lane for lane in LANES if self._lanes[lane]), None):
+                return lane, [queue.popleft() for _ in range(min(self.chunk_size, len(queue)))]
+        return None
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._condition:
+                task = self._take()
+                if task is None:
+                    return
+                self._running += 1
+            lane, taken = task
+            items = [request.items[i] for request, i in taken]
+            try:
+                [future] = self.pool.submit(items)
+            except Exception as error:
+                self._complete(lane, taken, [BatchResult(_name(item), error_class=type(error).__name__, error=str(error)) for item in items])
+                continue
+            future.add_done_callback(lambda future, lane=lane, taken=taken, items=items: self._collect(future, lane, taken, items))
+
+    def _collect(self, future: Future, lane: str, taken: list[tuple[_Request, int]], items: list) -> None:
+        # Si un worker ha muerto (o la tarea se ha cancelado al descartar su pool), collect vuelve a procesar los
+        # ficheros uno a uno: se hace en otro hilo para no bloquear el hilo del pool que marca el resto de tareas rotas
+        if future.cancelled() or isinstance(future.exception(), BrokenProcessPool):
+            threading.Thread(target=self._finish, args=(future, lane, taken, items), daemon=True).start()
+        else:
+            self._finish(future, lane, taken, items)
+
+    def _finish(self, future: Future, lane: str, taken: list[tuple[_Request, int]], items: list) -> None:
+        results = None
+        try:
+            results = self.pool.collect(future, items)
+        except Exception as error:
+            results = [BatchResult(_name(item), error_class=type(error).__name__, error=str(error)) for item in items]
+        finally:
+            # La peticion se completa siempre: si no, esperaria hasta su timeout y la tarea ocuparia un hueco de in_flight para siempre
+            if results is None:
+                results = [BatchResult(_name(item), error_class="Exception", error="la tarea se ha interrumpido") for item in items]
+            self._complete(lane, taken, results)
+
+    def _complete(self, lane: str, taken: list[tuple[_Request, int]], results: list[BatchResult]) -> None:
+        now = perf_counter()
+        with self._condition:
+            self._running -= 1
+            self._counts[lane]["tasks"] += 1
+            for (request, i), result in zip(taken, results):
+                request.results[i] = result
+                request.pending -= 1
+                if request.pending == 0:
+                    self._latencies[lane].append(now - request.start)
+                    request.done.set()
+            self._condition.notify_all()
+
+    def metrics(self) -> dict:
+        """
+        Por carril: ficheros en cola, peticiones, ficheros y tareas atendidos y latencia p50/p99 (ms) de las ultimas peticiones
+        """
+        with self._condition:
+            lanes = {}
+            for lane in LANES:
+                latencies = np.array(self._latencies[lane]) * 1000
+                lanes[lane] = {
+                    "queued": len(self._lanes[lane]),
+                    **self._counts[lane],
+                    "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+                }
+            return {"in_flight": self._running, "max_in_flight": self.in_flight, "workers_alive": self.pool.alive, "lanes": lanes}
+
+    def close(self) -> None:
+        """
+        Deja de aceptar peticiones y cierra el pool. Las peticiones en cola se quedan sin respuesta
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.pool.close()
+
+
+def _result_dict(result: BatchResult) -> dict:
+    value = result.value
+    # Con el extract por defecto el valor es (registro, tiempos por seccion)
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], dict):
+        value = value[0]
+    error = None
+    if not result.ok:
+        error = f"{result.error_class}: {result.error}"
+    elif result.errors:
+        # Un certificado que no cumple el XSD se responde como fallido y sin registro
+        value, error = None, f"CEXValidationError: {'; '.join(result.errors)}"
+    return {"path": result.path, "record": value, "error": error}
+
+
+def encode_results(results: list[BatchResult], format: str = "json") -> tuple[bytes, str]:
+    """
+    Cuerpo de la respuesta y su Content-Type
+    """
+    rows = [_result_dict(result) for result in results]
+    if format == "json":
+        return dumps_ndjson({"results": rows}), "application/json"
+
+    import pyarrow as pa
+
+    from .frames import to_frame
+
+    table = to_frame([{"path": row["path"], "error": row["error"], **(row["record"] or {})} for row in rows], "pyarrow")
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "parser_cex"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self) -> str:
+        # En un socket Unix client_address es una cadena vacia
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, dumps_ndjson({"error": message}))
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._send(200, dumps_ndjson(self.server.service.metrics()))
+        elif path == "/health":
+            self._send(200, dumps_ndjson({"status": "ok"}))
+        else:
+            self._error(404, f"No existe {path}")
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != "/parse":
+            self._error(404, f"No existe {url.path}")
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        lane = query.get("lane", "interactive")
+        format = query.get("format", "json")
+        length = int(self.headers.get("Content-Length", 0))
+        if lane not in LANES or format not in RESPONSE_FORMATS:
+            self._error(400, f"Se esperaba lane en {LANES} y format en {RESPONSE_FORMATS}")
+            return
+        if length > self.server.max_body:
+            self._error(413, f"El cuerpo supera {self.server.max_body} bytes")
+            return
+
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                items = [str(path) for path in json.loads(body)["paths"]]
+            except (ValueError, KeyError, TypeError):
+                self._error(400, 'El cuerpo JSON debe ser {"paths": [...]}')
+                return
+        else:
+            items = [(query.get("name", "certificado.xml"), body)]
+
+        try:
+            results = self.server.service.parse(items, lane, self.server.timeout_seconds)
+            response, content_type = encode_results(results, format)
+        except Exception as error:
+            self._error(500, f"{type(error).__name__}: {error}")
+            return
+        self._send(200, response, content_type)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+    service: ParseService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix: Path | str | None = None,
+    max_body: int = 64 << 20,
+    timeout: float | None = 300.0,
+    verbose: bool = False,
+) -> socketserver.BaseServer:
+    """
+    Servidor HTTP (en host:port o en el socket Unix unix) que atiende las peticiones con service.
+    Se arranca con serve_forever() y se para con shutdown()
+    """
+    if unix is not None:
+        Path(unix).unlink(missing_ok=True)
+        server = _UnixHTTPServer(str(unix), _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+    server.service = service
+    server.max_body = max_body
+    server.timeout_seconds = timeout
+    server.verbose = verbose
+    return server
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="parser_xml_cex.service", description="Servicio HTTP local de parseo de certificados CEX")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="socket Unix en lugar de host:port")
+    parser.add_argument("--workers", type=int, help="procesos del pool. Por defecto, uno por CPU")
+    parser.add_argument("--chunk-size", type=int, default=8, help="ficheros por tarea")
+    parser.add_argument("--fields", help="proyeccion de columnas de los registros, admite comodines")
+    parser.add_argument("--xsd", help="valida cada fichero contra el esquema XSD")
+    parser.add_argument("--timeout", type=float, help="segundos maximos por fichero")
+    parser.add_argument("--verbose", action="store_true", help="registra cada peticion en stderr")
+    args = parser.parse_args(argv)
+
+    pool = WarmPool(extract=RecordExtractor(args.fields), xsd=args.xsd, workers=args.workers, chunk_size=args.chunk_size, idle_timeout=None, timeout=args.timeout)
+    with ParseService(pool, chunk_size=args.chunk_size) as service:
+        server = make_server(service, args.host, args.port, args.unix, verbose=args.verbose)
+        print(f"Escuchando en {args.unix or f'http://{args.host}:{server.server_address[1]}'}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,383 @@
+"""
+Ingesta repartida entre varios nodos que comparten un sistema de ficheros, sin broker de mensajes.
+
+La cola es una base de datos SQLite en el directorio compartido con el manifiesto de shards (grupos de
+ficheros). Cada nodo reclama un shard con una concesion de duracion limitada (lease), lo procesa con
+parse_many, escribe su parte de la salida y lo marca como terminado. Si un nodo muere, su concesion caduca y
+otro nodo vuelve a procesar el shard. Al final merge junta las partes en un solo fichero:
+
+    ShardQueue.create("/compartido/cola.db", paths, shard_size=1000)    # una vez
+    run_node("/compartido/cola.db", "/compartido/partes", workers=16)    # en cada nodo
+    merge("/compartido/cola.db", "/compartido/certificados.parquet")     # al terminar
+
+SQLite usa los bloqueos POSIX del sistema de ficheros, asi que el directorio compartido debe soportarlos
+(NFSv4, CephFS, Lustre...). Las concesiones se comparan con el reloj de cada nodo: deben estar sincronizados (NTP)
+"""
+
+from contextlib import contextmanager
+import csv
+import json
+import os
+from pathlib import Path
+import socket
+import sqlite3
+from time import sleep, time
+from typing import Any, Callable, Generator, Iterable
+
+from .batch import BatchStats, _Quarantine, parse_many
+from .records import RecordExtractor
+from .writers import open_writer
+
+
+STATES = ("pending", "leased", "done", "failed")
+
+PART_FORMATS = ("ndjson", "parquet")
+"""
+Formatos de las partes de cada nodo: los que merge sabe volver a leer
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    paths TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    node TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output TEXT,
+    error TEXT
+)
+"""
+
+
+def default_node() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _quarantine_path(part: Path) -> Path:
+    """
+    CSV con los ficheros fallidos del shard de la parte part
+    """
+    return part.with_suffix(".errores.csv")
+
+
+class ShardQueue(object):
+    """
+    Cola de shards en SQLite (ver el docstring del modulo).
+
+    - lease: segundos que un nodo tiene un shard sin renovar la concesion
+    - max_attempts: veces que se reparte un shard antes de marcarlo como failed
+    """
+
+    def __init__(self, path: Path | str, lease: float = 600.0, max_attempts: int = 3) -> None:
+        self.path = Path(path)
+        if not self.path.exists():
+            raise Exception(f"La cola {self.path} no existe. Se crea con ShardQueue.create")
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # Sin transacciones implicitas: cada operacion abre la suya con BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self.path} {self.status()} >"
+
+    def __enter__(self) -> "ShardQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @classmethod
+    def create(cls, path: Path | str, paths: Iterable[Path | str], shard_size: int = 1000, wait: float = 3600.0, **options) -> "ShardQueue":
+        """
+        Crea la cola con los ficheros repartidos en shards de shard_size. Si ya existe no se modifica, asi que todos
+        los nodos pueden llamar a create con la misma lista.
+
+        Solo crea la cola el nodo que consigue el marcador <cola>.creando: recorre paths (con un generador, solo ese
+        nodo descubre o descomprime los ficheros) sin bloquear la base de datos, la escribe en un temporal y la
+        renombra, asi que la cola aparece ya completa. El resto espera como mucho wait segundos a que aparezca
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        marker = path.with_name(path.name + ".creando")
+        deadline = time() + wait
+        while not path.exists():
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                if time() > deadline:
+                    raise Exception(f"La cola {path} no ha aparecido en {wait} segundos. Si el nodo que la creaba ha muerto, borra {marker}")
+                sleep(0.5)
+                continue
+            try:
+                # Otro nodo puede haber terminado entre la comprobacion y el marcador
+                if not path.exists():
+                    cls._build(path, paths, shard_size)
+            finally:
+                marker.unlink(missing_ok=True)
+        return cls(path, **options)
+
+    @staticmethod
+    def _build(path: Path, paths: Iterable[Path | str], shard_size: int) -> None:
+        paths = [str(Path(item).resolve()) for item in paths]
+        shards = [paths[i : i + shard_size] for i in range(0, len(paths), max(shard_size, 1))]
+        rows = [(json.dumps(shard), len(shard), sum(os.path.getsize(item) for item in shard)) for shard in shards]
+
+        temporary = path.with_name(f".{path.name}.{default_node()}.tmp")
+        connection = sqlite3.connect(temporary, isolation_level=None)
+        try:
+            connection.execute(_SCHEMA)
+            connection.execute("BEGIN")
+            connection.executemany("INSERT INTO shards (paths, files, bytes) VALUES (?, ?, ?)", rows)
+            connection.execute("COMMIT")
+            connection.close()
+            os.replace(temporary, path)
+        finally:
+            connection.close()
+            temporary.unlink(missing_ok=True)
+
+    @contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def claim(self, node: str) -> tuple[int, list[str]] | None:
+        """
+        Reclama el primer shard pendiente o con la concesion caducada. Devuelve (shard, rutas) o None si no queda trabajo
+        """
+        now = time()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE shards SET state = 'failed', error = 'concesion caducada en todos los intentos' "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = connection.execute(
+                "SELECT id, paths FROM shards WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE shards SET state = 'leased', node = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (node, now + self.lease, row[0]),
+            )
+        return row[0], json.loads(row[1])
+
+    def renew(self, shard: int, node: str) -> bool:
+        """
+        Amplia la concesion. False si el shard ya no es del nodo (caduco y lo ha reclamado otro)
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE shards SET lease_until = ? WHERE id = ? AND node = ? AND state = 'leased'",
+                (time() + self.lease, shard, node),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, shard: int, node: str, output: Path | str | None) -> bool:
+        """
+        Marca el shard como terminado con su parte de la salida (None si no ha dado registros).
+        False si el shard ya no es del nodo
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE shards SET state = 'done', output = ?, lease_until = NULL, error = NULL WHERE id = ? AND node = ? AND state = 'leased'",
+                (str(output) if output is not None else None, shard, node),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, shard: int, node: str, error: str) -> None:
+        """
+        Devuelve a la cola un shard que ha fallado. Tras max_attempts intentos queda como failed
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE shards SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "node = NULL, lease_until = NULL, error = ? WHERE id = ? AND node = ? AND state = 'leased'",
+                (self.max_attempts, error, shard, node),
+            )
+
+    def status(self) -> dict[str, int]:
+        """
+        Numero de shards en cada estado
+        """
+        counts = dict(self._connection.execute("SELECT state, COUNT(*) FROM shards GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+    @property
+    def finished(self) -> bool:
+        status = self.status()
+        return status["pending"] == 0 and status["leased"] == 0
+
+    def outputs(self) -> list[Path]:
+        """
+        Partes de los shards terminados, en el orden del manifiesto
+        """
+        return [Path(row[0]) for row in self._connection.execute("SELECT output FROM shards WHERE state = 'done' AND output IS NOT NULL ORDER BY id")]
+
+    def failures(self) -> list[tuple[int, str]]:
+        return self._connection.execute("SELECT id, error FROM shards WHERE state = 'failed' ORDER BY id").fetchall()
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def _process_shard(
+    queue: ShardQueue,
+    shard: int,
+    paths: list[str],
+    part: Path,
+    node: str,
+    extract: Callable,
+    chunk_size: int,
+    stats: BatchStats | None,
+    options: dict[str, Any],
+) -> bool:
+    renewed = time()
+    chunk: list[dict] = []
+    with open_writer(part) as writer:
+        for result in parse_many(paths, extract=extract, stats=stats, **options):
+            if time() - renewed > queue.lease / 3:
+                if not queue.renew(shard, node):
+                    return False
+                renewed = time()
+            if not result.valid:
+                # Un certificado que no cumple el XSD no se escribe y cuenta como fallido, como en la cli
+                if result.ok and stats is not None:
+                    stats.failed += 1
+                continue
+            record, _ = result.value
+            chunk.append({"path": result.path, **record})
+            if len(chunk) >= chunk_size:
+                writer.write(chunk)
+                chunk = []
+        writer.write(chunk)
+    # El escritor parquet no crea el fichero si no recibe registros
+    return queue.complete(shard, node, part if part.exists() else None)
+
+
+def run_node(
+    queue: ShardQueue | Path | str,
+    folder: Path | str,
+    node: str | None = None,
+    fields: list[str] | str | None = None,
+    format: str = "ndjson",
+    chunk_size: int = 1000,
+    max_shards: int | None = None,
+    stats: BatchStats | None = None,
+    quarantine: bool = False,
+    **options,
+) -> int:
+    """
+    Procesa shards de la cola hasta que no queda ninguno (o max_shards) y devuelve cuantos ha terminado.
+
+    Cada shard se escribe en folder/part-<shard>-<nodo>.<format> con los registros de records.flatten y la ruta.
+    La concesion se renueva mientras llegan resultados; si se pierde (el nodo se ha quedado parado mas de lease
+    segundos y otro ha reclamado el shard) la parte se descarta. options se pasa a batch.parse_many
+    (workers, xsd, timeout, executor, memory_limit...). Los ficheros que fallan (o no cumplen el XSD) no detienen el shard: se
+    cuentan en stats, no aparecen en la salida y con quarantine se listan en folder/part-<shard>-<nodo>.errores.csv
+    """
+    if format not in PART_FORMATS:
+        raise Exception(f"Formato de parte '{format}' no soportado. Se esperaba uno de {PART_FORMATS}")
+    own = not isinstance(queue, ShardQueue)
+    queue = ShardQueue(queue) if own else queue
+    node = node or default_node()
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    extract = RecordExtractor(fields)
+
+    completed = 0
+    try:
+        while max_shards is None or completed < max_shards:
+            claimed = queue.claim(node)
+            if claimed is None:
+                break
+            shard, paths = claimed
+            part = folder / f"part-{shard:06d}-{node}.{format}"
+            if quarantine:
+                options["quarantine"] = _quarantine_path(part)
+            try:
+                done = _process_shard(queue, shard, paths, part, node, extract, chunk_size, stats, options)
+            except Exception as error:
+                part.unlink(missing_ok=True)
+                queue.release(shard, node, f"{type(error).__name__}: {error}")
+                continue
+            if done:
+                completed += 1
+            else:
+                part.unlink(missing_ok=True)
+    finally:
+        if own:
+            queue.close()
+    return completed
+
+
+def _read_part(path: Path, chunk_size: int) -> Generator[list[dict], None, None]:
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(chunk_size):
+            yield batch.to_pylist()
+        return
+
+    chunk: list[dict] = []
+    with open(path, "rb") as file:
+        for line in file:
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    yield chunk
+
+
+def merge(
+    queue: ShardQueue | Path | str,
+    output: Path | str,
+    format: str | None = None,
+    chunk_size: int = 10000,
+    partial: bool = False,
+    quarantine: Path | str | None = None,
+) -> int:
+    """
+    Junta las partes de los shards terminados en output (cualquier formato de writers) y devuelve el numero de
+    registros. Falla si quedan shards sin terminar o, salvo con partial=True, si alguno ha quedado como failed.
+    Con quarantine junta en ese CSV los ficheros fallidos de cada parte (run_node con quarantine)
+    """
+    own = not isinstance(queue, ShardQueue)
+    queue = ShardQueue(queue) if own else queue
+    try:
+        if not queue.finished:
+            raise Exception(f"Quedan shards sin terminar: {queue.status()}")
+        failures = queue.failures()
+        if failures and not partial:
+            raise Exception(f"{len(failures)} shards han fallado (el primero, {failures[0][0]}: {failures[0][1]})")
+        parts = queue.outputs()
+    finally:
+        if own:
+            queue.close()
+
+    records = 0
+    with open_writer(output, format) as writer:
+        for part in parts:
+            for chunk in _read_part(part, chunk_size):
+                writer.write(chunk)
+                records += len(chunk)
+
+    if quarantine is not None:
+        with open(quarantine, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(_Quarantine.header)
+            # Solo las partes terminadas: las de concesiones perdidas se repetirian
+            for part in parts:
+                if _quarantine_path(part).exists():
+                    with open(_quarantine_path(part), newline="", encoding="utf-8") as errors:
+                        writer.writerows(list(csv.reader(errors))[1:])
+    return records
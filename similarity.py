@@ -0,0 +1,311 @@
+"""
+Busqueda de edificios comparables: indice de vecinos mas proximos sobre las caracteristicas de los certificados.
+
+Cada certificado es un vector de FEATURES (ano, superficie, compacidad, % de acristalamiento por orientacion y
+transmitancias medias de la envolvente) normalizado con la media y la desviacion del corpus inicial y guardado
+en una matriz float32. ZonaClimatica y TipoDeEdificio no son distancias sino particiones: solo se comparan
+edificios de la misma zona y tipo. Las distancias se calculan por bloques de filas con NumPy:
+
+    index = SimilarityIndex.from_many(paths, workers=8)
+    index.query(ParserCEX(path), k=20)  # [(clave, distancia), ...]
+    index.add_many(nuevos)
+    index.save("comparables.npz")
+    index = SimilarityIndex.load("comparables.npz")
+"""
+
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .batch import BatchStats, parse_many
+from .envelope import ADIABATICO, ORIENTACIONES
+from .parser_cex import ParserCEX
+
+
+PARTITION_FIELDS = ("ZonaClimatica", "TipoDeEdificio")
+"""
+Campos de IdentificacionEdificio que deben coincidir exactamente
+"""
+
+FEATURES = (
+    "AnoConstruccion",
+    "SuperficieHabitable",
+    "Compacidad",
+    *(f"Acristalamiento.{orientacion}" for orientacion in ORIENTACIONES),
+    "Transmitancia.CerramientosOpacos",
+    "Transmitancia.HuecosyLucernarios",
+)
+"""
+Columnas de la matriz de caracteristicas. Las transmitancias son medias ponderadas por superficie (W/m2K)
+"""
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _mean_transmittance(records: list[dict]) -> float:
+    area = ua = 0.0
+    for record in records:
+        superficie, transmitancia = _number(record.get("Superficie")), _number(record.get("Transmitancia"))
+        if record.get("Tipo") == ADIABATICO or superficie != superficie or transmitancia != transmitancia:
+            continue
+        area += superficie
+        ua += superficie * transmitancia
+    return ua / area if area else np.nan
+
+
+def similarity_dict(cex: ParserCEX) -> dict:
+    """
+    Particion y caracteristicas (en el orden de FEATURES) del certificado. Es picklable y sirve como extract de parse_many
+    """
+    identificacion = cex.IdentificacionEdificio
+    geometria = cex.DatosGeneralesyGeometria
+    envolvente = cex.DatosEnvolventeTermica
+    acristalamiento = geometria.PorcentajeSuperficieAcristalada.to_dict()
+    return {
+        "partition": tuple(getattr(identificacion, field) or "" for field in PARTITION_FIELDS),
+        "features": [
+            _number(identificacion.AnoConstruccion),
+            _number(geometria.SuperficieHabitable),
+            _number(geometria.Compacidad),
+            *(_number(acristalamiento.get(orientacion)) for orientacion in ORIENTACIONES),
+            _mean_transmittance(envolvente.CerramientosOpacos.to_records()),
+            _mean_transmittance(envolvente.HuecosyLucernarios.to_records()),
+        ],
+    }
+
+
+class SimilarityIndex(object):
+    """
+    Indice k-NN exacto por particiones (ver el docstring del modulo).
+
+    - keys: clave de cada fila (ruta del fichero o indice)
+    - partitions: valores distintos de PARTITION_FIELDS; codes (n,) int32 es la particion de cada fila
+    - matrix: (n, len(FEATURES)) float32 normalizada ((x - mean) / scale * weights). Los valores que faltan valen 0 (la media)
+    - mean, scale, weights: normalizacion fijada al crear el indice; las filas añadidas despues se normalizan igual
+    """
+
+    __slots__ = ("keys", "partitions", "codes", "matrix", "mean", "scale", "weights", "_partition_codes", "_groups", "_norms")
+
+    def __init__(
+        self,
+        keys: list,
+        partitions: list[tuple[str, ...]],
+        codes: np.ndarray,
+        matrix: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        weights: np.ndarray,
+    ) -> None:
+        self.keys = keys
+        self.partitions = partitions
+        self.codes = codes
+        self.matrix = matrix
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self._partition_codes = {partition: code for code, partition in enumerate(partitions)}
+        self._groups: dict[int, np.ndarray] | None = None
+        self._norms: np.ndarray | None = None
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} certificates={len(self)} partitions={len(self.partitions)} >"
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_certificates(
+        cls,
+        certificates: Iterable[ParserCEX | dict],
+        keys: list | None = None,
+        weights: dict[str, float] | None = None,
+    ) -> "SimilarityIndex":
+        """
+        certificates: objetos ParserCEX o diccionarios de similarity_dict.
+        weights: peso de cada caracteristica en la distancia ({'AnoConstruccion': 2.0}); por defecto 1
+        """
+        values = [similarity_dict(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+        features = np.array([value["features"] for value in values], dtype=np.float64).reshape(len(values), len(FEATURES))
+
+        with np.errstate(all="ignore"):
+            mean = np.nan_to_num(np.nanmean(features, axis=0)) if len(values) else np.zeros(len(FEATURES))
+            scale = np.nan_to_num(np.nanstd(features, axis=0)) if len(values) else np.ones(len(FEATURES))
+        scale[scale == 0] = 1.0
+        factors = np.ones(len(FEATURES))
+        for feature, weight in (weights or {}).items():
+            if feature not in FEATURES:
+                raise Exception(f"Caracteristica '{feature}' no soportada. Se esperaba una de {FEATURES}")
+            factors[FEATURES.index(feature)] = weight
+
+        index = cls([], [], np.zeros(0, dtype=np.int32), np.zeros((0, len(FEATURES)), dtype=np.float32), mean, scale, factors)
+        index.add(values, keys)
+        return index
+
+    @classmethod
+    def from_many(
+        cls,
+        paths: Iterable[Path | str],
+        workers: int | None = None,
+        stats: BatchStats | None = None,
+        weights: dict[str, float] | None = None,
+    ) -> "SimilarityIndex":
+        """
+        Parsea los ficheros con batch.parse_many. Las claves son las rutas de los ficheros validos; los fallidos se omiten
+        """
+        keys, values = _parse(paths, workers, stats)
+        return cls.from_certificates(values, keys, weights)
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        """
+        Normaliza una matriz (m, len(FEATURES)) de caracteristicas en bruto
+        """
+        matrix = (np.asarray(features, dtype=np.float64) - self.mean) / self.scale * self.weights
+        return np.nan_to_num(matrix, nan=0.0).astype(np.float32)
+
+    def _code(self, partition: tuple) -> int:
+        partition = tuple(partition)
+        if partition not in self._partition_codes:
+            self._partition_codes[partition] = len(self.partitions)
+            self.partitions.append(partition)
+        return self._partition_codes[partition]
+
+    def add(self, certificates: Iterable[ParserCEX | dict], keys: list | None = None) -> None:
+        """
+        Añade certificados al indice sin recalcular la normalizacion. Las claves por defecto continuan la numeracion
+        """
+        values = [similarity_dict(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+        if not values:
+            return
+        keys = list(range(len(self.keys), len(self.keys) + len(values))) if keys is None else list(keys)
+        if len(keys) != len(values):
+            raise Exception(f"Se esperaban {len(values)} claves y se han recibido {len(keys)}")
+
+        features = np.array([value["features"] for value in values], dtype=np.float64).reshape(len(values), len(FEATURES))
+        codes = np.array([self._code(value["partition"]) for value in values], dtype=np.int32)
+        self.keys.extend(keys)
+        self.codes = np.concatenate([self.codes, codes])
+        self.matrix = np.concatenate([self.matrix, self.transform(features)])
+        self._groups = None
+        self._norms = None
+
+    def add_many(self, paths: Iterable[Path | str], workers: int | None = None, stats: BatchStats | None = None) -> None:
+        keys, values = _parse(paths, workers, stats)
+        self.add(values, keys)
+
+    @property
+    def groups(self) -> dict[int, np.ndarray]:
+        """
+        Filas de cada particion ({code: indices}). Se calcula una vez tras cada add
+        """
+        if self._groups is None:
+            order = np.argsort(self.codes, kind="stable")
+            bounds = np.searchsorted(self.codes[order], np.arange(len(self.partitions) + 1))
+            self._groups = {code: order[bounds[code] : bounds[code + 1]] for code in range(len(self.partitions))}
+        return self._groups
+
+    @property
+    def norms(self) -> np.ndarray:
+        if self._norms is None:
+            self._norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        return self._norms
+
+    def search(self, queries: np.ndarray, rows: np.ndarray | None = None, k: int = 20, block: int = 65536) -> tuple[np.ndarray, np.ndarray]:
+        """
+        k vecinos mas proximos de cada fila de queries (ya normalizada) entre las filas rows del indice (todas si es None).
+        Devuelve (indices (m, k) con -1 si no hay suficientes filas, distancias euclideas (m, k) con inf)
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, len(FEATURES))
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best = np.full((len(queries), k), np.inf, dtype=np.float32)
+        rows = np.arange(len(self)) if rows is None else rows
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+
+        for start in range(0, len(rows), block):
+            chunk = rows[start : start + block]
+            # |x - q|^2 = |x|^2 + |q|^2 - 2 q.x con un producto de matrices por bloque
+            distances = self.norms[chunk][None, :] + query_norms[:, None] - 2 * queries @ self.matrix[chunk].T
+            np.maximum(distances, 0, out=distances)
+            candidates = np.concatenate([best, distances], axis=1)
+            candidate_rows = np.concatenate([best_rows, np.broadcast_to(chunk, distances.shape)], axis=1)
+            top = np.argpartition(candidates, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(candidates, top, axis=1)
+            best_rows = np.take_along_axis(candidate_rows, top, axis=1)
+
+        order = np.argsort(best, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_rows[np.isinf(best)] = -1
+        return best_rows, np.sqrt(best)
+
+    def query_many(self, certificates: Iterable[ParserCEX | dict], k: int = 20, exact: bool = True, block: int = 65536) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Vecinos de varios certificados. Con exact solo se buscan en su particion (ZonaClimatica, TipoDeEdificio);
+        un certificado de una particion que no esta en el indice no tiene vecinos. Devuelve lo mismo que search
+        """
+        values = [similarity_dict(cex) if isinstance(cex, ParserCEX) else cex for cex in certificates]
+        queries = self.transform(np.array([value["features"] for value in values], dtype=np.float64).reshape(len(values), len(FEATURES)))
+        if not exact:
+            return self.search(queries, None, k, block)
+
+        rows = np.full((len(values), k), -1, dtype=np.int64)
+        distances = np.full((len(values), k), np.inf, dtype=np.float32)
+        by_partition: dict[tuple, list[int]] = {}
+        for i, value in enumerate(values):
+            by_partition.setdefault(tuple(value["partition"]), []).append(i)
+        for partition, positions in by_partition.items():
+            code = self._partition_codes.get(partition)
+            if code is None:
+                continue
+            rows[positions], distances[positions] = self.search(queries[positions], self.groups[code], k, block)
+        return rows, distances
+
+    def query(self, certificate: ParserCEX | dict, k: int = 20, exact: bool = True) -> list[tuple]:
+        """
+        Los k certificados mas parecidos: [(clave, distancia), ...] de menor a mayor distancia
+        """
+        rows, distances = self.query_many([certificate], k, exact)
+        return [(self.keys[row], float(distance)) for row, distance in zip(rows[0], distances[0]) if row >= 0]
+
+    def save(self, path: Path | str) -> None:
+        """
+        Guarda el indice en un .npz (sin pickle: las claves y particiones se guardan como texto)
+        """
+        partitions = np.array(self.partitions, dtype=str).reshape(len(self.partitions), len(PARTITION_FIELDS))
+        np.savez(
+            path,
+            keys=np.array([str(key) for key in self.keys], dtype=str),
+            partitions=partitions,
+            codes=self.codes,
+            matrix=self.matrix,
+            mean=self.mean,
+            scale=self.scale,
+            weights=self.weights,
+        )
+
+    @classmethod
+    def load(cls, path: Path | str) -> "SimilarityIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["keys"].tolist(),
+                [tuple(partition) for partition in data["partitions"].tolist()],
+                data["codes"],
+                data["matrix"],
+                data["mean"],
+                data["scale"],
+                data["weights"],
+            )
+
+
+def _parse(paths: Iterable[Path | str], workers: int | None, stats: BatchStats | None) -> tuple[list, list]:
+    keys, values = [], []
+    for result in parse_many(paths, extract=similarity_dict, workers=workers, stats=stats):
+        if result.ok:
+            keys.append(result.path)
+            values.append(result.value)
+    return keys, values
@@ -0,0 +1,110 @@
+"""
+Lectura de la cabecera del certificado a partir de un prefijo acotado del fichero.
+
+Los campos de identificacion estan en DatosDelCertificador e IdentificacionEdificio, al principio del XML.
+sniff lee el fichero por bloques pequeños hasta tenerlos (o hasta el limite de bytes) y los pasa a un
+parser incremental, sin llegar a las imagenes base64 ni al resto del documento:
+
+    header = sniff(path)  # {'IdentificacionEdificio.ReferenciaCatastral': '3558927VK4735H', ...}
+    for path, header in sniff_many(paths, workers=32): ...
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Generator, Iterable
+
+from lxml import etree
+
+
+HEADER_FIELDS = (
+    "IdentificacionEdificio.ReferenciaCatastral",
+    "IdentificacionEdificio.Procedimiento",
+    "IdentificacionEdificio.AlcanceInformacionXML",
+    "DatosDelCertificador.Fecha",
+)
+
+
+class NeedMoreBytes(Exception):
+    """
+    El prefijo leido no contiene todas las secciones de la cabecera. header tiene los campos ya encontrados
+    """
+
+    def __init__(self, read: int, header: dict) -> None:
+        self.read = read
+        self.header = header
+        super().__init__(f"La cabecera no esta completa en los primeros {read} bytes")
+
+
+def sniff(source: Path | str | bytes | BinaryIO, limit: int = 8192, fields: tuple[str, ...] = HEADER_FIELDS, chunk_size: int = 1024) -> dict:
+    """
+    Devuelve {'Seccion.Campo': texto} con los campos de la cabecera, leyendo como mucho limit bytes.
+    Los valores son el texto sin espacios y sin convertir a float (son claves de enrutado). Un campo que no
+    existe en su seccion, o cuya seccion no existe en el documento, vale None.
+
+    Lanza NeedMoreBytes si alguna seccion no se ha cerrado dentro del limite (o si source son bytes incompletos).
+    Si se ha leido el documento completo, las secciones que faltan no existen y no hay que pedir mas bytes;
+    un fichero que termina antes de cerrar el documento lanza el XMLSyntaxError de lxml
+    """
+    wanted: dict[tuple[str, str], str] = {}
+    for field in fields:
+        section, _, tag = field.partition(".")
+        wanted[(section, tag)] = field
+    pending = {section for section, _ in wanted}
+    header: dict = dict.fromkeys(fields)
+
+    parser = etree.XMLPullParser(events=("end",), tag=list(pending | {tag for _, tag in wanted}))
+    if isinstance(source, bytes):
+        chunks: Iterable[bytes] = [source[:limit]]
+        # Unos bytes pueden ser solo un prefijo del fichero: si no contienen el documento completo se piden mas
+        file = None
+    else:
+        file = open(source, "rb") if isinstance(source, (str, Path)) else source
+        chunks = iter(lambda: file.read(min(chunk_size, limit - read)) if read < limit else b"", b"")
+
+    read = 0
+    try:
+        for chunk in chunks:
+            read += len(chunk)
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                parent = element.getparent()
+                if element.tag in pending and parent is not None and parent.getparent() is None:
+                    pending.discard(element.tag)
+                elif parent is not None and (parent.tag, element.tag) in wanted:
+                    header[wanted[(parent.tag, element.tag)]] = element.text.strip() if element.text else None
+            if not pending:
+                return header
+    finally:
+        if file is not None and file is not source:
+            file.close()
+
+    # El bucle termina al llegar al limite o al final del fichero. Si el documento esta completo, las secciones pendientes no existen
+    try:
+        parser.close()
+        return header
+    except etree.XMLSyntaxError:
+        if file is not None and read < limit:
+            raise
+    raise NeedMoreBytes(read, header)
+
+
+def _sniff_path(path: str, limit: int, fields: tuple[str, ...]) -> dict | Exception:
+    try:
+        return sniff(path, limit, fields)
+    except Exception as error:
+        return error
+
+
+def sniff_many(
+    paths: Iterable[Path | str],
+    limit: int = 8192,
+    fields: tuple[str, ...] = HEADER_FIELDS,
+    workers: int = 16,
+) -> Generator[tuple[str, dict | Exception], None, None]:
+    """
+    Cabeceras de muchos ficheros, en el orden de entrada. El coste es sobre todo abrir y leer el primer bloque,
+    asi que se reparte en hilos. Los ficheros que fallan (incluido NeedMoreBytes) devuelven la excepcion
+    """
+    paths = [str(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from zip(paths, executor.map(_sniff_path, paths, [limit] * len(paths), [fields] * len(paths)))
@@ -0,0 +1,99 @@
+from pathlib import Path
+import random
+import statistics
+import unittest
+
+from ..aggregates import Accumulator, Aggregation, Count, Decade, Mean, Metric, Quantiles, Sum, aggregate_many
+from ..batch import BatchStats
+from ..parser_cex import ParserCEX
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+def build_aggregation() -> Aggregation:
+    return Aggregation(
+        {
+            "letras_por_zona": Metric("Calificacion.EmisionesCO2.Global", Count, by=("IdentificacionEdificio.ZonaClimatica", "Calificacion.EmisionesCO2.Global")),
+            "epnr_por_decada": Metric("Consumo.EnergiaPrimariaNoRenovable.Global", Mean, by=(Decade("IdentificacionEdificio.AnoConstruccion"),)),
+            "superficie": Metric("DatosGeneralesyGeometria.SuperficieHabitable", Sum),
+        }
+    )
+
+
+def zona(record: dict) -> str | None:
+    return record.get("IdentificacionEdificio.ZonaClimatica")
+
+
+class TestAccumulators(unittest.TestCase):
+    def test_mean_merge(self):
+        values = [random.Random(1).uniform(0, 100) for _ in range(10)] + [3.0, 7.5, 1e3]
+        left, right, total = Mean(), Mean(), Mean()
+        for i, value in enumerate(values):
+            (left if i % 3 else right).update(value)
+            total.update(value)
+        left.merge(right)
+
+        self.assertEqual(left.n, len(values))
+        self.assertAlmostEqual(left.mean, statistics.mean(values))
+        self.assertAlmostEqual(left.variance, statistics.variance(values))
+        self.assertAlmostEqual(left.variance, total.variance)
+
+    def test_quantiles(self):
+        rng = random.Random(7)
+        values = [rng.random() for _ in range(20000)]
+        sketches = [Quantiles(k=200, seed=i) for i in range(4)]
+        for i, value in enumerate(values):
+            sketches[i % 4].update(value)
+        for sketch in sketches[1:]:
+            sketches[0].merge(sketch)
+
+        sketch = sketches[0]
+        self.assertEqual(sketch.n, len(values))
+        self.assertLess(sketch.size, 2000)
+        self.assertAlmostEqual(sketch.quantile(0.5), 0.5, delta=0.03)
+        self.assertAlmostEqual(sketch.quantile(0.95), 0.95, delta=0.03)
+
+    def test_decade(self):
+        self.assertEqual(Decade("ano")({"ano": "1987"}), 1980)
+        self.assertIsNone(Decade("ano")({"ano": None}))
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Accumulator()
+
+
+class TestAggregation(unittest.TestCase):
+    def test_update_from_parser(self):
+        aggregation = build_aggregation()
+        cex = ParserCEX(xml_path)
+        aggregation.update(cex)
+        aggregation.update(cex)
+
+        result = aggregation.result()
+        self.assertEqual(result["letras_por_zona"], {("D3", "E"): 2})
+        self.assertEqual(result["epnr_por_decada"][1960]["mean"], 260.33)
+        self.assertAlmostEqual(result["superficie"], 2 * 2214.40)
+
+    def test_aggregate_many(self):
+        stats = BatchStats()
+        paths = [xml_path] * 5 + ["no_existe.xml"]
+        result = aggregate_many(paths, build_aggregation(), workers=2, chunk_size=2, stats=stats).result()
+
+        self.assertEqual(result["letras_por_zona"], {("D3", "E"): 5})
+        self.assertEqual(result["epnr_por_decada"][1960]["n"], 5)
+        self.assertEqual(stats.failed, 1)
+
+    def test_function_key(self):
+        # Una funcion sin atributo field no dice que campos lee: se aplana el registro completo
+        aggregation = Aggregation({"por_zona": Metric("Calificacion.EmisionesCO2.Global", Count, by=(zona,)), **build_aggregation().metrics})
+        self.assertIsNone(aggregation.fields)
+        self.assertEqual(aggregate_many([xml_path] * 3, aggregation, workers=2, chunk_size=2).result()["por_zona"], {"D3": 3})
+
+    def test_aggregate_many_serial(self):
+        result = aggregate_many([xml_path] * 3, build_aggregation(), workers=0, chunk_size=2).result()
+        self.assertEqual(result["letras_por_zona"], {("D3", "E"): 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Ejecuta la suite de los parsers de seccion (test_parser_cex) con cada backend de arbol XML y compara el
+camino rapido de expat con records.flatten
+"""
+
+from io import BytesIO
+import importlib.util
+import os
+from pathlib import Path
+import unittest
+
+from ..expat_records import ExpatExtractor
+from ..parser_cex import BACKENDS, ParserCEX
+from ..records import flatten
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+def _load_suite(backend: str) -> dict[str, type]:
+    """
+    Vuelve a importar test_parser_cex con PARSER_CEX_BACKEND=backend: sus ParserCEX de modulo y de clase se
+    crean con ese backend. Devuelve sus TestCase renombrados con el sufijo del backend
+    """
+    spec = importlib.util.spec_from_file_location(f"test_parser_cex_{backend}", Path(__file__).parent / "test_parser_cex.py")
+    module = importlib.util.module_from_spec(spec)
+    previous = os.environ.get("PARSER_CEX_BACKEND")
+    os.environ["PARSER_CEX_BACKEND"] = backend
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if previous is None:
+            os.environ.pop("PARSER_CEX_BACKEND")
+        else:
+            os.environ["PARSER_CEX_BACKEND"] = previous
+
+    cases = {}
+    for name, value in vars(module).items():
+        if isinstance(value, type) and issubclass(value, unittest.TestCase) and value.__module__ == module.__name__:
+            cases[f"{name}_{backend}"] = type(f"{name}_{backend}", (value,), {})
+    return cases
+
+
+for _backend in BACKENDS:
+    if _backend != "lxml":
+        globals().update(_load_suite(_backend))
+
+
+class TestBackends(unittest.TestCase):
+    def test_to_dict(self):
+        expected = ParserCEX(xml_path, backend="lxml").to_dict()
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(ParserCEX(xml_path, backend=backend).to_dict(), expected)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(Exception):
+            ParserCEX(xml_path, backend="sax")
+
+    def test_expat(self):
+        fields = [
+            "IdentificacionEdificio.ZonaClimatica",
+            "IdentificacionEdificio.Provincia",
+            "DatosGeneralesyGeometria.SuperficieHabitable",
+            "Consumo.EnergiaFinalVectores.GasNatural.Calefaccion",
+            "Calificacion.EmisionesCO2.Global",
+            "EmisionesCO2.Global",
+        ]
+        expected = flatten(ParserCEX(xml_path), fields)
+        self.assertEqual(ExpatExtractor(fields)(xml_path), expected)
+        self.assertEqual(ExpatExtractor(",".join(fields))(xml_path), expected)
+
+        # Con comodines se recorre todo el fichero
+        record = ExpatExtractor("Calificacion.*.Global")(xml_path)
+        self.assertEqual(record, {key: value for key, value in flatten(ParserCEX(xml_path), "Calificacion.*.Global").items() if value is not None})
+
+        # Los campos que no existen se devuelven como None
+        self.assertEqual(ExpatExtractor("IdentificacionEdificio.NoExiste")(xml_path), {"IdentificacionEdificio.NoExiste": None})
+
+    def test_expat_text_fields(self):
+        # Los codigos postales y telefonos se quedan como texto, sin perder los ceros a la izquierda
+        data = xml_path.read_bytes().replace(b"<CodigoPostal>28", b"<CodigoPostal>08")
+        fields = "IdentificacionEdificio.CodigoPostal,IdentificacionEdificio.AnoConstruccion,DatosDelCertificador.*"
+        expected = flatten(ParserCEX(BytesIO(data)), fields)
+        self.assertEqual(expected["IdentificacionEdificio.CodigoPostal"], "08028")
+        self.assertEqual(expected["DatosDelCertificador.CodigoPostal"], "08002")
+        record = ExpatExtractor(fields)(BytesIO(data))
+        self.assertEqual(record, {key: value for key, value in expected.items() if key in record})
+        self.assertEqual(record["DatosDelCertificador.Telefono"], expected["DatosDelCertificador.Telefono"])
+
+    def test_expat_early_stop(self):
+        with open(xml_path, "rb") as file:
+            ExpatExtractor("IdentificacionEdificio.ZonaClimatica")(file)
+            self.assertLess(file.tell(), xml_path.stat().st_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
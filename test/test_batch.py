@@ -0,0 +1,182 @@
+import csv
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+import unittest
+
+from ..batch import BatchStats, _process_file, map_groups, parse_many
+from ..parser_cex import ParserCEX
+from ..validation import CEXValidationError, load_schema, validate
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+xsd_path = Path(__file__).parent / "test_cee.xsd"
+
+
+def referencia_catastral(cex: ParserCEX):
+    return cex.IdentificacionEdificio.ReferenciaCatastral
+
+
+def slow_or_crash(cex: ParserCEX):
+    nombre = cex.DatosPersonalizados.Aplicacion
+    if cex._xml.docinfo.URL.endswith("slow.xml"):
+        time.sleep(5)
+    if cex._xml.docinfo.URL.endswith("crash.xml"):
+        os._exit(1)
+    return nombre
+
+
+def group_names(paths: list[str], timeout: float | None) -> tuple[list, list]:
+    results = [_process_file(path, slow_or_crash, None, False, timeout) for path in paths]
+    return [result.value for result in results if result.ok], results
+
+
+def fixture_reader(path: str) -> bytes:
+    return xml_path.read_bytes()
+
+
+class TestValidation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.invalid_path = Path(cls.tmp.name) / "invalid.xml"
+        text = xml_path.read_text(encoding="utf-8")
+        cls.invalid_path.write_text(text.replace("<ReferenciaCatastral>3558927VK4735H</ReferenciaCatastral>", ""), encoding="utf-8")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_load_schema_is_cached(self):
+        self.assertIs(load_schema(str(xsd_path)), load_schema(str(xsd_path)))
+
+    def test_validate(self):
+        self.assertEqual(validate(ParserCEX(xml_path), xsd_path), [])
+        self.assertEqual(len(validate(ParserCEX(self.invalid_path), xsd_path)), 1)
+
+    def test_validate_fail_fast(self):
+        with self.assertRaises(CEXValidationError):
+            validate(ParserCEX(self.invalid_path), xsd_path, fail_fast=True)
+
+    def test_parse_many_collect_all(self):
+        stats = BatchStats()
+        paths = [xml_path, self.invalid_path, xml_path]
+        results = list(parse_many(paths, extract=referencia_catastral, xsd=xsd_path, workers=2, stats=stats))
+
+        self.assertEqual([result.valid for result in results], [True, False, True])
+        self.assertEqual(results[0].value, "3558927VK4735H")
+        self.assertEqual(stats.files, 3)
+        self.assertIn("validate", stats.timings)
+        self.assertIn("validate", stats.summary())
+
+    def test_parse_many_fail_fast(self):
+        paths = [xml_path, self.invalid_path, xml_path]
+        with self.assertRaises(CEXValidationError):
+            list(parse_many(paths, xsd=xsd_path, fail_fast=True, workers=0))
+
+    def test_parse_many_without_schema(self):
+        stats = BatchStats()
+        results = list(parse_many([xml_path], extract=referencia_catastral, workers=0, stats=stats))
+        self.assertEqual(results[0].value, "3558927VK4735H")
+        self.assertNotIn("validate", stats.timings)
+
+
+class TestFaultIsolation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        folder = Path(cls.tmp.name)
+        text = xml_path.read_text(encoding="utf-8")
+        cls.malformed = folder / "malformed.xml"
+        cls.malformed.write_text(text[: len(text) // 2], encoding="utf-8")
+        cls.slow = folder / "slow.xml"
+        cls.slow.write_text(text, encoding="utf-8")
+        cls.crash = folder / "crash.xml"
+        cls.crash.write_text(text, encoding="utf-8")
+        cls.report = folder / "quarantine.csv"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_bad_files_do_not_abort_the_batch(self):
+        stats = BatchStats()
+        paths = [xml_path, self.malformed, self.slow, xml_path]
+        results = list(parse_many(paths, extract=slow_or_crash, workers=2, timeout=0.5, stats=stats, quarantine=self.report))
+
+        self.assertEqual([result.ok for result in results], [True, False, False, True])
+        self.assertEqual(results[1].error_class, "XMLSyntaxError")
+        self.assertEqual(results[2].error_class, "FileTimeoutError")
+        self.assertEqual(results[3].value, "CE3X")
+        self.assertEqual(stats.failed, 2)
+
+        with open(self.report, newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["path"] for row in rows], [str(self.malformed), str(self.slow)])
+
+    def test_dead_worker_is_quarantined(self):
+        paths = [xml_path, self.crash, xml_path, xml_path]
+        results = list(parse_many(paths, extract=slow_or_crash, workers=2))
+
+        self.assertEqual([result.ok for result in results], [True, False, True, True])
+        self.assertEqual(results[1].error_class, "BrokenProcessPool")
+
+    def test_dead_worker_in_group(self):
+        # Los grupos en vuelo al romperse el pool se reprocesan fichero a fichero: dan una salida por fichero
+        groups = [[str(xml_path), str(self.slow)], [str(xml_path), str(self.crash)], [str(xml_path)]]
+        outputs = list(map_groups(group_names, groups, (0.5,), workers=2))
+
+        self.assertGreaterEqual(len(outputs), 4)
+        self.assertEqual([value for values, _ in outputs for value in values], ["CE3X"] * 3)
+        errors = [result.error_class for _, results in outputs for result in results]
+        self.assertEqual(errors, [None, "FileTimeoutError", None, "BrokenProcessPool", None])
+
+    def test_recycled_workers(self):
+        results = list(parse_many([xml_path] * 4, extract=referencia_catastral, workers=2, max_tasks_per_child=1))
+        self.assertTrue(all(result.ok for result in results))
+
+
+class TestThreads(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.invalid_path = Path(cls.tmp.name) / "invalid.xml"
+        text = xml_path.read_text(encoding="utf-8")
+        cls.invalid_path.write_text(text.replace("<ReferenciaCatastral>3558927VK4735H</ReferenciaCatastral>", ""), encoding="utf-8")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_threads(self):
+        stats = BatchStats()
+        paths = [xml_path, "no_existe.xml", self.invalid_path] + [xml_path] * 10
+        results = list(parse_many(paths, extract=referencia_catastral, xsd=xsd_path, workers=4, prefetch=3, stats=stats, executor="thread"))
+
+        self.assertEqual([result.path for result in results], [str(path) for path in paths])
+        self.assertEqual(results[1].error_class, "FileNotFoundError")
+        self.assertFalse(results[2].valid)
+        self.assertEqual(len(results[2].errors), 1)
+        self.assertEqual({result.value for result in results[3:]}, {"3558927VK4735H"})
+        self.assertIn("read", stats.timings)
+        self.assertEqual(stats.failed, 1)
+
+    def test_reader(self):
+        for executor in ("thread", "process"):
+            results = list(parse_many(["remoto/a.xml", "remoto/b.xml"], extract=referencia_catastral, workers=2, executor=executor, reader=fixture_reader))
+            self.assertEqual([result.value for result in results], ["3558927VK4735H"] * 2)
+        with self.assertRaises(Exception):
+            list(parse_many([xml_path], executor="fibras"))
+
+    def test_schema_per_thread(self):
+        schemas = []
+        thread = threading.Thread(target=lambda: schemas.append(load_schema(str(xsd_path))))
+        thread.start()
+        thread.join()
+        self.assertIsNot(schemas[0], load_schema(str(xsd_path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+from pathlib import Path
+import shutil
+import tempfile
+from time import sleep
+import unittest
+
+import pandas as pd
+
+from ..batch import BatchStats
+from ..chunked import RECORDS, ChunkedFrames, MemoryBudget, _nbytes, iter_frames
+from ..columnar import ColumnBatch
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestChunked(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.paths = []
+        for i in range(24):
+            path = self.folder / f"{i:02d}.xml"
+            shutil.copy(xml_path, path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_budget(self):
+        budget = MemoryBudget(1000)
+        self.assertEqual(budget.estimate(100), 0.0)
+        budget.observe_input(100, {RECORDS: 2, "tabla": 4}, {RECORDS: 16, "tabla": 32})
+        self.assertEqual(budget.bytes_per_row(), {RECORDS: 8.0, "tabla": 8.0})
+        self.assertEqual(budget.estimate(50), 24.0)
+        # Cuando se miden las tablas entregadas, sus bytes por fila sustituyen a la aproximacion
+        budget.observe_frames({RECORDS: 2}, {RECORDS: 200})
+        self.assertAlmostEqual(budget.estimate(50), 100 + 16)
+
+        # En pandas las cadenas no categoricas cuentan tambien su objeto str
+        batch = ColumnBatch.from_records([{"Nombre": "abc", "Tipo": "Hueco"}, {"Nombre": None, "Tipo": "Hueco"}])
+        self.assertEqual(_nbytes(batch, "pyarrow", True), 3 + 24 + 2 + 10 + 24 + 2)
+        self.assertEqual(_nbytes(batch, "pandas", True), 3 + 24 + 2 + 10 + 24 + 2 + 57)
+        self.assertEqual(_nbytes(batch, "pandas", False), 3 + 24 + 2 + 10 + 24 + 2 + 3 * 57)
+
+    def test_chunks(self):
+        full = list(iter_frames(self.paths, budget=1 << 40, workers=0, group_size=4))
+        self.assertEqual(len(full), 1)
+        self.assertEqual(len(full[0]["IdentificacionEdificio"]), 24)
+        self.assertEqual(len(full[0]["PuentesTermicos"]), 24 * 32)
+        self.assertIsInstance(full[0]["CerramientosOpacos"]["Tipo"].dtype, pd.CategoricalDtype)
+
+        # Un presupuesto de unos 6 certificados: la primera medida es la de las columnas y despues la de los DataFrames
+        per_file = sum(frame.memory_usage(deep=True).sum() for frame in full[0].values()) / 24
+        stats = BatchStats()
+        with ChunkedFrames([*self.paths, "no_existe.xml"], budget=int(6 * per_file), workers=2, group_size=2, stats=stats, timeout=60) as chunks:
+            frames = list(chunks)
+        self.assertGreater(len(frames), 2)
+        self.assertEqual(stats.failed, 1)
+        for name in ("IdentificacionEdificio", "Calificacion", "CerramientosOpacos", "HuecosyLucernarios"):
+            combined = pd.concat([chunk[name] for chunk in frames], ignore_index=True)
+            pd.testing.assert_frame_equal(combined, full[0][name], check_categorical=False)
+        for chunk in frames[1:-1]:
+            self.assertLess(sum(frame.memory_usage(deep=True).sum() for frame in chunk.values()), 6 * per_file * 1.5)
+
+    def test_spill(self):
+        chunks = ChunkedFrames(self.paths, budget=1, tables=("PuentesTermicos",), fields="IdentificacionEdificio.*", workers=0, group_size=4)
+        # Un consumidor lento: los bloques que no caben en max_pending esperan en disco
+        while not chunks._done:
+            sleep(0.01)
+        self.assertEqual(chunks.spilled, 5)
+        self.assertEqual(len(list(chunks._spill_dir.iterdir())), 5)
+        frames = list(chunks)
+        self.assertEqual(len(frames), 6)
+        self.assertEqual(set(frames[0]), {"IdentificacionEdificio", "PuentesTermicos"})
+        self.assertEqual(sum(len(chunk["PuentesTermicos"]) for chunk in frames), 24 * 32)
+        self.assertEqual(list(chunks._spill_dir.iterdir()), [])
+        chunks.close()
+        self.assertFalse(chunks._spill_dir.exists())
+
+        with self.assertRaises(Exception):
+            ChunkedFrames(self.paths, tables=("Capas",))
+
+
+if __name__ == "__main__":
+    unittest.main()
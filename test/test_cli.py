@@ -0,0 +1,195 @@
+import csv
+from datetime import datetime
+import json
+from pathlib import Path
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import zipfile
+
+from ..cli import main
+from ..parser_cex import ParserCEX
+from ..records import flatten
+from ..writers import open_writer
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestFlatten(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    def test_flatten(self):
+        record = flatten(self.cex)
+        self.assertEqual(record["IdentificacionEdificio.ZonaClimatica"], "D3")
+        self.assertEqual(record["Calificacion.EmisionesCO2.EscalaGlobal.A"], 8.40)
+        self.assertEqual(record["Consumo.EnergiaFinalVectores.GasNatural.Calefaccion"], 177.04)
+        self.assertEqual(record["MedidasDeMejora.Medida_1.Nombre"], "Paquete LIGHT(30-45 %)")
+        self.assertFalse(any(key.startswith("DatosEnvolventeTermica") for key in record))
+
+    def test_projection(self):
+        timings = {}
+        record = flatten(self.cex, "IdentificacionEdificio.Zona*,Calificacion.*.Global", timings)
+        self.assertEqual(
+            record,
+            {
+                "IdentificacionEdificio.ZonaClimatica": "D3",
+                "Calificacion.Demanda.Global": None,
+                "Calificacion.EnergiaPrimariaNoRenovable.Global": "E",
+                "Calificacion.EmisionesCO2.Global": "E",
+            },
+        )
+        self.assertEqual(set(timings), {"IdentificacionEdificio", "Calificacion"})
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.inputs = self.folder / "inputs"
+        self.inputs.mkdir()
+        for name in ("a.xml", "b.xml"):
+            shutil.copy(xml_path, self.inputs / name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_cli(self, *args: str) -> int:
+        return main([*args, "--workers", "0", "--quiet"])
+
+    def test_csv(self):
+        output = self.folder / "salida.csv"
+        self.assertEqual(self.run_cli(str(self.inputs), str(output), "--fields", "IdentificacionEdificio.ReferenciaCatastral"), 0)
+
+        with open(output, newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["IdentificacionEdificio.ReferenciaCatastral"], "3558927VK4735H")
+
+    def test_ndjson_from_archive(self):
+        archive = self.folder / "lote.zip"
+        with zipfile.ZipFile(archive, "w") as file:
+            file.write(xml_path, "lote/c.xml")
+        output = self.folder / "salida.ndjson"
+        self.run_cli(str(archive), str(output), "--fields", "DatosPersonalizados")
+
+        records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["DatosPersonalizados.FechaGeneracion"], "2023-07-26T00:00:00")
+
+    def test_sqlite_incremental(self):
+        output = self.folder / "salida.db"
+        cache = self.folder / "cache"
+        args = (str(self.inputs / "*.xml"), str(output), "--incremental", "--cache-dir", str(cache), "--fields", "IdentificacionEdificio")
+        self.run_cli(*args)
+        self.run_cli(*args)
+        shutil.copy(xml_path, self.inputs / "c.xml")
+        self.run_cli(*args)
+
+        with sqlite3.connect(output) as connection:
+            count = connection.execute("SELECT COUNT(*) FROM certificados").fetchone()[0]
+        self.assertEqual(count, 3)
+
+    def test_archive_incremental(self):
+        archive = self.folder / "lote.zip"
+        with zipfile.ZipFile(archive, "w") as file:
+            file.write(xml_path, "lote/c.xml")
+        output = self.folder / "salida.ndjson"
+        args = (str(archive), str(output), "--incremental", "--cache-dir", str(self.folder / "cache"), "--fields", "IdentificacionEdificio")
+        self.run_cli(*args)
+        self.run_cli(*args)
+        self.assertEqual(len(output.read_text(encoding="utf-8").splitlines()), 1)
+
+        # Un miembro que cambia dentro del archivo se detecta: en ndjson sus filas se duplicarian y no se admite
+        with zipfile.ZipFile(archive, "w") as file:
+            file.writestr("lote/c.xml", xml_path.read_bytes().replace(b"3558927VK4735H", b"3558927VK4735X"))
+        with self.assertRaises(SystemExit):
+            self.run_cli(*args)
+        self.assertEqual(len(output.read_text(encoding="utf-8").splitlines()), 1)
+
+    def test_sqlite_modified(self):
+        # En sqlite un fichero modificado sustituye a sus filas
+        output = self.folder / "salida.db"
+        args = (str(self.inputs / "*.xml"), str(output), "--incremental", "--cache-dir", str(self.folder / "cache"), "--fields", "IdentificacionEdificio")
+        self.run_cli(*args)
+        (self.inputs / "b.xml").write_bytes(xml_path.read_bytes().replace(b"3558927VK4735H", b"3558927VK4735X"))
+        self.run_cli(*args)
+
+        with sqlite3.connect(output) as connection:
+            rows = connection.execute('SELECT path, "IdentificacionEdificio.ReferenciaCatastral" FROM certificados ORDER BY path').fetchall()
+        self.assertEqual([(Path(path).name, value) for path, value in rows], [("a.xml", "3558927VK4735H"), ("b.xml", "3558927VK4735X")])
+
+    def test_incremental_parquet(self):
+        with self.assertRaises(SystemExit):
+            self.run_cli(str(self.inputs), str(self.folder / "salida.parquet"), "--incremental")
+
+    def test_invalid_schema(self):
+        # Un certificado que no cumple el XSD no se escribe, va a la cuarentena y el proceso termina con error
+        text = xml_path.read_text(encoding="utf-8")
+        (self.inputs / "invalido.xml").write_text(text.replace("<ReferenciaCatastral>3558927VK4735H</ReferenciaCatastral>", ""), encoding="utf-8")
+        output, errors = self.folder / "salida.csv", self.folder / "errores.csv"
+        xsd = str(Path(__file__).parent / "test_cee.xsd")
+        self.assertEqual(self.run_cli(str(self.inputs), str(output), "--xsd", xsd, "--quarantine", str(errors)), 1)
+
+        with open(output, newline="", encoding="utf-8") as file:
+            self.assertEqual([Path(row["path"]).name for row in csv.DictReader(file)], ["a.xml", "b.xml"])
+        with open(errors, newline="", encoding="utf-8") as file:
+            [row] = list(csv.DictReader(file))
+        self.assertEqual(Path(row["path"]).name, "invalido.xml")
+        self.assertEqual(row["error_class"], "CEXValidationError")
+
+    def test_thread_timeout(self):
+        with self.assertRaises(SystemExit):
+            self.run_cli(str(self.inputs), str(self.folder / "salida.csv"), "--executor", "thread", "--timeout", "5")
+
+
+class TestWriters(unittest.TestCase):
+    # El segundo bloque trae una columna nueva y un valor en una columna que en el primero era toda nula
+    chunks = [
+        [{"path": "a", "FechaVisita": None}, {"path": "b", "FechaVisita": None}],
+        [{"path": "c", "FechaVisita": datetime(2023, 7, 26), "Medida_2": 1.5}],
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, append: bool = False) -> Path:
+        path = self.folder / name
+        with open_writer(path, append=append) as writer:
+            for chunk in self.chunks:
+                writer.write(chunk)
+        return path
+
+    def test_csv(self):
+        path = self.write("salida.csv")
+        self.write("salida.csv", append=True)
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0], {"path": "a", "FechaVisita": "", "Medida_2": ""})
+        self.assertEqual(rows[2], {"path": "c", "FechaVisita": "2023-07-26T00:00:00", "Medida_2": "1.5"})
+
+    def test_sqlite(self):
+        path = self.write("salida.db")
+        with sqlite3.connect(path) as connection:
+            rows = connection.execute("SELECT path, FechaVisita, Medida_2 FROM certificados").fetchall()
+        self.assertEqual(rows, [("a", None, None), ("b", None, None), ("c", "2023-07-26T00:00:00", 1.5)])
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        path = self.write("salida.parquet")
+        self.assertEqual([item.name for item in self.folder.iterdir()], ["salida.parquet"])
+        table = pq.read_table(path)
+        self.assertEqual(table.column_names, ["path", "FechaVisita", "Medida_2"])
+        self.assertEqual(table.column("FechaVisita").to_pylist(), [None, None, datetime(2023, 7, 26)])
+        self.assertEqual(table.column("Medida_2").to_pylist(), [None, None, 1.5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+from datetime import datetime
+from pathlib import Path
+import tempfile
+import unittest
+
+from ..batch import BatchStats
+from ..columnar import ColumnBatch, _release, parse_columnar
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+RECORDS = [
+    {"Zona": "D3", "Superficie": 2214.40, "Fecha": datetime(2023, 7, 26), "Datos": None},
+    {"Zona": "Ñ1", "Superficie": None, "Fecha": None, "Datos": "visita"},
+]
+
+
+class TestColumnBatch(unittest.TestCase):
+    def test_from_records(self):
+        batch = ColumnBatch.from_records(RECORDS)
+        self.assertEqual(batch["Zona"].kind, "str")
+        self.assertEqual(batch["Superficie"].kind, "f8")
+        self.assertEqual(batch["Fecha"].kind, "M8")
+        self.assertEqual(
+            batch.to_pydict(),
+            {
+                "Zona": ["D3", "Ñ1"],
+                "Superficie": [2214.40, None],
+                "Fecha": [datetime(2023, 7, 26), None],
+                "Datos": [None, "visita"],
+            },
+        )
+
+    def test_shared_memory_roundtrip(self):
+        descriptor = ColumnBatch.from_records(RECORDS).to_shared()
+        handle, batch = descriptor.attach()
+        try:
+            self.assertEqual(batch.to_pydict(), ColumnBatch.from_records(RECORDS).to_pydict())
+        finally:
+            del batch
+            _release([handle])
+
+    def test_mixed_shared_memory(self):
+        records = [{"Superficie": 2214.40, "Zona": "D3"}, {"Superficie": "no numerico", "Zona": None}, {"Superficie": None, "Zona": "E1"}]
+        descriptor = ColumnBatch.from_records(records).to_shared()
+        handle, batch = descriptor.attach()
+        try:
+            self.assertEqual(batch["Superficie"].kind, "obj")
+            self.assertEqual(batch.to_pydict(), {"Superficie": [2214.40, "no numerico", None], "Zona": ["D3", None, "E1"]})
+        finally:
+            del batch
+            _release([handle])
+
+    def test_concat(self):
+        first = ColumnBatch.from_records(RECORDS)
+        second = ColumnBatch.from_records([{"Zona": "E1", "Superficie": "no numerico", "Extra": 1.0}])
+        batch = ColumnBatch.concat([first, second])
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch["Zona"].to_list(), ["D3", "Ñ1", "E1"])
+        # Una columna que mezcla numeros y texto conserva los valores originales
+        self.assertEqual(batch["Superficie"].kind, "obj")
+        self.assertEqual(batch["Superficie"].to_list(), [2214.40, None, "no numerico"])
+        self.assertEqual(batch["Extra"].to_list(), [None, None, 1.0])
+        self.assertEqual(batch["Fecha"].to_list(), [datetime(2023, 7, 26), None, None])
+
+
+class TestParseColumnar(unittest.TestCase):
+    def test_shared_memory(self):
+        stats = BatchStats()
+        batch = parse_columnar([xml_path] * 5 + ["no_existe.xml"], workers=2, chunk_size=2, stats=stats)
+
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(stats.files, 6)
+        self.assertEqual(stats.failed, 1)
+        self.assertEqual(batch["IdentificacionEdificio.ZonaClimatica"].to_list(), ["D3"] * 5)
+        self.assertEqual(batch["Calificacion.EmisionesCO2.EscalaGlobal.A"].values.tolist(), [8.40] * 5)
+
+        sections = batch.sections()
+        self.assertIn("path", sections["Demanda"].columns)
+        self.assertTrue(all(name.startswith("Demanda.") for name in sections["Demanda"].columns if name != "path"))
+
+    def test_projection(self):
+        batch = parse_columnar([xml_path] * 2, fields="DatosPersonalizados", workers=1)
+        self.assertEqual(list(batch.columns), ["path", "DatosPersonalizados.Aplicacion", "DatosPersonalizados.FechaGeneracion"])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow no esta instalado")
+    def test_arrow(self):
+        table = parse_columnar([xml_path] * 3, workers=2, chunk_size=2, transport="arrow")
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column("IdentificacionEdificio.ZonaClimatica").to_pylist(), ["D3"] * 3)
+
+
+    @unittest.skipIf(pyarrow is None, "pyarrow no esta instalado")
+    def test_arrow_mixed(self):
+        # Una referencia catastral solo con digitos se lee como numero: la columna mezcla numeros y texto
+        with tempfile.TemporaryDirectory() as folder:
+            digits = Path(folder) / "digitos.xml"
+            digits.write_bytes(xml_path.read_bytes().replace(b"3558927VK4735H", b"3558927"))
+            expected = ["3558927VK4735H", "3558927.0"]
+            for chunk_size in (1, 2):
+                table = parse_columnar([xml_path, digits], workers=1, chunk_size=chunk_size, transport="arrow")
+                self.assertEqual(table.column("IdentificacionEdificio.ReferenciaCatastral").to_pylist(), expected)
+                self.assertEqual(table.column("Calificacion.EmisionesCO2.EscalaGlobal.A").to_pylist(), [8.40] * 2)
+
+            batch = parse_columnar([xml_path, digits], workers=1, chunk_size=1)
+            self.assertEqual(batch["IdentificacionEdificio.ReferenciaCatastral"].to_list(), ["3558927VK4735H", 3558927.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from ..dimensions import load_star
+from ..parser_cex import ParserCEX, _Parser_FactoresDePaso
+from ..records import flatten
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestDimensions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        text = xml_path.read_text(encoding="utf-8")
+        self.paths = []
+        for name, content in (("a.xml", text), ("b.xml", text.replace("\n", "\n  ")), ("c.xml", text.replace("<Email>", "<Email>otro."))):
+            path = self.folder / name
+            path.write_text(content, encoding="utf-8")
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_star(self):
+        star = load_star(self.paths, workers=0)
+        self.assertEqual(len(star.facts), 3)
+        # El cambio de formato no cambia la clave; el cambio de contenido si
+        self.assertEqual(len(star.dimensions["DatosDelCertificador"]), 2)
+        self.assertEqual(len(star.dimensions["FactoresdePaso"]), 1)
+        self.assertFalse(any(field.startswith(("DatosDelCertificador.", "Consumo.FactoresdePaso.")) and not field.endswith(".key") for field in star.facts[0]))
+
+        expected = flatten(ParserCEX(self.paths[2]))
+        joined = star.join(star.facts[2])
+        self.assertEqual(joined.pop("path"), str(self.paths[2]))
+        self.assertEqual(joined, expected)
+
+    def test_dimension_parsed_once(self):
+        # Los factores de paso solo se parsean cuando su clave es nueva, no en cada fichero
+        with mock.patch.object(_Parser_FactoresDePaso, "to_dict", autospec=True, side_effect=_Parser_FactoresDePaso.to_dict) as to_dict:
+            star = load_star(self.paths * 2, workers=0)
+        self.assertEqual(len(star.facts), 6)
+        self.assertEqual(to_dict.call_count, 1)
+
+    def test_new_load_resends_dimensions(self):
+        load_star(self.paths[:1], workers=0)
+        star = load_star(self.paths[:1], workers=0)
+        self.assertEqual(len(star.dimensions["DatosDelCertificador"]), 1)
+
+    def test_write(self):
+        paths = load_star(self.paths, workers=0).write(self.folder / "almacen", format="sqlite")
+        with sqlite3.connect(paths["DatosDelCertificador"]) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM DatosDelCertificador").fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
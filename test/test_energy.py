@@ -0,0 +1,61 @@
+from pathlib import Path
+import unittest
+
+import numpy as np
+
+from ..energy import INDICADORES, SERVICIOS, EnergyTensors, compare, recompute, what_if
+from ..parser_cex import ParserCEX
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestEnergy(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    def test_compare(self):
+        tensors = EnergyTensors.from_certificates([self.cex, self.cex.to_dict()])
+        self.assertEqual(tensors.final.shape, (2, 8, len(SERVICIOS)))
+
+        result = compare(tensors)
+        epnr = result["recomputed"][0, INDICADORES.index("EnergiaPrimariaNoRenovable")]
+        self.assertAlmostEqual(epnr[SERVICIOS.index("Calefaccion")], 177.04 * 1.19)
+        self.assertAlmostEqual(epnr[-1], 260.33, places=1)
+        self.assertFalse(result["mismatch"].any())
+
+        # Un valor declarado que no cuadra con energia final x factor se detecta
+        tensors.stored[1, 1, SERVICIOS.index("ACS")] += 5
+        self.assertEqual(compare(tensors)["mismatch"].tolist(), [[False, False], [False, True]])
+
+        # Un valor declarado que falta no se puede comparar: se informa en missing y no en mismatch
+        tensors.stored[0, 0, SERVICIOS.index("ACS")] = np.nan
+        result = compare(tensors)
+        self.assertEqual(result["missing"].tolist(), [[True, False], [False, False]])
+        self.assertEqual(result["mismatch"].tolist(), [[False, False], [False, True]])
+
+    def test_what_if(self):
+        tensors = EnergyTensors.from_certificates([self.cex])
+        scenarios = {
+            "actual": {},
+            "red": {"EmisionesCO2": {"ElectricidadPeninsular": 0.0}},
+        }
+        results = what_if(tensors, scenarios)
+        np.testing.assert_allclose(results["actual"], recompute(tensors))
+        np.testing.assert_allclose(results["red"], recompute(tensors, scenarios["red"]))
+
+        co2 = INDICADORES.index("EmisionesCO2")
+        self.assertEqual(results["red"][0, co2, SERVICIOS.index("Refrigeracion")], 0.0)
+        self.assertAlmostEqual(results["actual"][0, co2, -1] - results["red"][0, co2, -1], 4.06 * 0.331)
+        np.testing.assert_allclose(results["red"][0, 0], results["actual"][0, 0])
+
+        with self.assertRaises(Exception):
+            recompute(tensors, {"EmisionesCO2": {"Hidrogeno": 0.0}})
+
+    def test_from_many(self):
+        tensors = EnergyTensors.from_many([xml_path, xml_path], workers=0)
+        self.assertEqual(tensors.keys, [str(xml_path)] * 2)
+        self.assertEqual(tensors.factors.shape, (2, len(INDICADORES), 8))
+
+
+if __name__ == "__main__":
+    unittest.main()
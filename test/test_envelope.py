@@ -0,0 +1,52 @@
+from pathlib import Path
+import unittest
+
+import numpy as np
+
+from ..envelope import ORIENTACIONES, EnvelopeArrays, envelope_dict, envelope_metrics
+from ..parser_cex import ParserCEX
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestEnvelope(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    def loop_metrics(self) -> tuple[float, float]:
+        envolvente = self.cex.DatosEnvolventeTermica
+        ua = sum(x.Transmitancia * x.Superficie for x in envolvente.CerramientosOpacos.elementos)
+        ua += sum(x.Transmitancia * x.Superficie for x in envolvente.HuecosyLucernarios.elementos)
+        psi_l = sum(x.Transmitancia * x.Longitud for x in envolvente.PuentesTermicos.elementos)
+        return ua, psi_l
+
+    def test_metrics(self):
+        empty = {
+            "DatosGeneralesyGeometria": {"SuperficieHabitable": 0.0, "VolumenEspacioHabitable": None},
+            "DatosEnvolventeTermica": {"CerramientosOpacos": [], "HuecosyLucernarios": [], "PuentesTermicos": []},
+        }
+        arrays = EnvelopeArrays.from_certificates([self.cex, empty, envelope_dict(self.cex)])
+        metrics = envelope_metrics(arrays)
+        ua, psi_l = self.loop_metrics()
+
+        np.testing.assert_allclose(metrics["H_tr"], [ua + psi_l, 0.0, ua + psi_l])
+        np.testing.assert_allclose(metrics["UA_opacos"] + metrics["UA_huecos"], [ua, 0.0, ua])
+        self.assertAlmostEqual(metrics["H_tr_superficie"][0], (ua + psi_l) / 2214.4)
+        self.assertTrue(np.isnan(metrics["H_tr_superficie"][1]))
+
+        # La compacidad y el % de acristalamiento recalculados coinciden con los declarados en el XML
+        geometria = self.cex.DatosGeneralesyGeometria
+        self.assertAlmostEqual(metrics["Compacidad"][0], geometria.Compacidad, places=2)
+        declared = geometria.PorcentajeSuperficieAcristalada.to_dict()
+        np.testing.assert_allclose(metrics["Acristalamiento"][0], [declared[key] for key in ORIENTACIONES], atol=0.5)
+        self.assertEqual(metrics["Acristalamiento"][1].tolist(), [0.0] * len(ORIENTACIONES))
+
+    def test_from_many(self):
+        arrays = EnvelopeArrays.from_many([xml_path, "no_existe.xml", xml_path], workers=0)
+        self.assertEqual(arrays.keys, [str(xml_path)] * 2)
+        self.assertEqual(arrays.opacos.offsets.tolist(), [0, 10, 20])
+        self.assertEqual(len(arrays.puentes.medida), 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
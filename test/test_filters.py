@@ -0,0 +1,62 @@
+from io import BytesIO
+from pathlib import Path
+import unittest
+
+from ..batch import BatchStats, parse_many
+from ..filters import Predicate, read_filtered
+from ..parser_cex import ParserCEX
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+WHERE = [
+    ("IdentificacionEdificio.ZonaClimatica", "==", "D3"),
+    ("IdentificacionEdificio.TipoDeEdificio", "in", ("BloqueDeViviendaCompleto", "ViviendaUnifamiliar")),
+    ("IdentificacionEdificio.AnoConstruccion", "<", 1980),
+]
+
+
+class TestFilters(unittest.TestCase):
+    data = xml_path.read_bytes()
+
+    def test_match(self):
+        cex = read_filtered(xml_path, WHERE)
+        self.assertIsInstance(cex, ParserCEX)
+        self.assertEqual(cex.to_dict(), ParserCEX(xml_path).to_dict())
+        self.assertTrue(Predicate(WHERE)(cex))
+
+    def test_early_termination(self):
+        source = BytesIO(self.data)
+        self.assertIsNone(read_filtered(source, [*WHERE, ("IdentificacionEdificio.CodigoPostal", "==", "08001")]))
+        self.assertLessEqual(source.tell(), 4096)
+        self.assertLess(source.tell(), len(self.data))
+
+    def test_text_fields(self):
+        # Los campos que el parser guarda como texto se comparan sin pasar por float
+        self.assertIsNotNone(read_filtered(xml_path, [("DatosDelCertificador.Telefono", "==", "911835430")]))
+        self.assertIsNotNone(read_filtered(xml_path, [("IdentificacionEdificio.CodigoPostal", "in", ["28028", "28002"])]))
+        self.assertIsNotNone(read_filtered(xml_path, [("IdentificacionEdificio.AnoConstruccion", "==", "1960")]))
+        self.assertIsNotNone(read_filtered(xml_path, [("IdentificacionEdificio.AnoConstruccion", "==", 1960)]))
+
+        data = self.data.replace(b"<CodigoPostal>28028</CodigoPostal>", b"<CodigoPostal>08028</CodigoPostal>")
+        self.assertIsNotNone(read_filtered(BytesIO(data), [("IdentificacionEdificio.CodigoPostal", "==", "08028")]))
+        self.assertIsNone(read_filtered(BytesIO(data), [("IdentificacionEdificio.CodigoPostal", "==", "8028")]))
+
+    def test_later_sections(self):
+        self.assertIsNotNone(read_filtered(xml_path, [("Calificacion.EmisionesCO2.Global", "in", ("D", "E"))]))
+        # Demanda de primer nivel, no la de Calificacion ni la de las medidas
+        self.assertIsNotNone(read_filtered(xml_path, [("Demanda.EdificioObjeto.Global", ">", 100)]))
+        self.assertIsNone(read_filtered(xml_path, [("NoExiste.Campo", "==", 1)]))
+        with self.assertRaises(Exception):
+            Predicate([("IdentificacionEdificio.ZonaClimatica", "~", "D3")])
+
+    def test_parse_many(self):
+        stats = BatchStats()
+        where = [("IdentificacionEdificio.ZonaClimatica", "==", "C1")]
+        results = list(parse_many([xml_path] * 2, extract=lambda cex: 1, workers=0, stats=stats, where=where))
+        self.assertEqual([(result.ok, result.matched, result.value) for result in results], [(True, False, None)] * 2)
+        self.assertEqual(stats.skipped, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import importlib.util
+from pathlib import Path
+import unittest
+
+from ..columnar import ColumnBatch
+from ..frames import FRAME_BACKENDS, envelope_frames, measures_frame, records_frame, section_frames, to_frame
+from ..parser_cex import ParserCEX
+from ..records import flatten
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestCategorical(unittest.TestCase):
+    def test_interned_values(self):
+        first, second = ParserCEX(xml_path), ParserCEX(xml_path)
+        self.assertIs(first.IdentificacionEdificio.Provincia, second.IdentificacionEdificio.to_dict()["Provincia"])
+        self.assertIs(first.Calificacion.EmisionesCO2.Global, second.Calificacion.to_dict()["EmisionesCO2"]["Global"])
+        opacos = [x["Tipo"] for x in second.DatosEnvolventeTermica.CerramientosOpacos.to_records() if x["Tipo"] == "Fachada"]
+        self.assertIs(opacos[0], first.DatosEnvolventeTermica.CerramientosOpacos.elementos[2].Tipo)
+
+    def test_records_frame(self):
+        record = flatten(ParserCEX(xml_path))
+        df = records_frame([record] * 3)
+        self.assertEqual(df["IdentificacionEdificio.ZonaClimatica"].dtype, "category")
+        self.assertEqual(df["Calificacion.EmisionesCO2.Global"].tolist(), ["E"] * 3)
+        self.assertEqual(df["Calificacion.EmisionesCO2.Global"].dtype, "category")
+        self.assertEqual(df["EmisionesCO2.Global"].dtype, "float64")
+        self.assertNotEqual(records_frame([record], categorical=False)["IdentificacionEdificio.ZonaClimatica"].dtype, "category")
+
+    def test_mixed_column(self):
+        df = records_frame([{"Superficie": 2214.40}, {"Superficie": "no numerico"}, {"Superficie": None}])
+        self.assertEqual(df["Superficie"].dtype, object)
+        self.assertEqual(df["Superficie"].tolist(), [2214.40, "no numerico", None])
+
+    def test_envelope_frames(self):
+        opacos = envelope_frames(ParserCEX(xml_path))["CerramientosOpacos"]
+        self.assertEqual(opacos["Orientacion"].dtype, "category")
+        self.assertEqual(opacos["Superficie"].dtype, "float64")
+
+
+def _pydict(frame, backend: str) -> dict[str, list]:
+    if backend == "pandas":
+        columns = {name: frame[name].tolist() for name in frame.columns}
+    elif backend == "pyarrow":
+        columns = frame.to_pydict()
+    else:
+        columns = frame.to_dict(as_series=False)
+    # NaN y NaT pasan a None (son los unicos valores distintos de si mismos)
+    return {name: [None if value != value else value for value in values] for name, values in columns.items()}
+
+
+class TestFrameBackends(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+    backends = [backend for backend in FRAME_BACKENDS if backend == "pandas" or importlib.util.find_spec(backend) is not None]
+
+    def test_records(self):
+        records = [{"path": "a.xml", **flatten(self.cex)}, {"path": "b.xml", **flatten(self.cex, "IdentificacionEdificio")}]
+        expected = ColumnBatch.from_records(records).to_pydict()
+        for backend in self.backends:
+            with self.subTest(backend=backend):
+                self.assertEqual(_pydict(records_frame(records, backend=backend), backend), expected)
+
+    def test_envelope_and_measures(self):
+        for backend in self.backends:
+            with self.subTest(backend=backend):
+                tables = envelope_frames(self.cex, backend)
+                for name, table in tables.items():
+                    records = getattr(self.cex.DatosEnvolventeTermica, name).to_records()
+                    self.assertEqual(_pydict(table, backend), {key: [record[key] for record in records] for key in records[0]})
+
+                measures = _pydict(measures_frame(self.cex, backend), backend)
+                self.assertEqual(measures["Medida"], ["Medida_1", "Medida_2", "Medida_3"])
+                self.assertEqual(measures["Nombre"][0], "Paquete LIGHT(30-45 %)")
+
+    def test_sections(self):
+        for backend in self.backends:
+            with self.subTest(backend=backend):
+                tables = section_frames([{"path": "a.xml", **flatten(self.cex)}], backend)
+                self.assertEqual(_pydict(tables["IdentificacionEdificio"], backend)["IdentificacionEdificio.ZonaClimatica"], ["D3"])
+                self.assertIn("path", _pydict(tables["Consumo"], backend))
+
+    def test_arrow_types(self):
+        if "pyarrow" not in self.backends:
+            self.skipTest("pyarrow no esta instalado")
+        import pyarrow as pa
+
+        table = to_frame([flatten(self.cex)], "pyarrow")
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("IdentificacionEdificio.ZonaClimatica").type))
+        self.assertTrue(pa.types.is_timestamp(table.schema.field("DatosPersonalizados.FechaGeneracion").type))
+        with self.assertRaises(Exception):
+            to_frame([], "spark")
+
+
+if __name__ == "__main__":
+    unittest.main()
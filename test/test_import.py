@@ -0,0 +1,29 @@
+from pathlib import Path
+import subprocess
+import sys
+import unittest
+
+
+root = Path(__file__).parent.parent
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+# El tiempo de arranque en frio se mide en benchmarks/bench_import.py: aqui solo se comprueba que no se cargan pandas ni numpy
+SNIPPET = f"""
+import parser_cex
+parser_cex.ParserCEX({str(xml_path)!r}).IdentificacionEdificio.ZonaClimatica
+import sys
+print("pandas" in sys.modules, "numpy" in sys.modules)
+"""
+
+
+class TestColdStart(unittest.TestCase):
+    def test_core_does_not_import_pandas(self):
+        output = subprocess.run([sys.executable, "-c", SNIPPET], cwd=root, capture_output=True, text=True, check=True).stdout.split()
+        pandas, numpy = output
+
+        self.assertEqual(pandas, "False")
+        self.assertEqual(numpy, "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..layers import LayerTable, layer_records
+from ..parser_cex import ParserCEX
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+# El certificado de prueba no tiene capas: se rellenan las del primer y el tercer cerramiento
+CAPAS = [
+    "<Capas><Capa><Material>Ladrillo</Material><Espesor>0.115</Espesor></Capa>"
+    "<Capa><Material>Lana mineral</Material><Espesor>0.05</Espesor></Capa></Capas>",
+    "<Capas/>",
+    "<Capas><Capa><Material>Hormigon</Material><Espesor>0.25</Espesor></Capa></Capas>",
+]
+
+
+def with_layers() -> bytes:
+    parts = xml_path.read_text(encoding="utf-8").split("<Capas/>")
+    capas = CAPAS + ["<Capas/>"] * (len(parts) - 1 - len(CAPAS))
+    return "".join(part + capa for part, capa in zip(parts, capas + [""])).encode("utf-8")
+
+
+class TestLayers(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.path = Path(cls.folder.name) / "capas.xml"
+        cls.path.write_bytes(with_layers())
+        cls.layered = ParserCEX(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    def test_capas(self):
+        elementos = self.layered.DatosEnvolventeTermica.CerramientosOpacos.elementos
+        self.assertEqual(elementos[0].Capas, [{"Material": "Ladrillo", "Espesor": 0.115}, {"Material": "Lana mineral", "Espesor": 0.05}])
+        self.assertEqual(elementos[1].Capas, [])
+        self.assertNotIn("Capas", elementos[0].to_dict())
+        self.assertEqual(layer_records(self.cex), [[]] * 10)
+
+    def test_offsets(self):
+        layers = LayerTable.from_certificates([self.layered, self.cex, self.layered])
+        self.assertEqual(len(layers), 6)
+        self.assertEqual(layers.elements, 30)
+        self.assertEqual(layers.certificate_offsets.tolist(), [0, 10, 20, 30])
+        self.assertEqual(layers.element_offsets[:4].tolist(), [0, 2, 2, 3])
+        self.assertEqual(layers.certificate_ids.tolist(), [0, 0, 0, 2, 2, 2])
+        self.assertEqual(layers.element_index().tolist(), [0, 0, 2, 0, 0, 2])
+
+        espesor = layers.sum_by_element(layers.values("Espesor"))
+        self.assertEqual(len(espesor), 30)
+        np.testing.assert_allclose(espesor[[0, 1, 2, 20, 22]], [0.165, 0.0, 0.25, 0.165, 0.25])
+        np.testing.assert_allclose(layers.sum_by_certificate(layers.values("Espesor")), [0.415, 0.0, 0.415])
+        self.assertTrue(np.isnan(layers.values("Conductividad")).all())
+        with self.assertRaises(Exception):
+            layers.values("Material")
+
+    def test_empty(self):
+        layers = LayerTable.from_certificates([self.cex])
+        self.assertEqual(len(layers), 0)
+        self.assertEqual(layers.sum_by_certificate(layers.values("Espesor")).tolist(), [0.0])
+
+    def test_tables(self):
+        layers = LayerTable.from_many([self.path, "no_existe.xml", xml_path], workers=0)
+        self.assertEqual(layers.keys, [str(self.path), str(xml_path)])
+        table = layers.to_pydict()
+        self.assertEqual(table["key"], [str(self.path)] * 3)
+        self.assertEqual(table["elemento"], [0, 0, 2])
+        self.assertEqual(table["capa"], [0, 1, 0])
+        self.assertEqual(table["Material"], ["Ladrillo", "Lana mineral", "Hormigon"])
+
+        frame = layers.frame()
+        self.assertEqual(frame["Material"].dtype, "category")
+        self.assertEqual(frame["capa"].tolist(), [0, 1, 0])
+
+    def test_arrow(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest("pyarrow no instalado")
+        nested = LayerTable.from_certificates([self.layered, self.cex]).to_arrow()
+        self.assertEqual(len(nested), 2)
+        value = nested.to_pylist()
+        self.assertEqual(len(value[0]), 10)
+        self.assertEqual(value[0][0], [{"Material": "Ladrillo", "Espesor": 0.115}, {"Material": "Lana mineral", "Espesor": 0.05}])
+        self.assertEqual(value[1], [[]] * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
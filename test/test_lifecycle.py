@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+import unittest
+
+from ..batch import parse_many
+from ..parser_cex import ParserCEX
+from ..records import flatten
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+# Documentos de la prueba de resistencia. PARSER_CEX_SOAK=100000 para la prueba larga
+SOAK = int(os.environ.get("PARSER_CEX_SOAK", 1000))
+
+
+def rss() -> float:
+    """
+    Memoria residente actual del proceso en MB (ru_maxrss solo da el pico)
+    """
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def escaped_elements(n: int, close: bool) -> list:
+    elementos = []
+    for _ in range(n):
+        cex = ParserCEX(xml_path)
+        elementos.append(cex.DatosEnvolventeTermica.CerramientosOpacos.elementos[0])
+        if close:
+            cex.close()
+    return elementos
+
+
+class TestLifecycle(unittest.TestCase):
+    def test_close(self):
+        for backend in ("lxml", "etree"):
+            with self.subTest(backend=backend):
+                cex = ParserCEX(xml_path, backend)
+                demanda = cex.Demanda
+                huecos = cex.DatosEnvolventeTermica.HuecosyLucernarios
+                elemento = cex.DatosEnvolventeTermica.CerramientosOpacos.elementos[0]
+                with cex:
+                    record = flatten(cex)
+                    self.assertFalse(cex.closed)
+                self.assertTrue(cex.closed)
+                self.assertEqual(record["IdentificacionEdificio.ReferenciaCatastral"], "3558927VK4735H")
+
+                for read in (lambda: cex.Demanda, cex.to_dict, demanda.to_dict, huecos.to_records, lambda: elemento.Superficie):
+                    with self.assertRaisesRegex(Exception, "cerrado"):
+                        read()
+                cex.close()
+
+    def test_batch_closes(self):
+        def escape(cex: ParserCEX):
+            return cex.DatosGeneralesyGeometria
+
+        [result] = parse_many([xml_path], extract=escape, workers=0)
+        with self.assertRaisesRegex(Exception, "cerrado"):
+            result.value.to_dict()
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "requiere /proc")
+    def test_escaped_wrappers(self):
+        # Un elemento que sobrevive a su certificado retiene todo el arbol mientras no se cierra
+        start = rss()
+        elementos = escaped_elements(200, close=False)
+        opened = rss() - start
+        del elementos
+
+        start = rss()
+        elementos = escaped_elements(200, close=True)
+        closed = rss() - start
+        del elementos
+        self.assertGreater(opened, 10)
+        self.assertLess(closed, opened / 10)
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "requiere /proc")
+    def test_soak(self):
+        warmup = min(200, SOAK // 5)
+        for i in range(SOAK):
+            with ParserCEX(xml_path) as cex:
+                flatten(cex)
+                envolvente = cex.DatosEnvolventeTermica.CerramientosOpacos
+            if i == warmup:
+                start = rss()
+        self.assertTrue(cex.closed)
+        with self.assertRaises(Exception):
+            envolvente.to_records()
+        self.assertLess(rss() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
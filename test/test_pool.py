@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import Future
+from pathlib import Path
+import shutil
+import tempfile
+import time
+import unittest
+
+from ..batch import BatchStats
+from ..parser_cex import ParserCEX
+from ..pool import WarmPool
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+xsd_path = Path(__file__).parent / "test_cee.xsd"
+
+
+def worker_pid(cex: ParserCEX) -> tuple[int, str]:
+    return os.getpid(), cex.IdentificacionEdificio.ReferenciaCatastral
+
+
+def slow_or_crash(cex: ParserCEX) -> str:
+    if cex._xml.docinfo.URL.endswith("lento.xml"):
+        time.sleep(5)
+    if cex._xml.docinfo.URL.endswith("roto.xml"):
+        os._exit(1)
+    return cex.IdentificacionEdificio.ReferenciaCatastral
+
+
+class TestWarmPool(unittest.TestCase):
+    def test_reuses_workers(self):
+        stats = BatchStats()
+        with WarmPool(extract=worker_pid, xsd=xsd_path, workers=2, chunk_size=2) as pool:
+            first = pool.parse([xml_path, "no_existe.xml", xml_path], stats=stats)
+            second = pool.parse([xml_path] * 4)
+
+        self.assertEqual([result.ok for result in first], [True, False, True])
+        self.assertEqual(first[0].value[1], "3558927VK4735H")
+        self.assertTrue(first[0].valid)
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(pool.starts, 1)
+        pids = {result.value[0] for result in first + second if result.ok}
+        self.assertLessEqual(len(pids), 2)
+        self.assertNotIn(os.getpid(), pids)
+        self.assertFalse(pool.alive)
+        with self.assertRaises(Exception):
+            pool.parse([xml_path])
+
+    def test_idle_timeout(self):
+        with WarmPool(extract=worker_pid, workers=1, idle_timeout=0.2) as pool:
+            pool.parse([xml_path])
+            self.assertTrue(pool.alive)
+            time.sleep(1.0)
+            self.assertFalse(pool.alive)
+            self.assertTrue(pool.parse([xml_path])[0].ok)
+            self.assertEqual(pool.starts, 2)
+
+    def test_dead_worker(self):
+        # El worker muere con roto.xml: solo falla ese fichero, tambien en las tareas que estaban en vuelo
+        with tempfile.TemporaryDirectory() as folder:
+            slow, broken = Path(folder) / "lento.xml", Path(folder) / "roto.xml"
+            shutil.copy(xml_path, slow)
+            shutil.copy(xml_path, broken)
+            with WarmPool(extract=slow_or_crash, workers=2, chunk_size=2, timeout=0.5) as pool:
+                results = pool.parse([xml_path, broken, xml_path, slow, xml_path])
+                self.assertTrue(pool.parse([xml_path])[0].ok)
+                self.assertEqual(pool.starts, 2)
+
+        errors = [result.error_class for result in results]
+        self.assertEqual(errors, [None, "BrokenProcessPool", None, "FileTimeoutError", None])
+        self.assertEqual(results[0].value, "3558927VK4735H")
+
+    def test_stale_discard(self):
+        with WarmPool(extract=worker_pid, workers=1) as pool:
+            pool.start()
+            current = pool._executor
+            # Una tarea rota de un pool anterior no descarta el pool actual
+            stale = pool._executor.__class__(max_workers=1)
+            pool._discard(stale)
+            self.assertIs(pool._executor, current)
+
+            # Una tarea cancelada al descartar su pool se vuelve a procesar en un worker propio
+            future = Future()
+            future.cancel()
+            [result] = pool.collect(future, [xml_path])
+            self.assertEqual(result.value[1], "3558927VK4735H")
+            pool.close()
+            [result] = pool.collect(future, [xml_path])
+            self.assertEqual(result.error_class, "CancelledError")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+from copy import deepcopy
+from pathlib import Path
+import unittest
+
+import numpy as np
+
+from ..columnar import Column, ColumnBatch
+from ..parser_cex import ParserCEX
+from ..quality import RULES, SENTINELS, Allowed, Missing, Range, Rating, Rule, Sentinel, check, check_many, quality_dict, quality_table
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestQuality(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    def certificates(self) -> list[dict]:
+        base = quality_dict(self.cex)
+        values = [deepcopy(base) for _ in range(4)]
+        record = values[1]["record"]
+        for field, value in record.items():
+            if value in SENTINELS:
+                record[field] = 1.0
+        record["PruebasComprobacionesInspecciones.Datos"] = "Visita sin incidencias"
+        record = values[2]["record"]
+        record["Calificacion.EmisionesCO2.Global"] = " E "
+        record["Calificacion.EnergiaPrimariaNoRenovable.Global"] = "C"
+        record["IdentificacionEdificio.ZonaClimatica"] = ""
+        # Un hueco mas al sur que no se refleja en el porcentaje declarado
+        values[3]["envelope"]["DatosEnvolventeTermica"]["HuecosyLucernarios"].append({"Superficie": 40.0, "Orientacion": "Sur", "Tipo": "Hueco"})
+        values[3]["record"]["EmisionesCO2.Global"] = 60.0
+        return values
+
+    def test_default_rules(self):
+        report = check(self.certificates())
+        self.assertEqual(report.bits.dtype, np.uint64)
+        self.assertEqual(report.issues(0), ["centinela", "datos_visita"])
+        self.assertEqual(report.issues(1), [])
+        self.assertEqual(
+            report.issues(2),
+            ["centinela", "identificacion", "datos_visita", "letras", "calificacion_energia_primaria", "calificacion_emisiones"],
+        )
+        self.assertEqual(report.issues(3), ["centinela", "datos_visita", "suma_servicios", "acristalamiento"])
+
+        summary = {row["rule"]: row for row in report.summary()}
+        self.assertEqual(summary["centinela"]["issues"], 3)
+        self.assertFalse(summary["centinela"]["passed"])
+        self.assertEqual(summary["datos_visita"]["rate"], 0.75)
+        self.assertTrue(summary["datos_visita"]["passed"])
+        self.assertEqual(report.mask("acristalamiento").tolist(), [False, False, False, True])
+        with self.assertRaises(Exception):
+            report.mask("no_existe")
+
+    def test_rules(self):
+        table = ColumnBatch(
+            {
+                "A.x": Column.from_values([1.0, 99999999.99, None, 250.0]),
+                "A.letra": Column.from_values(["A", "b", None, "G"]),
+                "B.valor": Column.from_values([5.0, 15.0, 25.0, None]),
+                **{f"B.escala.{letra}": Column.from_values([10.0 * (i + 1)] * 4) for i, letra in enumerate("ABCDEF")},
+                "B.letra": Column.from_values(["A", "A", "C", "G"]),
+            },
+            4,
+        )
+        self.assertEqual(Sentinel("s", ["A.*"]).mask(table).tolist(), [False, True, False, False])
+        self.assertEqual(Range("r", ["A.x"], 0, 100).mask(table).tolist(), [False, True, False, True])
+        self.assertEqual(Missing("m", ["A.x"]).mask(table).tolist(), [False, False, True, False])
+        self.assertEqual(Missing("m", ["A.no_existe"]).mask(table).tolist(), [True] * 4)
+        self.assertEqual(Allowed("l", ["A.letra"], "ABCDEFG").mask(table).tolist(), [False, True, False, False])
+        self.assertEqual(Rating("c", "B.letra", "B.valor", "B.escala").mask(table).tolist(), [False, True, False, False])
+
+        with self.assertRaises(Exception):
+            check(table, [Sentinel("s", ["*"])] * 2)
+        with self.assertRaises(TypeError):
+            Rule("r", ["A.x"])
+
+    def test_table(self):
+        table = quality_table([self.cex])
+        self.assertNotIn("DatosGeneralesyGeometria.Plano", table.columns)
+        self.assertAlmostEqual(table["Envolvente.Compacidad"].values[0], 3.13, places=2)
+        self.assertEqual(table["Envolvente.Acristalamiento.S"].kind, "f8")
+
+    def test_check_many(self):
+        report = check_many([xml_path, "no_existe.xml"], workers=0)
+        self.assertEqual(report.keys, [str(xml_path)])
+        self.assertEqual(len(report.rules), len(RULES))
+        self.assertEqual(report.issues(0), ["centinela", "datos_visita"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+from io import BytesIO
+from pathlib import Path
+import tempfile
+import unittest
+
+from ..parser_cex import ParserCEX
+from ..records import flatten
+from ..redact import RULES, Redactor, redact, redact_many
+from ..validation import validate
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+xsd_path = Path(__file__).parent / "test_cee.xsd"
+
+
+class TestRedact(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    def redacted(self, rules: dict[str, str] = RULES, salt: bytes | str | None = None) -> ParserCEX:
+        output = BytesIO()
+        redact(xml_path, output, rules, salt)
+        output.seek(0)
+        return ParserCEX(output)
+
+    def test_default_rules(self):
+        cex = self.redacted()
+        certificador = cex.DatosDelCertificador
+        self.assertEqual(certificador.Email, "*" * len("gestionayudas@stconsultores.com"))
+        self.assertEqual(certificador.NombreyApellidos, "*" * len("Rafael Cuenca Herreros"))
+        self.assertEqual(len(certificador.NIF), 16)
+        self.assertNotEqual(certificador.NIF, self.cex.DatosDelCertificador.NIF)
+        self.assertIsNone(cex._xml.find("DatosGeneralesyGeometria/Plano"))
+        self.assertIsNone(cex._xml.find("DatosGeneralesyGeometria/Imagen"))
+        self.assertEqual(validate(cex, xsd_path), [])
+
+        # El resto del certificado no cambia
+        changed = {f"DatosDelCertificador.{field}" for field in ("NIF", "NombreyApellidos", "Telefono", "Email", "Domicilio")}
+        changed |= {"DatosGeneralesyGeometria.Plano", "DatosGeneralesyGeometria.Imagen"}
+        original = {field: value for field, value in flatten(self.cex).items() if field not in changed}
+        redacted = {field: value for field, value in flatten(cex).items() if field not in changed}
+        self.assertEqual(redacted, original)
+        self.assertEqual(len(cex.DatosEnvolventeTermica.CerramientosOpacos.elementos), 10)
+
+    def test_hash(self):
+        first = self.redacted(salt="a").DatosDelCertificador.NIF
+        self.assertEqual(self.redacted(salt="a").DatosDelCertificador.NIF, first)
+        self.assertNotEqual(self.redacted(salt="b").DatosDelCertificador.NIF, first)
+
+        # Sin sal se genera una aleatoria, que se devuelve para poder repetir el hash
+        output = BytesIO()
+        salt = redact(xml_path, output)
+        self.assertEqual(len(salt), 16)
+        self.assertNotEqual(Redactor().salt, salt)
+        self.assertEqual(ParserCEX(BytesIO(output.getvalue())).DatosDelCertificador.NIF, self.redacted(salt=salt).DatosDelCertificador.NIF)
+        self.assertEqual(Redactor({"DatosDelCertificador.Email": "mask"}).salt, b"")
+        with self.assertRaises(Exception):
+            Redactor(salt=b"")
+
+    def test_rules(self):
+        cex = self.redacted({"DatosDelCertificador.*": "empty", "Calificacion": "drop"})
+        self.assertEqual(cex.DatosDelCertificador.to_dict()["NIF"], None)
+        self.assertIsNotNone(cex._xml.find("DatosDelCertificador/NIF"))
+        self.assertIsNone(cex._xml.find("Calificacion"))
+        with self.assertRaises(Exception):
+            Redactor({"DatosDelCertificador.NIF": "cifrar"})
+
+    def test_redact_many(self):
+        with tempfile.TemporaryDirectory() as folder:
+            broken = Path(folder) / "roto.xml"
+            broken.write_text("<DatosEnergeticosDelEdificio>", encoding="utf-8")
+            results = list(redact_many([xml_path, broken], Path(folder) / "salida", workers=2))
+            self.assertEqual(results[0], (str(xml_path), Path(folder) / "salida" / xml_path.name))
+            self.assertIsInstance(results[1][1], Exception)
+            self.assertIn("XMLSyntaxError", str(results[1][1]))
+            self.assertFalse((Path(folder) / "salida" / "roto.xml").exists())
+            self.assertEqual(ParserCEX(results[0][1]).DatosDelCertificador.Telefono, "*********")
+
+            with self.assertRaises(Exception):
+                list(redact_many([xml_path, xml_path], Path(folder) / "salida", workers=0))
+
+    def test_keeps_originals(self):
+        with tempfile.TemporaryDirectory() as folder:
+            source = Path(folder) / "a.xml"
+            source.write_bytes(xml_path.read_bytes())
+            # La salida en la carpeta de origen sobrescribiria el original
+            with self.assertRaises(Exception):
+                list(redact_many([source], folder, salt="x", workers=0))
+            with self.assertRaises(Exception):
+                redact(source, source, salt="x")
+            self.assertEqual(source.read_bytes(), xml_path.read_bytes())
+
+            # Un fallo no deja un fichero a medias ni toca la salida que ya existia
+            broken = Path(folder) / "roto.xml"
+            broken.write_text("<DatosEnergeticosDelEdificio>", encoding="utf-8")
+            output = Path(folder) / "salida.xml"
+            with self.assertRaises(Exception):
+                redact(broken, output, salt="x")
+            self.assertFalse(output.exists())
+            output.write_bytes(b"previo")
+            with self.assertRaises(Exception):
+                redact(broken, output, salt="x")
+            self.assertEqual(output.read_bytes(), b"previo")
+            self.assertEqual(sorted(path.name for path in Path(folder).iterdir()), ["a.xml", "roto.xml", "salida.xml"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+from datetime import datetime
+import io
+import json
+from pathlib import Path
+import unittest
+from unittest import mock
+
+from .. import serializers
+from ..parser_cex import ParserCEX
+from ..serializers import StreamWriter, dumps_ndjson, stream_many
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+class TestToDict(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+    dicc = cex.to_dict()
+
+    def test_sections(self):
+        self.assertEqual(list(self.dicc), list(ParserCEX._sections))
+        self.assertEqual(self.dicc["IdentificacionEdificio"]["NormativaVigente"], "Anterior a la NBE-CT-79")
+        self.assertEqual(self.dicc["IdentificacionEdificio"]["CodigoPostal"], "28028")
+        self.assertEqual(self.dicc["DatosDelCertificador"]["Telefono"], "911835430")
+        self.assertEqual(self.dicc["DatosGeneralesyGeometria"]["PorcentajeSuperficieAcristalada"]["O"], 9)
+        self.assertEqual(self.dicc["PruebasComprobacionesInspecciones"]["FechaVisita"], datetime(2023, 7, 25))
+        self.assertEqual(self.dicc["DatosPersonalizados"]["FechaGeneracion"], datetime(2023, 7, 26))
+
+    def test_nested(self):
+        self.assertEqual(self.dicc["Calificacion"]["Demanda"]["EscalaRefrigeracion"]["F"], 32.40)
+        self.assertEqual(self.dicc["Calificacion"]["EmisionesCO2"]["EscalaGlobal"]["A"], 8.40)
+        self.assertEqual(self.dicc["Consumo"]["EnergiaFinalVectores"]["GasNatural"]["Calefaccion"], 177.04)
+        self.assertEqual(self.dicc["Consumo"]["FactoresdePaso"]["FinalAEmisiones"]["GasNatural"], 0.252)
+        self.assertEqual(self.dicc["MedidasDeMejora"]["Medida_1"]["EmisionesCO2"]["Global"], 32.41)
+        self.assertEqual(self.dicc["InstalacionesTermicas"]["GeneradoresDeCalefaccion"]["VectorEnergetico"], "GasNatural")
+
+    def test_envelope_tables_match_properties(self):
+        envolvente = self.cex.DatosEnvolventeTermica
+        for table in ("CerramientosOpacos", "HuecosyLucernarios", "PuentesTermicos"):
+            expected = [elemento.get_dict() for elemento in getattr(envolvente, table).elementos]
+            self.assertEqual(self.dicc["DatosEnvolventeTermica"][table], expected)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_dumps_ndjson(self):
+        line = dumps_ndjson({"FechaVisita": datetime(2023, 7, 25), "Global": 1.5})
+        self.assertTrue(line.endswith(b"\n"))
+        self.assertEqual(json.loads(line), {"FechaVisita": "2023-07-25T00:00:00", "Global": 1.5})
+
+    def test_dumps_ndjson_without_orjson(self):
+        with mock.patch.object(serializers, "orjson", None):
+            line = dumps_ndjson({"FechaVisita": datetime(2023, 7, 25), "Municipio": "Móstoles"})
+        self.assertEqual(json.loads(line), {"FechaVisita": "2023-07-25T00:00:00", "Municipio": "Móstoles"})
+
+    def test_stream_writer(self):
+        sink = io.BytesIO()
+        with StreamWriter(sink) as writer:
+            writer.write(ParserCEX(xml_path))
+            writer.write(ParserCEX(xml_path))
+
+        lines = sink.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])["IdentificacionEdificio"]["ZonaClimatica"], "D3")
+
+    def test_stream_many(self):
+        sink = io.BytesIO()
+        stats = stream_many([xml_path] * 3, sink, workers=2)
+
+        records = [json.loads(line) for line in sink.getvalue().splitlines()]
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[2]["DatosEnvolventeTermica"]["PuentesTermicos"][0]["Longitud"], 108.0)
+
+    @unittest.skipIf(serializers.msgpack is None, "msgpack no esta instalado")
+    def test_msgpack(self):
+        sink = io.BytesIO()
+        stream_many([xml_path], sink, format="msgpack", workers=0)
+        obj = serializers.msgpack.unpackb(sink.getvalue())
+        self.assertEqual(obj["PruebasComprobacionesInspecciones"]["FechaVisita"], "2023-07-25T00:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import http.client
+import json
+import os
+from pathlib import Path
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import pyarrow as pa
+
+from ..parser_cex import ParserCEX
+from ..pool import WarmPool
+from ..records import RecordExtractor
+from ..service import ParseService, encode_results, make_server
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+xsd_path = Path(__file__).parent / "test_cee.xsd"
+
+
+def slow_extract(cex: ParserCEX) -> str:
+    if cex._xml.docinfo.URL.endswith("lento.xml"):
+        time.sleep(0.3)
+    if cex._xml.docinfo.URL.endswith("roto.xml"):
+        os._exit(1)
+    return cex.IdentificacionEdificio.ReferenciaCatastral
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str) -> None:
+        super().__init__("localhost")
+        self.unix = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix)
+
+
+class TestService(unittest.TestCase):
+    def test_parse(self):
+        with ParseService(workers=1, chunk_size=4) as service:
+            results = service.parse([xml_path, ("subido.xml", xml_path.read_bytes()), "no_existe.xml"])
+            self.assertEqual([result.path for result in results], [str(xml_path), "subido.xml", "no_existe.xml"])
+            self.assertEqual([result.ok for result in results], [True, True, False])
+            record, _ = results[1].value
+            self.assertEqual(record["IdentificacionEdificio.ReferenciaCatastral"], "3558927VK4735H")
+            # Las tres rutas van en una sola tarea
+            metrics = service.metrics()
+            self.assertEqual(metrics["lanes"]["interactive"]["tasks"], 1)
+            self.assertEqual(metrics["lanes"]["interactive"]["files"], 3)
+            self.assertIsNotNone(metrics["lanes"]["interactive"]["p99_ms"])
+            self.assertIsNone(metrics["lanes"]["bulk"]["p50_ms"])
+            with self.assertRaises(Exception):
+                service.submit([xml_path], lane="urgente")
+
+    def test_invalid_schema(self):
+        # Un certificado que no cumple el XSD se responde como error y sin registro
+        invalid = xml_path.read_bytes().replace(b"<ReferenciaCatastral>3558927VK4735H</ReferenciaCatastral>", b"")
+        pool = WarmPool(extract=RecordExtractor(), xsd=xsd_path, workers=1, idle_timeout=None)
+        with ParseService(pool) as service:
+            results = service.parse([xml_path, ("invalido.xml", invalid)], timeout=30)
+        rows = json.loads(encode_results(results)[0])["results"]
+        self.assertIsNone(rows[0]["error"])
+        self.assertIsNone(rows[1]["record"])
+        self.assertTrue(rows[1]["error"].startswith("CEXValidationError"))
+
+    def test_priority(self):
+        with tempfile.TemporaryDirectory() as folder:
+            slow = Path(folder) / "lento.xml"
+            slow.write_bytes(xml_path.read_bytes())
+            pool = WarmPool(extract=slow_extract, workers=1, chunk_size=1, idle_timeout=None)
+            with ParseService(pool, chunk_size=1, in_flight=1) as service:
+                bulk = service.submit([slow] * 4, lane="bulk")
+                time.sleep(0.1)
+                self.assertEqual(service.metrics()["lanes"]["bulk"]["queued"], 3)
+                # La peticion interactiva adelanta a los tres ficheros de bulk que aun estan en cola
+                [result] = service.parse([xml_path], lane="interactive", timeout=5)
+                self.assertEqual(result.value, "3558927VK4735H")
+                self.assertFalse(bulk.done.is_set())
+                self.assertTrue(bulk.done.wait(5))
+                self.assertEqual([result.value for result in bulk.results], ["3558927VK4735H"] * 4)
+
+    def test_dead_worker(self):
+        # Un XML que rompe el worker solo hace fallar su propia peticion, aunque vaya en la misma tarea que otras
+        with tempfile.TemporaryDirectory() as folder:
+            broken = Path(folder) / "roto.xml"
+            broken.write_bytes(xml_path.read_bytes())
+            pool = WarmPool(extract=slow_extract, workers=1, chunk_size=4, idle_timeout=None)
+            with ParseService(pool, chunk_size=4, max_wait=0.2) as service:
+                requests = [service.submit([path]) for path in (xml_path, broken, xml_path)]
+                self.assertTrue(all(request.done.wait(30) for request in requests))
+                self.assertEqual(service.metrics()["lanes"]["interactive"]["tasks"], 1)
+                self.assertEqual([request.results[0].error_class for request in requests], [None, "BrokenProcessPool", None])
+                self.assertEqual(service.parse([xml_path], timeout=30)[0].value, "3558927VK4735H")
+
+    def test_http(self):
+        with ParseService(workers=1) as service:
+            server = make_server(service, port=0)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=30)
+                connection.request("POST", "/parse?lane=interactive", body=xml_path.read_bytes(), headers={"Content-Type": "application/xml"})
+                response = connection.getresponse()
+                self.assertEqual(response.status, 200)
+                [row] = json.loads(response.read())["results"]
+                self.assertEqual(row["record"]["IdentificacionEdificio.ReferenciaCatastral"], "3558927VK4735H")
+                self.assertIsNone(row["error"])
+
+                body = json.dumps({"paths": [str(xml_path), "no_existe.xml"]})
+                connection.request("POST", "/parse?lane=bulk&format=arrow", body=body, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                self.assertEqual(response.getheader("Content-Type"), "application/vnd.apache.arrow.stream")
+                table = pa.ipc.open_stream(response.read()).read_all()
+                self.assertEqual(table.column("path").to_pylist(), [str(xml_path), "no_existe.xml"])
+                self.assertIsNone(table.column("error")[0].as_py())
+                self.assertIn("no_existe.xml", table.column("error")[1].as_py())
+
+                connection.request("POST", "/parse?lane=urgente", body=b"")
+                response = connection.getresponse()
+                response.read()
+                self.assertEqual(response.status, 400)
+
+                connection.request("GET", "/metrics")
+                metrics = json.loads(connection.getresponse().read())
+                self.assertEqual(metrics["lanes"]["bulk"]["files"], 2)
+                self.assertEqual(metrics["lanes"]["interactive"]["requests"], 1)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as folder, ParseService(workers=1) as service:
+            path = os.path.join(folder, "parser.sock")
+            server = make_server(service, unix=path)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                connection = UnixConnection(path)
+                connection.request("GET", "/health")
+                self.assertEqual(json.loads(connection.getresponse().read()), {"status": "ok"})
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import json
+import multiprocessing
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+from time import sleep
+import unittest
+
+from ..cli import main
+from ..shards import ShardQueue, merge, run_node
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+def node_worker(queue: str, folder: str, node: str) -> int:
+    return run_node(queue, folder, node=node, fields="IdentificacionEdificio.ReferenciaCatastral", workers=0)
+
+
+class TestShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.paths = []
+        for i in range(12):
+            path = self.folder / "inputs" / f"{i:02d}.xml"
+            path.parent.mkdir(exist_ok=True)
+            shutil.copy(xml_path, path)
+            self.paths.append(path)
+        (self.folder / "inputs" / "roto.xml").write_text("<DatosEnergeticosDelEdificio>", encoding="utf-8")
+        self.paths.append(self.folder / "inputs" / "roto.xml")
+        self.queue_path = self.folder / "cola.db"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_nodes(self):
+        with ShardQueue.create(self.queue_path, self.paths, shard_size=2) as queue:
+            self.assertEqual(queue.status()["pending"], 7)
+        # Crear la cola otra vez no cambia los shards
+        ShardQueue.create(self.queue_path, self.paths[:1], shard_size=1).close()
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(3) as pool:
+            shards = pool.starmap(node_worker, [(str(self.queue_path), str(self.folder / "partes"), f"nodo{i}") for i in range(3)])
+        self.assertEqual(sum(shards), 7)
+
+        output = self.folder / "salida.ndjson"
+        self.assertEqual(merge(self.queue_path, output), 12)
+        records = [json.loads(line) for line in output.read_bytes().splitlines()]
+        self.assertEqual(sorted(record["path"] for record in records), sorted(str(path.resolve()) for path in self.paths[:12]))
+        self.assertEqual(records[0]["IdentificacionEdificio.ReferenciaCatastral"], "3558927VK4735H")
+
+    def test_leases(self):
+        queue = ShardQueue.create(self.queue_path, self.paths, shard_size=6, lease=0.05, max_attempts=2)
+        shard, paths = queue.claim("muerto")
+        self.assertEqual(len(paths), 6)
+        self.assertEqual(queue.claim("vivo")[0], shard + 1)
+        with self.assertRaises(Exception):
+            merge(queue, self.folder / "salida.csv")
+
+        # La concesion caduca: el shard vuelve a repartirse y el nodo que se quedo parado ya no puede terminarlo
+        sleep(0.1)
+        self.assertEqual(queue.claim("otro")[0], shard)
+        self.assertFalse(queue.complete(shard, "muerto", "parte"))
+        self.assertFalse(queue.renew(shard, "muerto"))
+        self.assertTrue(queue.complete(shard, "otro", None))
+
+        # El segundo shard agota sus intentos
+        sleep(0.1)
+        self.assertEqual(queue.claim("otro")[0], shard + 1)
+        queue.release(shard + 1, "otro", "Exception: fallo")
+        self.assertEqual(queue.status(), {"pending": 1, "leased": 0, "done": 1, "failed": 1})
+        self.assertEqual(queue.failures(), [(shard + 1, "Exception: fallo")])
+
+        self.assertEqual(run_node(queue, self.folder / "partes", node="vivo", workers=0), 1)
+        self.assertTrue(queue.finished)
+        with self.assertRaises(Exception):
+            merge(queue, self.folder / "salida.csv")
+        self.assertEqual(merge(queue, self.folder / "salida.csv", partial=True), 0)
+        queue.close()
+
+    def test_cli(self):
+        output = self.folder / "salida.csv"
+        arguments = [str(self.folder / "inputs"), str(output), "--queue", str(self.queue_path), "--workers", "0", "--quiet"]
+        errors = self.folder / "errores.csv"
+        self.assertEqual(main([*arguments, "--shard-size", "5", "--quarantine", str(errors)]), 1)
+        self.assertEqual(len(list((self.folder / "salida.csv.partes").glob("*.errores.csv"))), 3)
+        self.assertFalse(errors.exists())
+        self.assertEqual(main([*arguments, "--merge", "--quarantine", str(errors)]), 0)
+        self.assertEqual(len(output.read_text(encoding="utf-8").splitlines()), 13)
+        # --merge junta las cuarentenas de los shards en el CSV indicado
+        rows = errors.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(rows[0], "path,error_class,error")
+        self.assertEqual([row.split(",")[0] for row in rows[1:]], [str((self.folder / "inputs" / "roto.xml").resolve())])
+
+    def test_lazy_discovery(self):
+        # Si la cola ya tiene shards, create no recorre los ficheros (no descomprime archivos en la cache compartida)
+        ShardQueue.create(self.queue_path, self.paths, shard_size=5).close()
+
+        def paths():
+            raise AssertionError("no se deberia descubrir nada")
+            yield
+
+        with ShardQueue.create(self.queue_path, paths()) as queue:
+            self.assertEqual(queue.status()["pending"], 3)
+
+    def test_create_marker(self):
+        # Mientras otro nodo crea la cola (tiene el marcador), create espera a que aparezca ya completa sin recorrer paths
+        marker = self.queue_path.with_name(self.queue_path.name + ".creando")
+        marker.touch()
+        with self.assertRaises(Exception):
+            ShardQueue.create(self.queue_path, iter(()), wait=0.1)
+
+        def paths():
+            raise AssertionError("no se deberia descubrir nada")
+            yield
+
+        status = []
+
+        def node():
+            with ShardQueue.create(self.queue_path, paths(), wait=30) as queue:
+                status.append(queue.status())
+
+        thread = threading.Thread(target=node)
+        thread.start()
+        sleep(0.2)
+        self.assertFalse(self.queue_path.exists())
+        ShardQueue._build(self.queue_path, self.paths, 5)
+        marker.unlink()
+        thread.join()
+        self.assertEqual(status[0]["pending"], 3)
+        self.assertEqual(sorted(path.name for path in self.folder.iterdir()), ["cola.db", "inputs"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..parser_cex import ParserCEX
+from ..similarity import FEATURES, SimilarityIndex, similarity_dict
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+
+def variant(base: dict, partition: tuple | None = None, **changes) -> dict:
+    features = list(base["features"])
+    for feature, value in changes.items():
+        features[FEATURES.index(feature)] = value
+    return {"partition": partition or base["partition"], "features": features}
+
+
+class TestSimilarity(unittest.TestCase):
+    cex = ParserCEX(xml_path)
+
+    def setUp(self):
+        self.base = similarity_dict(self.cex)
+        self.certificates = [
+            variant(self.base, AnoConstruccion=1990.0),
+            variant(self.base, AnoConstruccion=1965.0),
+            variant(self.base, AnoConstruccion=2010.0, SuperficieHabitable=150.0),
+            variant(self.base, ("D3", "Unifamiliar")),
+            variant(self.base, ("C1", "BloqueDeViviendaCompleto"), AnoConstruccion=1961.0),
+        ]
+
+    def test_features(self):
+        self.assertEqual(self.base["partition"], ("D3", "BloqueDeViviendaCompleto"))
+        self.assertEqual(len(self.base["features"]), len(FEATURES))
+        features = dict(zip(FEATURES, self.base["features"]))
+        self.assertEqual(features["AnoConstruccion"], 1960.0)
+        self.assertEqual(features["Compacidad"], 3.13)
+        self.assertEqual(features["Acristalamiento.S"], 7.0)
+        self.assertGreater(features["Transmitancia.HuecosyLucernarios"], features["Transmitancia.CerramientosOpacos"])
+
+    def test_query(self):
+        index = SimilarityIndex.from_certificates(self.certificates, keys=list("abcde"))
+        self.assertEqual(index.matrix.dtype, np.float32)
+        self.assertEqual(len(index.partitions), 3)
+
+        # Solo se comparan edificios de la misma zona y tipo, de mas a menos parecido
+        result = index.query(self.cex, k=5)
+        self.assertEqual([key for key, _ in result], ["b", "a", "c"])
+        self.assertEqual([distance for _, distance in result], sorted(distance for _, distance in result))
+        self.assertEqual(len(index.query(self.cex, k=5, exact=False)), 5)
+        self.assertEqual(index.query(variant(self.base, ("E1", "Otro"))), [])
+
+    def test_blocks(self):
+        rng = np.random.default_rng(0)
+        index = SimilarityIndex.from_certificates([variant(self.base, SuperficieHabitable=value) for value in rng.uniform(50, 5000, 300)])
+        query = index.transform(np.array([self.base["features"]]))
+        rows, distances = index.search(query, k=7, block=16)
+        expected = np.sqrt(((index.matrix - query) ** 2).sum(axis=1))
+        np.testing.assert_array_equal(rows[0], np.argsort(expected, kind="stable")[:7])
+        np.testing.assert_allclose(distances[0], np.sort(expected)[:7], rtol=1e-4, atol=1e-3)
+
+    def test_incremental_and_persistence(self):
+        index = SimilarityIndex.from_certificates(self.certificates[:2], weights={"AnoConstruccion": 3.0})
+        mean = index.mean.copy()
+        index.add(self.certificates[2:])
+        np.testing.assert_array_equal(index.mean, mean)
+        self.assertEqual(index.keys, [0, 1, 2, 3, 4])
+        self.assertEqual([key for key, _ in index.query(self.cex, k=2)], [1, 0])
+        with self.assertRaises(Exception):
+            index.add(self.certificates, keys=["x"])
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "index.npz"
+            index.save(path)
+            loaded = SimilarityIndex.load(path)
+        self.assertEqual(loaded.partitions, index.partitions)
+        np.testing.assert_array_equal(loaded.matrix, index.matrix)
+        self.assertEqual(loaded.query(self.cex, k=3), [(str(key), distance) for key, distance in index.query(self.cex, k=3)])
+
+    def test_from_many(self):
+        index = SimilarityIndex.from_many([xml_path, "no_existe.xml"], workers=0)
+        self.assertEqual(index.keys, [str(xml_path)])
+        index.add_many([xml_path], workers=0)
+        self.assertEqual(index.query(self.cex), [(str(xml_path), 0.0)] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+from io import BytesIO
+from pathlib import Path
+import tempfile
+import unittest
+
+from lxml import etree
+
+from ..sniff import NeedMoreBytes, sniff, sniff_many
+
+
+xml_path = Path(__file__).parent / "test_cee.xml"
+
+HEADER = {
+    "IdentificacionEdificio.ReferenciaCatastral": "3558927VK4735H",
+    "IdentificacionEdificio.Procedimiento": "CEXv2.3",
+    "IdentificacionEdificio.AlcanceInformacionXML": "CertificacionExistente",
+    "DatosDelCertificador.Fecha": "25/07/2023",
+}
+
+
+class TestSniff(unittest.TestCase):
+    data = xml_path.read_bytes()
+
+    def test_sniff(self):
+        source = BytesIO(self.data)
+        self.assertEqual(sniff(source), HEADER)
+        self.assertLessEqual(source.tell(), 2048)
+        self.assertEqual(sniff(self.data[:4096]), HEADER)
+
+    def test_need_more_bytes(self):
+        with self.assertRaises(NeedMoreBytes) as context:
+            sniff(self.data[:900])
+        self.assertEqual(context.exception.header["DatosDelCertificador.Fecha"], "25/07/2023")
+        self.assertIsNone(context.exception.header["IdentificacionEdificio.AlcanceInformacionXML"])
+
+        with self.assertRaises(NeedMoreBytes) as context:
+            sniff(BytesIO(self.data), limit=500)
+        self.assertEqual(context.exception.read, 500)
+
+    def test_missing_field(self):
+        header = sniff(self.data.replace(b"<Procedimiento>CEXv2.3</Procedimiento>", b""))
+        self.assertIsNone(header["IdentificacionEdificio.Procedimiento"])
+
+    def test_missing_section(self):
+        # Con el documento completo leido, una seccion que no aparece no existe: no se piden mas bytes
+        start, end = self.data.index(b"<IdentificacionEdificio>"), self.data.index(b"</IdentificacionEdificio>")
+        data = self.data[:start] + self.data[end + len(b"</IdentificacionEdificio>") :]
+        expected = {**dict.fromkeys(HEADER), "DatosDelCertificador.Fecha": "25/07/2023"}
+        self.assertEqual(sniff(BytesIO(data), limit=len(data) + 1), expected)
+        self.assertEqual(sniff(data, limit=len(data)), expected)
+        with self.assertRaises(NeedMoreBytes):
+            sniff(BytesIO(data))
+
+    def test_sniff_many(self):
+        with tempfile.TemporaryDirectory() as folder:
+            broken = Path(folder) / "roto.xml"
+            broken.write_bytes(b"<DatosEnergeticosDelEdificio><DatosDelCertificador>")
+            results = dict(sniff_many([xml_path, broken], workers=2))
+        self.assertEqual(results[str(xml_path)], HEADER)
+        # El fichero termina sin cerrar el documento: no es que falten bytes, esta truncado
+        self.assertIsInstance(results[str(broken)], etree.XMLSyntaxError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+from pathlib import Path
+import threading
+from xml.etree import ElementTree
+
+from lxml import etree
+
+from .parser_cex import ParserCEX
+
+
+class CEXValidationError(Exception):
+    """
+    Excepcion lanzada cuando un XML no cumple el esquema XSD en modo fail-fast
+    """
+
+    def __init__(self, path: Path | str, errors: list[str]) -> None:
+        self.path = path
+        self.errors = errors
+        super().__init__(f"'{path}' no cumple el esquema XSD:\n" + "\n".join(errors))
+
+
+# Esquemas compilados de cada hilo. Un XMLSchema guarda los errores de la ultima validacion en error_log,
+# asi que no se puede validar con el mismo objeto desde varios hilos a la vez
+_schemas = threading.local()
+
+
+def load_schema(xsd: Path | str) -> etree.XMLSchema:
+    """
+    Carga y compila el esquema XSD una unica vez por proceso (y por hilo).
+    Las siguientes llamadas con la misma ruta devuelven el esquema ya compilado
+    """
+    cache: dict = _schemas.__dict__.setdefault("cache", {})
+    if xsd not in cache:
+        cache[xsd] = etree.XMLSchema(etree.parse(str(xsd)))
+    return cache[xsd]
+
+
+def validate(cex: ParserCEX | etree._ElementTree, schema: etree.XMLSchema | Path | str, fail_fast: bool = False) -> list[str]:
+    """
+    Valida el arbol ya parseado por ParserCEX, sin volver a leer el fichero.
+
+    Devuelve la lista de errores (vacia si el documento es valido).
+    Con fail_fast=True se lanza CEXValidationError en lugar de devolver los errores
+    """
+    if not isinstance(schema, etree.XMLSchema):
+        schema = load_schema(str(schema))
+
+    tree = cex._xml if isinstance(cex, ParserCEX) else cex
+    if not isinstance(tree, etree._ElementTree):
+        # Arbol de otro backend (xml.etree): XMLSchema necesita un arbol de lxml
+        tree = etree.ElementTree(etree.fromstring(ElementTree.tostring(tree.getroot())))
+    if schema.validate(tree):
+        return []
+
+    errors = [f"{error.line}:{error.column}: {error.message}" for error in schema.error_log]
+    if fail_fast:
+        raise CEXValidationError(tree.docinfo.URL, errors)
+    return errors
@@ -0,0 +1,258 @@
+from abc import ABC, abstractmethod
+import csv
+from datetime import datetime
+import os
+from pathlib import Path
+import sqlite3
+
+from .serializers import dumps_ndjson
+
+
+FORMATS = ("parquet", "csv", "ndjson", "sqlite")
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def output_format(path: Path | str, format: str | None = None) -> str:
+    """
+    Formato de salida: el indicado o el que corresponde a la extension del fichero
+    """
+    if format is not None:
+        return format
+    suffix = Path(path).suffix.lstrip(".").lower()
+    return {"jsonl": "ndjson", "db": "sqlite", "sqlite3": "sqlite"}.get(suffix, suffix)
+
+
+def _new_keys(records: list[dict], known: list[str]) -> list[str]:
+    """
+    Claves de los registros que no estan en known, en orden de aparicion
+    """
+    seen = set(known)
+    keys = []
+    for record in records:
+        for key in record:
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+    return keys
+
+
+class _Writer(ABC):
+    """
+    Escritor de registros aplanados por bloques. Cada llamada a write recibe un bloque de registros.
+    Los registros no tienen por que tener las mismas claves: las columnas que aparecen en bloques posteriores se añaden
+    """
+
+    def __init__(self, path: Path | str, append: bool = False) -> None:
+        self._path = Path(path)
+        self._append = append
+
+    def __repr__(self):
+        return f"< {self.__class__.__name__} {self._path} >"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @abstractmethod
+    def write(self, records: list[dict]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class CSVWriter(_Writer):
+    """
+    Si aparecen columnas nuevas se escriben al final de las filas y al cerrar se reescribe el fichero con la cabecera completa
+    """
+
+    def __init__(self, path: Path | str, append: bool = False) -> None:
+        super().__init__(path, append)
+        exists = append and self._path.exists() and self._path.stat().st_size > 0
+        self._fieldnames: list[str] = []
+        self._header = 0
+        if exists:
+            with open(self._path, newline="", encoding="utf-8") as file:
+                self._fieldnames = next(csv.reader(file))
+            self._header = len(self._fieldnames)
+        self._file = open(self._path, "a" if exists else "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+
+    def write(self, records: list[dict]) -> None:
+        if not records:
+            return
+        self._fieldnames.extend(_new_keys(records, self._fieldnames))
+        if not self._header:
+            self._writer.writerow(self._fieldnames)
+            self._header = len(self._fieldnames)
+        self._writer.writerows([_plain(record.get(key)) for key in self._fieldnames] for record in records)
+
+    def close(self) -> None:
+        self._file.close()
+        if self._header and len(self._fieldnames) > self._header:
+            self._widen()
+
+    def _widen(self) -> None:
+        # Las filas antiguas tienen menos campos que la cabecera nueva: csv los lee como vacios
+        temporary = self._path.with_name(self._path.name + ".tmp")
+        with open(self._path, newline="", encoding="utf-8") as source, open(temporary, "w", newline="", encoding="utf-8") as target:
+            reader = csv.reader(source)
+            next(reader)
+            writer = csv.writer(target)
+            writer.writerow(self._fieldnames)
+            writer.writerows(row + [""] * (len(self._fieldnames) - len(row)) for row in reader)
+        os.replace(temporary, self._path)
+
+
+class NDJSONWriter(_Writer):
+    def __init__(self, path: Path | str, append: bool = False) -> None:
+        super().__init__(path, append)
+        self._file = open(self._path, "ab" if append else "wb")
+
+    def write(self, records: list[dict]) -> None:
+        self._file.writelines(dumps_ndjson(record) for record in records)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SQLiteWriter(_Writer):
+    """
+    Las columnas que aparecen en bloques posteriores se añaden a la tabla con ALTER TABLE.
+    Con key (p. ej. 'path') cada registro sustituye a las filas que ya tuviera la tabla con la misma clave
+    """
+
+    table = "certificados"
+
+    def __init__(self, path: Path | str, append: bool = False, table: str | None = None, key: str | None = None) -> None:
+        super().__init__(path, append)
+        self.table = table or self.table
+        self.key = key
+        if not append and self._path.exists():
+            self._path.unlink()
+        self._connection = sqlite3.connect(self._path)
+        self._columns = [row[1] for row in self._connection.execute(f'PRAGMA table_info("{self.table}")')]
+
+    def write(self, records: list[dict]) -> None:
+        if not records:
+            return
+        new = _new_keys(records, self._columns)
+        if new and not self._columns:
+            columns = ", ".join(f'"{column}"' for column in new)
+            self._connection.execute(f'CREATE TABLE "{self.table}" ({columns})')
+        else:
+            for column in new:
+                self._connection.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{column}"')
+        self._columns.extend(new)
+
+        if self.key is not None:
+            # Sin indice cada DELETE recorreria la tabla entera
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_{self.key}" ON "{self.table}" ("{self.key}")')
+            keys = [(record.get(self.key),) for record in records]
+            self._connection.executemany(f'DELETE FROM "{self.table}" WHERE "{self.key}" = ?', keys)
+        columns = ", ".join(f'"{column}"' for column in self._columns)
+        placeholders = ", ".join("?" for _ in self._columns)
+        rows = [tuple(_plain(record.get(column)) for column in self._columns) for record in records]
+        self._connection.executemany(f'INSERT INTO "{self.table}" ({columns}) VALUES ({placeholders})', rows)
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class ParquetWriter(_Writer):
+    """
+    Requiere pyarrow. Cada bloque se escribe como un row group del mismo fichero.
+
+    El esquema sale de los bloques: una columna nueva o una columna que en los primeros bloques era toda nula (tipo null)
+    amplian el esquema. El fichero parquet tiene un solo esquema, asi que a partir de ese bloque se escribe en otro
+    segmento y al cerrar se juntan los segmentos con el esquema final. Normalmente el esquema se completa en los
+    primeros bloques y solo se reescribe esa parte
+    """
+
+    def __init__(self, path: Path | str, append: bool = False) -> None:
+        if append:
+            raise Exception("No se puede añadir a un fichero parquet existente")
+        super().__init__(path, append)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("La salida parquet necesita pyarrow: pip install pyarrow") from error
+
+        self._pa = pa
+        self._pq = pq
+        self._writer = None
+        self._segments: list[Path] = []
+
+    def _conform(self, table, schema):
+        """
+        table con las columnas de schema, en su orden y con sus tipos (las que faltan, nulas)
+        """
+        columns = [table.column(field.name) if field.name in table.column_names else self._pa.nulls(len(table), field.type) for field in schema]
+        return self._pa.table(columns, names=schema.names).cast(schema)
+
+    def write(self, records: list[dict]) -> None:
+        if not records:
+            return
+        known = self._writer.schema.names if self._writer is not None else []
+        table = self._pa.table({key: [record.get(key) for record in records] for key in [*known, *_new_keys(records, known)]})
+        if self._writer is not None:
+            schema = self._pa.unify_schemas([self._writer.schema, table.schema], promote_options="permissive")
+            if schema.equals(self._writer.schema):
+                self._writer.write_table(self._conform(table, schema))
+                return
+            self._writer.close()
+        else:
+            schema = table.schema
+
+        segment = self._path.with_name(f"{self._path.name}.{len(self._segments)}.tmp") if self._segments else self._path
+        self._segments.append(segment)
+        self._writer = self._pq.ParquetWriter(segment, schema)
+        self._writer.write_table(self._conform(table, schema))
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        if len(self._segments) == 1:
+            return
+
+        # El primer segmento es el propio fichero de salida: se renombra para reescribirlo
+        first = self._path.with_name(f"{self._path.name}.0.tmp")
+        os.replace(self._path, first)
+        segments = [first, *self._segments[1:]]
+        schema = self._writer.schema
+        try:
+            with self._pq.ParquetWriter(self._path, schema) as writer:
+                for segment in segments:
+                    with self._pq.ParquetFile(segment) as source:
+                        for index in range(source.num_row_groups):
+                            writer.write_table(self._conform(source.read_row_group(index), schema))
+        finally:
+            for segment in segments:
+                segment.unlink(missing_ok=True)
+
+
+def open_writer(path: Path | str, format: str | None = None, append: bool = False, **options) -> _Writer:
+    """
+    Devuelve el escritor adecuado. Si no se indica el formato se deduce de la extension del fichero.
+    options se pasa al escritor (p. ej. table para SQLiteWriter)
+    """
+    format = output_format(path, format)
+    writers = {
+        "parquet": ParquetWriter,
+        "csv": CSVWriter,
+        "ndjson": NDJSONWriter,
+        "sqlite": SQLiteWriter,
+    }
+    if format not in writers:
+        raise Exception(f"Formato '{format}' no soportado. Se esperaba uno de {FORMATS}")
+    return writers[format](path, append, **options)